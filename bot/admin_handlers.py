@@ -9,7 +9,9 @@ from telegram.ext import ContextTypes
 from telegram.error import BadRequest
 
 from . import config
-from . import user_stats
+from . import fx_rates, user_stats, weather_api
+from .rate_limiter import limiter as ryanair_limiter
+from .ryanair_executor import executor as ryanair_executor
 
 logger = logging.getLogger(__name__)
 
@@ -29,9 +31,52 @@ def get_stats_keyboard() -> InlineKeyboardMarkup:
         [
             InlineKeyboardButton("🔄 Обновить", callback_data="stats_refresh"),
             InlineKeyboardButton("📥 Скачать отчет", callback_data="stats_download"),
+        ],
+        [
+            InlineKeyboardButton("⚙️ Нагрузка на внешние API", callback_data="stats_runtime"),
         ]
     ])
 
+# --- МЕТРИКИ ПРОЦЕССА ---
+_CIRCUIT_STATE_RUS = {"closed": "работает", "open": "отключён", "half_open": "пробный запрос"}
+
+
+def _format_circuit(title: str, circuit: dict) -> str:
+    return (
+        f"{title}: {_CIRCUIT_STATE_RUS.get(circuit['state'], circuit['state'])}, "
+        f"сбоев подряд: {circuit['consecutive_failures']}, отключался: {circuit['opened']} раз\n"
+        f"• не отправлено запросов: {circuit['rejected']}, пропущено обогащений: {circuit['skipped']}"
+    )
+
+
+def format_runtime_stats() -> str:
+    """
+    Текущее состояние внешних API: лимитер (токены, ожидание) и пул потоков Ryanair,
+    предохранители и кэши погоды и курсов валют.
+    """
+    lim = ryanair_limiter.stats()
+    ex = ryanair_executor.stats()
+    weather = weather_api.cache_stats()
+    return (
+        "⚙️ Нагрузка на внешние API\n\n"
+        "Лимитер запросов:\n"
+        f"• токенов: {lim['tokens']}, скорость: {lim['rate_per_sec']} запр/с\n"
+        f"• ждут токена: {lim['waiting_interactive']} поисков, {lim['waiting_background']} фоновых\n"
+        f"• ожидание: среднее {lim['avg_wait_sec']} с, максимум {lim['max_wait_sec']} с\n"
+        f"• выдано токенов: {lim['acquired']}, троттлинг: {lim['throttled']}, "
+        f"пауза ещё {lim['paused_for_sec']} с\n\n"
+        "Пул потоков:\n"
+        f"• в очереди: {ex['queued']}\n"
+        f"• в работе: {ex['in_flight']} из {ex['max_concurrent']}\n"
+        f"• выполнено: {ex['completed']}, ошибок: {ex['failed']}, отменено: {ex['cancelled']}\n\n"
+        f"{_format_circuit('OpenWeatherMap', weather['circuit'])}\n"
+        f"• кэш прогнозов: {weather['forecast']['entries']} мест, попаданий {weather['forecast']['hits']}, "
+        f"промахов {weather['forecast']['misses']}\n"
+        f"• неизвестных мест: {weather['unresolved']['entries']}\n\n"
+        f"{_format_circuit('frankfurter.dev', fx_rates.circuit.stats())}"
+    )
+
+
 # --- ПРОВЕРКА АДМИНА (без изменений) ---
 def is_admin(user_id: int) -> bool:
     admin_id_str = config.ADMIN_TELEGRAM_ID
@@ -112,7 +157,12 @@ async def stats_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         return
 
     try:
-        if period == "refresh":
+        if period == "runtime":
+            await query.edit_message_text(
+                text=format_runtime_stats(),
+                reply_markup=get_stats_keyboard(),
+            )
+        elif period == "refresh":
             await query.edit_message_text(
                 "📊 Статистика новых пользователей\nВыберите период:",
                 reply_markup=get_stats_keyboard(),
@@ -0,0 +1,125 @@
+# bot/airport_index.py
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+AIRPORTS_RAW_PATH = Path(__file__).resolve().parent / "airports_raw.json"
+# Полная выгрузка аэропортов Ryanair (update_airports.py) — в ней есть координаты
+AIRPORTS_FULL_PATH = Path(__file__).resolve().parents[1] / "data" / "airports_raw.json"
+
+
+def _load_airports_raw(path: Path) -> Dict[str, str]:
+    """{IATA: город} из bot/airports_raw.json ({"STN": {"city": {"name": "London"}}, ...})."""
+    if not path.exists():
+        logger.warning(f"Файл {path} не найден, названия городов по IATA будут только из countries_data.")
+        return {}
+    try:
+        raw = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Ошибка чтения {path}: {e}")
+        return {}
+    cities: Dict[str, str] = {}
+    for code, info in raw.items():
+        city = info.get("city")
+        city_name = city.get("name") if isinstance(city, dict) else city
+        if city_name:
+            cities[code.upper()] = city_name
+    return cities
+
+
+def _load_airport_coordinates(path: Path) -> Dict[str, Tuple[float, float]]:
+    """{IATA: (широта, долгота)} из data/airports_raw.json ([{"code": ..., "coordinates": {...}}, ...])."""
+    if not path.exists():
+        logger.warning(f"Файл {path} не найден, погода будет запрашиваться по названию города.")
+        return {}
+    try:
+        raw = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Ошибка чтения {path}: {e}")
+        return {}
+    coordinates: Dict[str, Tuple[float, float]] = {}
+    for airport in raw:
+        code = airport.get("code")
+        coords = airport.get("coordinates") or {}
+        lat, lon = coords.get("latitude"), coords.get("longitude")
+        if code and lat is not None and lon is not None:
+            coordinates[code.upper()] = (float(lat), float(lon))
+    return coordinates
+
+
+class AirportIndex:
+    """
+    Справочник аэропортов в памяти, строится один раз при запуске:
+    • IATA → страна, IATA → город, IATA → координаты;
+    • (страна, город) → IATA;
+    • страна → валюта.
+    Все поиски — обращения к словарям, без перебора стран.
+    """
+
+    def __init__(
+        self,
+        countries_data: Dict[str, Dict[str, str]],
+        airport_cities: Dict[str, str],
+        country_currency: Dict[str, str],
+        airport_coordinates: Optional[Dict[str, Tuple[float, float]]] = None,
+    ):
+        self._iata_by_city: Dict[Tuple[str, str], str] = {}
+        self._country_by_iata: Dict[str, str] = {}
+        self._city_by_iata: Dict[str, str] = {}
+        for country, cities in countries_data.items():
+            for city, iata in cities.items():
+                self._iata_by_city[(country, city)] = iata
+                self._country_by_iata.setdefault(iata.upper(), country)
+                self._city_by_iata.setdefault(iata.upper(), city)
+        # Названия городов из airports_raw.json точнее, чем ключи countries_data
+        self._city_by_iata.update(airport_cities)
+        self._currency_by_country = dict(country_currency)
+        self._coordinates_by_iata = dict(airport_coordinates or {})
+
+    @classmethod
+    def load(cls) -> "AirportIndex":
+        index = cls(
+            config.COUNTRIES_DATA,
+            _load_airports_raw(AIRPORTS_RAW_PATH),
+            config.COUNTRY_TO_CURRENCY,
+            _load_airport_coordinates(AIRPORTS_FULL_PATH),
+        )
+        logger.info(
+            f"Справочник аэропортов: {len(index._country_by_iata)} аэропортов, "
+            f"{len(index._city_by_iata)} городов по IATA, {len(index._coordinates_by_iata)} с координатами."
+        )
+        return index
+
+    def country_by_iata(self, iata: Optional[str]) -> str:
+        """Страна аэропорта или '' если код неизвестен."""
+        if not iata:
+            return ""
+        return self._country_by_iata.get(iata.upper(), "")
+
+    def city_by_iata(self, iata: Optional[str]) -> Optional[str]:
+        """Город аэропорта, если iata — трёхбуквенный код из справочника, иначе None."""
+        if iata and len(iata) == 3 and iata.isalpha():
+            return self._city_by_iata.get(iata.upper())
+        return None
+
+    def coordinates_by_iata(self, iata: Optional[str]) -> Optional[Tuple[float, float]]:
+        """(широта, долгота) аэропорта или None, если код неизвестен."""
+        if not iata:
+            return None
+        return self._coordinates_by_iata.get(iata.upper())
+
+    def iata_by_city(self, country: Optional[str], city: Optional[str]) -> Optional[str]:
+        return self._iata_by_city.get((country, city))
+
+    def currency_by_country(self, country: Optional[str]) -> Optional[str]:
+        if not country:
+            return None
+        return self._currency_by_country.get(country)
+
+
+airport_index = AirportIndex.load()
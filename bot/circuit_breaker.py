@@ -0,0 +1,121 @@
+# bot/circuit_breaker.py
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Провайдер временно отключён: запрос не отправлялся."""
+
+
+def is_provider_failure(response: httpx.Response) -> bool:
+    """429 и 5xx — сбой провайдера; 404 и прочие ответы — нормальная работа."""
+    return response.status_code == 429 or response.status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для внешнего провайдера обогащения (погода, курсы валют).
+    • closed: запросы идут как обычно; failure_threshold сбоев подряд размыкают цепь;
+    • open: запросы не отправляются совсем (CircuitOpenError), вызывающий сразу идёт дальше;
+    • half-open: через reset_timeout_sec пропускается один пробный запрос —
+      успех замыкает цепь, сбой снова размыкает её. Если проба не отчиталась
+      (например, её отменили), через reset_timeout_sec разрешается следующая.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout_sec: float):
+        self.name = name
+        self._failure_threshold = max(1, failure_threshold)
+        self._reset_timeout = reset_timeout_sec
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_until = 0.0
+
+        self.opened = 0   # сколько раз цепь размыкалась
+        self.rejected = 0  # запросов, не отправленных из-за открытой цепи
+        self.skipped = 0   # обогащений, пропущенных при форматировании
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def is_open(self) -> bool:
+        """True — запрос к провайдеру сейчас не пройдёт (цепь разомкнута или проба уже идёт)."""
+        state = self.state
+        if state == OPEN:
+            return True
+        return state == HALF_OPEN and time.monotonic() < self._probe_until
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос. В half-open пропускает одну пробу за раз."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        now = time.monotonic()
+        if state == HALF_OPEN and now >= self._probe_until:
+            self._state = HALF_OPEN
+            self._probe_until = now + self._reset_timeout
+            logger.info(f"{self.name}: пробный запрос после паузы.")
+            return True
+        self.rejected += 1
+        return False
+
+    def skip(self, lookups: int = 1) -> None:
+        """Учитывает обогащения, которые вызывающий пропустил, не дожидаясь провайдера."""
+        self.skipped += lookups
+
+    def report_success(self) -> None:
+        if self._state != CLOSED:
+            logger.info(f"{self.name}: провайдер снова отвечает, цепь замкнута.")
+        self._state = CLOSED
+        self._failures = 0
+        self._probe_until = 0.0
+
+    def report_failure(self) -> None:
+        self._failures += 1
+        if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self._failure_threshold):
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+            self._probe_until = 0.0
+            self.opened += 1
+            logger.warning(
+                f"{self.name}: {self._failures} сбоев подряд, запросы отключены на {self._reset_timeout:.0f} с."
+            )
+
+    async def request(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """
+        HTTP-запрос через предохранитель: CircuitOpenError без запроса, если цепь разомкнута;
+        таймауты, сетевые ошибки, 429 и 5xx считаются сбоями.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            response = await send()
+        except httpx.RequestError:
+            self.report_failure()
+            raise
+        if is_provider_failure(response):
+            self.report_failure()
+        else:
+            self.report_success()
+        return response
+
+    def stats(self) -> Dict[str, Union[str, int]]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "skipped": self.skipped,
+        }
@@ -173,6 +173,88 @@ POPULAR_DEPARTURE_AIRPORTS = [
     "NYO",  # Stockholm-Skavsta
 ]
 
+# ---------------------------------------------------------------------------
+# Запросы к Ryanair API (клиент синхронный, выполняется в пуле потоков)
+# ---------------------------------------------------------------------------
+RYANAIR_MAX_WORKERS = int(os.getenv("RYANAIR_MAX_WORKERS", "8"))           # потоков в пуле
+RYANAIR_MAX_CONCURRENT_CALLS = int(os.getenv("RYANAIR_MAX_CONCURRENT_CALLS", "8"))  # одновременных запросов
+
+# Ограничение частоты запросов (token bucket) с адаптивным снижением при 429/5xx
+RYANAIR_RATE_PER_SEC = float(os.getenv("RYANAIR_RATE_PER_SEC", "5"))         # запросов в секунду
+RYANAIR_RATE_BURST = int(os.getenv("RYANAIR_RATE_BURST", "10"))              # запас токенов
+RYANAIR_MIN_RATE_PER_SEC = float(os.getenv("RYANAIR_MIN_RATE_PER_SEC", "0.5"))
+RYANAIR_MAX_BACKOFF_SEC = float(os.getenv("RYANAIR_MAX_BACKOFF_SEC", "60"))
+
+# Поиск по одной дате ± N дней: запросы по дням идут параллельно
+OFFSET_SEARCH_CONCURRENCY = int(os.getenv("OFFSET_SEARCH_CONCURRENCY", "7"))        # дней одновременно
+OFFSET_SEARCH_DEADLINE_SEC = float(os.getenv("OFFSET_SEARCH_DEADLINE_SEC", "25"))   # общий дедлайн на поиск
+# Склеивать пробы по дням в один запрос на диапазон (только в одну сторону).
+# Ryanair отдаёт самый дешёвый тариф по каждому направлению за окно, поэтому
+# при склейке по одному направлению остаются самые дешёвые дни, а не каждый день.
+# Выключено по умолчанию: поиск «дата ± N дней» должен показывать рейсы по каждому дню.
+SEARCH_PLANNER_COALESCE_ONE_WAY = os.getenv("SEARCH_PLANNER_COALESCE_ONE_WAY", "0") == "1"
+
+# Сообщение о ходе поиска правится на месте по мере ответов API
+SEARCH_PROGRESS_EDIT_INTERVAL_SEC = float(os.getenv("SEARCH_PROGRESS_EDIT_INTERVAL_SEC", "1.5"))  # не чаще
+SEARCH_PROGRESS_PREVIEW_SIZE = int(os.getenv("SEARCH_PROGRESS_PREVIEW_SIZE", "3"))  # рейсов в предпросмотре
+
+# Поиск из других аэропортов страны: аэропорты проверяются параллельно
+ALT_AIRPORTS_SEARCH_CONCURRENCY = int(os.getenv("ALT_AIRPORTS_SEARCH_CONCURRENCY", "4"))  # аэропортов одновременно
+
+# Кэш тарифов в памяти процесса (TTL + LRU)
+FARE_CACHE_TTL_SEC = int(os.getenv("FARE_CACHE_TTL_SEC", "900"))            # 15 минут
+FARE_CACHE_MAX_ENTRIES = int(os.getenv("FARE_CACHE_MAX_ENTRIES", "2000"))   # запросов
+FARE_CACHE_MAX_FLIGHTS = int(os.getenv("FARE_CACHE_MAX_FLIGHTS", "50000"))  # рейсов во всех записях
+
+# Хранилище тарифов на диске (SQLite), переживает перезапуски. Свежесть — тот же FARE_CACHE_TTL_SEC:
+# запись старше него считается промахом и в памяти, и на диске
+FARE_STORE_SWEEP_INTERVAL_SEC = int(os.getenv("FARE_STORE_SWEEP_INTERVAL_SEC", "1800"))  # очистка раз в 30 минут
+
+# Фоновый прогрев Top-3 «отовсюду» по POPULAR_DEPARTURE_AIRPORTS
+TOP3_PREWARM_INTERVAL_SEC = int(os.getenv("TOP3_PREWARM_INTERVAL_SEC", "1800"))  # раз в 30 минут
+TOP3_PREWARM_MAX_AGE_SEC = int(os.getenv("TOP3_PREWARM_MAX_AGE_SEC", "3600"))    # старше — ищем вживую
+TOP3_PREWARM_CONCURRENCY = int(os.getenv("TOP3_PREWARM_CONCURRENCY", "2"))       # хабов одновременно
+
+# Интерактивный Top-3: аэропорты пула опрашиваются параллельно с общим дедлайном,
+# не успевшие аэропорты отбрасываются, а результат помечается как неполный
+TOP3_SEARCH_DEADLINE_SEC = float(os.getenv("TOP3_SEARCH_DEADLINE_SEC", "20"))
+
+# Общий дедлайн поиска пользователя: передаётся вниз до каждого запроса к API,
+# запросы, не успевшие начаться до дедлайна, не отправляются
+SEARCH_DEADLINE_SEC = float(os.getenv("SEARCH_DEADLINE_SEC", "60"))
+
+# Сеть маршрутов (data/routes.json): клавиатуры прилёта и запросы к API только по обслуживаемым парам
+ROUTES_REFRESH_INTERVAL_SEC = int(os.getenv("ROUTES_REFRESH_INTERVAL_SEC", "3600"))  # проверка раз в час
+ROUTES_MAX_AGE_SEC = int(os.getenv("ROUTES_MAX_AGE_SEC", "86400"))                    # перекачиваем раз в сутки
+
+# HTTP-клиент OpenWeatherMap: один пул соединений на процесс (keep-alive, HTTP/2 при наличии h2)
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5")
+WEATHER_HTTP_MAX_CONNECTIONS = int(os.getenv("WEATHER_HTTP_MAX_CONNECTIONS", "20"))
+WEATHER_HTTP_MAX_KEEPALIVE = int(os.getenv("WEATHER_HTTP_MAX_KEEPALIVE", "10"))
+WEATHER_HTTP_KEEPALIVE_EXPIRY_SEC = float(os.getenv("WEATHER_HTTP_KEEPALIVE_EXPIRY_SEC", "60"))
+WEATHER_HTTP_CONNECT_TIMEOUT_SEC = float(os.getenv("WEATHER_HTTP_CONNECT_TIMEOUT_SEC", "3"))
+WEATHER_HTTP_READ_TIMEOUT_SEC = float(os.getenv("WEATHER_HTTP_READ_TIMEOUT_SEC", "5"))
+
+# Кэш погоды по городам: 5-дневный прогноз (40 слотов) целиком и текущая погода отдельно
+WEATHER_FORECAST_CACHE_TTL_SEC = int(os.getenv("WEATHER_FORECAST_CACHE_TTL_SEC", "3600"))  # 1 час
+WEATHER_CURRENT_CACHE_TTL_SEC = int(os.getenv("WEATHER_CURRENT_CACHE_TTL_SEC", "600"))     # 10 минут
+WEATHER_CACHE_MAX_CITIES = int(os.getenv("WEATHER_CACHE_MAX_CITIES", "500"))
+# Город/место, которое OpenWeatherMap не распознал (404), не запрашиваем повторно N секунд
+WEATHER_NEGATIVE_CACHE_TTL_SEC = int(os.getenv("WEATHER_NEGATIVE_CACHE_TTL_SEC", "21600"))
+# Погода для всей выдачи запрашивается заранее одним проходом, не больше N запросов одновременно
+WEATHER_PREFETCH_CONCURRENCY = int(os.getenv("WEATHER_PREFETCH_CONCURRENCY", "8"))
+
+# --- Предохранитель для провайдеров обогащения (OpenWeatherMap, frankfurter.dev) ---
+# После N сбоев подряд (таймаут, сетевая ошибка, 429/5xx) провайдер отключается на RESET секунд,
+# затем пропускается один пробный запрос
+ENRICHMENT_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("ENRICHMENT_CIRCUIT_FAILURE_THRESHOLD", "3"))
+ENRICHMENT_CIRCUIT_RESET_SEC = float(os.getenv("ENRICHMENT_CIRCUIT_RESET_SEC", "60"))
+
+# --- Курсы валют (frankfurter.dev, данные ЕЦБ) ---
+# ЕЦБ публикует курсы около 16:00 CET (14:00–15:00 UTC); обновляем снимок немного позже
+FX_REFRESH_TIME_UTC = os.getenv("FX_REFRESH_TIME_UTC", "15:30")
+FX_REFRESH_RETRY_SEC = int(os.getenv("FX_REFRESH_RETRY_SEC", "900"))  # повтор при неудачном обновлении
+
 
 
 
@@ -194,7 +276,10 @@ MSG_FLIGHT_TYPE_PROMPT = (
 MSG_PRICE_OPTION_PROMPT = "💰 Выберите, как определить цену для поиска:"
 MSG_MAX_PRICE_PROMPT = "💶 Введите желаемую максимальную цену (EUR), например, 50:"
 MSG_SEARCHING_FLIGHTS = "⏳ Начинаю поиск рейсов..."
+MSG_SEARCH_IN_PROGRESS = "⏳ Поиск ещё идёт. Дождитесь результатов или отмените его: /cancel"
 MSG_NO_FLIGHTS_FOUND = "🤷 К сожалению, по вашим критериям рейсы не найдены."
+MSG_SEARCH_TIMED_OUT = "⏱ Поиск не уложился в отведённое время: Ryanair ответил не на все запросы. Попробуйте ещё раз чуть позже или сузьте даты."
+MSG_SEARCH_PARTIAL = "⏱ Время поиска истекло, результаты неполные — показаны рейсы по запросам, на которые Ryanair успел ответить:"
 MSG_FLIGHTS_FOUND_SEE_BELOW = "✈️✨ Найдены следующие рейсы:"
 MSG_ERROR_OCCURRED = "❗Произошла ошибка. Попробуйте позже или свяжитесь с администратором."
 MSG_CANCELLED = "🛑 Поиск отменен. Чтобы начать новый, выберите команду /start."
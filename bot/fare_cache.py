@@ -0,0 +1,136 @@
+# bot/fare_cache.py
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from . import config, rate_limiter, search_tasks
+from .single_flight import SingleFlight
+
+# (вылет, прилёт, вылет_с, вылет_по, возврат_с, возврат_по, в_одну_сторону)
+FareKey = Tuple[str, str, str, str, str, str, bool]
+
+
+def make_key(
+    departure_airport_iata: str,
+    arrival_airport_iata: str | None,
+    date_from_str: str,
+    date_to_str: str,
+    return_date_from_str: str | None = None,
+    return_date_to_str: str | None = None,
+) -> FareKey:
+    """Нормализованный ключ запроса. max_price в ключ не входит — цена фильтруется локально."""
+    is_one_way = not (return_date_from_str and return_date_to_str)
+    return (
+        (departure_airport_iata or "").upper(),
+        (arrival_airport_iata or "").upper(),
+        date_from_str,
+        date_to_str,
+        "" if is_one_way else return_date_from_str,
+        "" if is_one_way else return_date_to_str,
+        is_one_way,
+    )
+
+
+class FareCache:
+    """
+    In-process кэш результатов Ryanair API с TTL и LRU-вытеснением.
+    Размер ограничен и числом записей, и суммарным числом рейсов во всех записях,
+    чтобы пара годовых поисков «куда угодно» не съела всю память.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, max_flights: int):
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._max_flights = max_flights
+        self._entries: "OrderedDict[FareKey, Tuple[float, list]]" = OrderedDict()
+        self._flights_total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: FareKey) -> Optional[list]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, flights = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return flights
+
+    def put(self, key: FareKey, flights: list, ttl_seconds: Optional[float] = None) -> None:
+        """ttl_seconds — если данные получены раньше (например, из хранилища на диске), сколько им осталось жить."""
+        if len(flights) > self._max_flights:
+            return  # Слишком большой результат — не кэшируем, иначе он вытеснит всё остальное
+        if key in self._entries:
+            self._drop(key)
+        ttl = self._ttl if ttl_seconds is None else min(self._ttl, ttl_seconds)
+        self._entries[key] = (time.monotonic() + ttl, flights)
+        self._flights_total += len(flights)
+        while self._entries and (len(self._entries) > self._max_entries or self._flights_total > self._max_flights):
+            oldest_key = next(iter(self._entries))
+            self._drop(oldest_key)
+            self.evictions += 1
+
+    def _drop(self, key: FareKey) -> None:
+        _, flights = self._entries.pop(key)
+        self._flights_total -= len(flights)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._flights_total = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "flights": self._flights_total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class FareSingleFlight(SingleFlight):
+    """
+    Single-flight для запросов к Ryanair (см. single_flight.SingleFlight) с учётом поисков:
+    общая задача не наследует дедлайн и приоритет первого вызывающего — у неё нет дедлайна,
+    каждый ждёт её не дольше своего дедлайна, а приоритет в лимитере Ryanair — самый
+    высокий среди ожидающих.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._priorities: Dict[asyncio.Task, rate_limiter.SharedPriority] = {}
+
+    def _start(self, func: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        shared = rate_limiter.SharedPriority(rate_limiter.request_priority.get())
+        context = contextvars.copy_context()
+        context.run(search_tasks.search_deadline.set, None)
+        context.run(rate_limiter.shared_priority.set, shared)
+        # Задача копирует текущий контекст при создании — создаём её внутри подготовленного
+        task = context.run(asyncio.ensure_future, func())
+        self._priorities[task] = shared
+        task.add_done_callback(self._priorities.pop)
+        return task
+
+    def _join(self, task: asyncio.Task) -> None:
+        rate_limiter.limiter.boost(self._priorities[task], rate_limiter.request_priority.get())
+
+    async def _wait(self, task: asyncio.Task) -> Any:
+        # asyncio.TimeoutError — истёк дедлайн этого вызывающего; общая задача продолжается для остальных
+        return await asyncio.wait_for(asyncio.shield(task), search_tasks.time_left())
+
+
+fare_cache = FareCache(
+    ttl_seconds=config.FARE_CACHE_TTL_SEC,
+    max_entries=config.FARE_CACHE_MAX_ENTRIES,
+    max_flights=config.FARE_CACHE_MAX_FLIGHTS,
+)
+
+single_flight = FareSingleFlight()
@@ -0,0 +1,156 @@
+# bot/fare_store.py
+import json
+import logging
+import os
+import time
+from typing import List, Optional, Tuple
+
+import aiosqlite
+
+from . import config
+from .fare_cache import FareKey
+from .flight_record import FlightRecord
+
+logger = logging.getLogger(__name__)
+DB_NAME = os.path.join(os.path.dirname(__file__), 'fare_store.db')
+
+_db_ready = False
+
+
+async def init_db():
+    """Создаёт таблицы хранилища тарифов, если их нет."""
+    global _db_ready
+    try:
+        async with aiosqlite.connect(DB_NAME, timeout=10) as conn:
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS fare_queries (
+                    query_key TEXT PRIMARY KEY,
+                    fetched_at REAL NOT NULL,
+                    flights_count INTEGER NOT NULL
+                )
+            ''')
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS fares (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    query_key TEXT NOT NULL,
+                    origin TEXT NOT NULL,
+                    destination TEXT NOT NULL,
+                    departure_date TEXT NOT NULL,
+                    price REAL,
+                    payload TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            ''')
+            await conn.execute('CREATE INDEX IF NOT EXISTS idx_fares_query ON fares (query_key)')
+            await conn.execute('CREATE INDEX IF NOT EXISTS idx_fares_route_date ON fares (origin, destination, departure_date)')
+            await conn.commit()
+        _db_ready = True
+        logger.info(f"Хранилище тарифов {DB_NAME} инициализировано.")
+    except Exception as e:
+        logger.error(f"Ошибка инициализации хранилища тарифов: {e}", exc_info=True)
+
+
+async def _ensure_db():
+    if not _db_ready:
+        await init_db()
+
+
+def _key_to_str(key: FareKey) -> str:
+    return "|".join(str(part) for part in key)
+
+
+# --- сериализация рейсов ---
+
+def _flight_to_row(query_key: str, flight: FlightRecord, fetched_at: float) -> tuple:
+    return (
+        query_key,
+        flight.origin,
+        flight.destination,
+        flight.departure_date,
+        flight.price_cents / 100 if flight.price_cents is not None else None,
+        json.dumps(flight.to_dict(), ensure_ascii=False),
+        fetched_at,
+    )
+
+
+def _flight_from_payload(payload_json: str) -> FlightRecord:
+    return FlightRecord.from_dict(json.loads(payload_json))
+
+
+# --- чтение / запись ---
+
+async def load(key: FareKey) -> Optional[Tuple[float, List[FlightRecord]]]:
+    """
+    Возвращает (fetched_at, рейсы) по запросу, если он был получен не раньше FARE_CACHE_TTL_SEC назад
+    (как и в кэше в памяти: после перезапуска отвечаем только теми данными, что ещё жили бы в нём);
+    fetched_at — время запроса к API (time.time()).
+    None — если свежих данных нет (пустой список означает «рейсов нет», это тоже ответ).
+    """
+    await _ensure_db()
+    query_key = _key_to_str(key)
+    min_fetched_at = time.time() - config.FARE_CACHE_TTL_SEC
+    try:
+        async with aiosqlite.connect(DB_NAME, timeout=10) as conn:
+            async with conn.execute(
+                'SELECT fetched_at FROM fare_queries WHERE query_key = ? AND fetched_at >= ?',
+                (query_key, min_fetched_at)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if not row:
+                return None
+            async with conn.execute(
+                'SELECT payload FROM fares WHERE query_key = ? ORDER BY id',
+                (query_key,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        flights = [_flight_from_payload(payload) for (payload,) in rows]
+        logger.info(f"Хранилище тарифов: {len(flights)} рейсов по запросу {query_key} взято с диска.")
+        return row[0], flights
+    except Exception as e:
+        logger.error(f"Ошибка чтения хранилища тарифов для {query_key}: {e}", exc_info=True)
+        return None
+
+
+async def save(key: FareKey, flights: List[FlightRecord]) -> None:
+    """Сохраняет результат запроса одной транзакцией, заменяя предыдущий."""
+    await _ensure_db()
+    query_key = _key_to_str(key)
+    fetched_at = time.time()
+    try:
+        rows = [_flight_to_row(query_key, flight, fetched_at) for flight in flights]
+        async with aiosqlite.connect(DB_NAME, timeout=10) as conn:
+            await conn.execute('DELETE FROM fares WHERE query_key = ?', (query_key,))
+            await conn.executemany('''
+                INSERT INTO fares (query_key, origin, destination, departure_date, price, payload, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            await conn.execute('''
+                INSERT OR REPLACE INTO fare_queries (query_key, fetched_at, flights_count)
+                VALUES (?, ?, ?)
+            ''', (query_key, fetched_at, len(rows)))
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка записи в хранилище тарифов для {query_key}: {e}", exc_info=True)
+
+
+async def sweep_expired() -> int:
+    """Удаляет устаревшие запросы и их рейсы. Возвращает число удалённых запросов."""
+    await _ensure_db()
+    min_fetched_at = time.time() - config.FARE_CACHE_TTL_SEC
+    try:
+        async with aiosqlite.connect(DB_NAME, timeout=10) as conn:
+            await conn.execute('DELETE FROM fares WHERE fetched_at < ?', (min_fetched_at,))
+            cursor = await conn.execute('DELETE FROM fare_queries WHERE fetched_at < ?', (min_fetched_at,))
+            removed = cursor.rowcount
+            await conn.commit()
+        if removed:
+            logger.info(f"Хранилище тарифов: удалено {removed} устаревших запросов.")
+        return removed
+    except Exception as e:
+        logger.error(f"Ошибка очистки хранилища тарифов: {e}", exc_info=True)
+        return 0
+
+
+async def sweep_expired_job(context) -> None:
+    """Задача для job_queue: периодическая очистка хранилища тарифов."""
+    await sweep_expired()
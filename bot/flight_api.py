@@ -1,9 +1,19 @@
 # bot/flight_api.py
+import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
 from ryanair import Ryanair #
 from decimal import Decimal
-from collections import defaultdict #MODIFIED: added defaultdict
+from collections import defaultdict
+from typing import NamedTuple
+from . import config
+from . import fare_cache, fare_store, rate_limiter, search_tasks
+from .ryanair_executor import executor as ryanair_executor
+from .flight_record import FlightRecord, price_to_cents
+from .top_k import TopKAggregator
+from .airport_index import airport_index
+from .route_index import route_index
 
 logger = logging.getLogger(__name__)
 
@@ -24,143 +34,192 @@ async def find_flights_api(
     return_date_to_str: str | None = None    # YYYY-MM-DD, для рейсов туда-обратно
 ):
     """
-    Ищет рейсы через API Ryanair и затем фильтрует их строго по заданным диапазонам дат.
+    Ищет рейсы через API Ryanair (или берёт из кэша) и фильтрует их по max_price.
     Возвращает список найденных и отфильтрованных рейсов или пустой список.
+    SearchTimedOut — дедлайн поиска истёк раньше, чем пришёл ответ (это не «рейсов нет»).
+    """
+    if not route_index.is_served(departure_airport_iata, arrival_airport_iata):
+        logger.info(f"Маршрут {departure_airport_iata} -> {arrival_airport_iata} не обслуживается, запрос к API пропущен.")
+        return []
+    cache_key = fare_cache.make_key(
+        departure_airport_iata, arrival_airport_iata, date_from_str, date_to_str,
+        return_date_from_str, return_date_to_str,
+    )
+    flights = fare_cache.fare_cache.get(cache_key)
+    if flights is None:
+        async def _fetch_and_cache():
+            # Сначала смотрим в хранилище на диске (переживает перезапуски), потом в API
+            stored = await fare_store.load(cache_key)
+            if stored is not None:
+                fetched_at, fetched = stored
+                # В памяти данные живут столько, сколько им осталось от FARE_CACHE_TTL_SEC с момента запроса к API
+                remaining = config.FARE_CACHE_TTL_SEC - (time.time() - fetched_at)
+                if remaining > 0:
+                    fare_cache.fare_cache.put(cache_key, fetched, ttl_seconds=remaining)
+                return fetched
+            fetched = await _fetch_flights_upstream(
+                departure_airport_iata, arrival_airport_iata, date_from_str, date_to_str,
+                return_date_from_str, return_date_to_str,
+            )
+            if fetched is None: # Ошибка запроса — никуда не сохраняем
+                return None
+            await fare_store.save(cache_key, fetched)
+            fare_cache.fare_cache.put(cache_key, fetched)
+            return fetched
+
+        # Одинаковые одновременные запросы ждут один и тот же вызов API
+        try:
+            flights = await fare_cache.single_flight.do(cache_key, _fetch_and_cache)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Дедлайн поиска истёк в ожидании общего запроса {departure_airport_iata} -> "
+                f"{arrival_airport_iata or 'Любой'} ({date_from_str}-{date_to_str})."
+            )
+            raise search_tasks.SearchTimedOut() from None
+        if flights is None:
+            return []
+    else:
+        logger.info(
+            f"Кэш тарифов: {departure_airport_iata} -> {arrival_airport_iata or 'Любой'}, "
+            f"{date_from_str}-{date_to_str} — {len(flights)} рейсов без запроса к API."
+        )
+
+    if max_price is None:
+        return list(flights)
+    max_cents = price_to_cents(max_price)
+    return [flight for flight in flights if flight.price_cents is not None and flight.price_cents <= max_cents]
+
+
+async def _fetch_flights_upstream(
+    departure_airport_iata: str,
+    arrival_airport_iata: str | None,
+    date_from_str: str, # YYYY-MM-DD
+    date_to_str: str,   # YYYY-MM-DD
+    return_date_from_str: str | None = None, # YYYY-MM-DD, для рейсов туда-обратно
+    return_date_to_str: str | None = None    # YYYY-MM-DD, для рейсов туда-обратно
+) -> list | None:
+    """
+    Ищет рейсы через API Ryanair (без ограничения по цене) и затем фильтрует их строго по заданным диапазонам дат.
+    Возвращает список отфильтрованных рейсов (возможно пустой) или None при ошибке запроса;
+    SearchTimedOut — если запрос не уложился в дедлайн поиска.
     """
     if not ryanair_api:
         logger.error("Ryanair API клиент не инициализирован.")
-        return []
+        return None
 
     raw_flights = [] # Список для "сырых" результатов от API
+    # Дедлайн поиска пользователя: запрос, который не успеет начаться, не отправляем вовсе
+    remaining = search_tasks.time_left()
+    if remaining is not None and remaining <= 0:
+        logger.warning(
+            f"Дедлайн поиска истёк, запрос {departure_airport_iata} -> {arrival_airport_iata or 'Любой'} "
+            f"({date_from_str}-{date_to_str}) не отправлен."
+        )
+        raise search_tasks.SearchTimedOut()
+    try:
+        # Общий лимит запросов к Ryanair: интерактивные поиски идут раньше фоновых
+        await asyncio.wait_for(rate_limiter.limiter.acquire(), timeout=remaining)
+    except asyncio.TimeoutError:
+        logger.warning(
+            f"Дедлайн поиска истёк в очереди лимитера, запрос {departure_airport_iata} -> "
+            f"{arrival_airport_iata or 'Любой'} ({date_from_str}-{date_to_str}) не отправлен."
+        )
+        raise search_tasks.SearchTimedOut() from None
     try:
         logger.info(
             f"Запрос к API Ryanair: {departure_airport_iata} -> {arrival_airport_iata or 'Любой'}, "
-            f"Даты вылета: {date_from_str}-{date_to_str}, Макс.цена: {max_price}"
+            f"Даты вылета: {date_from_str}-{date_to_str}"
         )
         if return_date_from_str and return_date_to_str:
             logger.info(f"Даты возврата для API: {return_date_from_str}-{return_date_to_str}")
             # Запрос рейсов туда-обратно
-            raw_flights = ryanair_api.get_cheapest_return_flights(
+            raw_flights = await asyncio.wait_for(ryanair_executor.run(
+                ryanair_api.get_cheapest_return_flights,
                 source_airport=departure_airport_iata,
                 date_from=date_from_str,
                 date_to=date_to_str,
                 destination_airport=arrival_airport_iata,
                 return_date_from=return_date_from_str,
                 return_date_to=return_date_to_str,
-                max_price=float(max_price) if max_price is not None else None,
-            )
+            ), timeout=search_tasks.time_left())
         else:
             # Запрос рейсов в одну сторону
-            raw_flights = ryanair_api.get_cheapest_flights(
+            raw_flights = await asyncio.wait_for(ryanair_executor.run(
+                ryanair_api.get_cheapest_flights,
                 airport=departure_airport_iata,
                 date_from=date_from_str,
                 date_to=date_to_str,
                 destination_airport=arrival_airport_iata,
-                max_price=float(max_price) if max_price is not None else None,
-            )
+            ), timeout=search_tasks.time_left())
         
         logger.info(f"API Ryanair вернул {len(raw_flights) if raw_flights else 0} рейсов (до внутренней фильтрации).")
+        rate_limiter.limiter.report_success()
 
+    except asyncio.TimeoutError:
+        logger.warning(
+            f"Дедлайн поиска истёк во время запроса {departure_airport_iata} -> "
+            f"{arrival_airport_iata or 'Любой'} ({date_from_str}-{date_to_str}), ответ не ждём."
+        )
+        raise search_tasks.SearchTimedOut() from None
     except Exception as e:
+        if rate_limiter.is_throttling_error(e):
+            rate_limiter.limiter.report_throttled()
         logger.error(f"Ошибка при запросе к Ryanair API: {e}", exc_info=True) # Добавлено exc_info=True для полного стека ошибки
         logger.error(
             f"Параметры запроса: dep={departure_airport_iata}, arr={arrival_airport_iata}, "
             f"date_from={date_from_str}, date_to={date_to_str}, ret_from={return_date_from_str}, "
-            f"ret_to={return_date_to_str}, price={max_price}"
+            f"ret_to={return_date_to_str}"
         )
-        return []
+        return None
 
     # --- НАЧАЛО БЛОКА ПОСТ-ФИЛЬТРАЦИИ РЕЙСОВ ПО ДАТАМ ---
     if not raw_flights: # Если API ничего не вернул или список пуст
         return []
 
     try:
-        # Преобразуем строки дат окна вылета в объекты date для сравнения
-        dep_window_start_date = datetime.strptime(date_from_str, "%Y-%m-%d").date()
-        dep_window_end_date = datetime.strptime(date_to_str, "%Y-%m-%d").date()
+        # Проверяем формат дат окна вылета; дальше сравниваем строки YYYY-MM-DD
+        datetime.strptime(date_from_str, "%Y-%m-%d")
+        datetime.strptime(date_to_str, "%Y-%m-%d")
     except ValueError:
         logger.error(f"Некорректный формат дат для окна вылета при фильтрации: {date_from_str} - {date_to_str}")
-        return [] # Не можем фильтровать, если даты окна некорректны
+        return None # Не можем фильтровать, если даты окна некорректны
 
-    ret_window_start_date = None
-    ret_window_end_date = None
     # Проверяем, был ли это поиск туда-обратно (для которого нужны даты возврата)
     is_round_trip_search_intended = bool(return_date_from_str and return_date_to_str)
     
     if is_round_trip_search_intended:
         try:
-            # Преобразуем строки дат окна возврата в объекты date
-            ret_window_start_date = datetime.strptime(return_date_from_str, "%Y-%m-%d").date()
-            ret_window_end_date = datetime.strptime(return_date_to_str, "%Y-%m-%d").date()
+            datetime.strptime(return_date_from_str, "%Y-%m-%d")
+            datetime.strptime(return_date_to_str, "%Y-%m-%d")
         except ValueError:
             logger.error(f"Некорректный формат дат для окна возврата при фильтрации: {return_date_from_str} - {return_date_to_str}")
-            return [] # Не можем фильтровать, если даты окна возврата некорректны
+            return None # Не можем фильтровать, если даты окна возврата некорректны
 
-    filtered_flights = []
+    filtered_flights: list[FlightRecord] = []
     for flight_obj in raw_flights:
         try:
-            outbound_flight_part = None
-            # Определяем, какая часть объекта рейса содержит информацию о вылете "туда"
-            # Это зависит от того, возвращает ли API для round-trip один объект с 'outbound'/'inbound'
-            # или это всегда объекты типа one-way flight.
-            # Предполагаем, что flight_obj может быть либо one-way, либо round-trip с полями outbound/inbound.
-            if hasattr(flight_obj, 'outbound') and flight_obj.outbound and hasattr(flight_obj.outbound, 'departureTime'):
-                outbound_flight_part = flight_obj.outbound
-            elif hasattr(flight_obj, 'departureTime'): # Для рейсов в одну сторону или если get_cheapest_return_flights возвращает список отдельных рейсов
-                outbound_flight_part = flight_obj
-            
-            if not outbound_flight_part:
-                logger.warning(f"Не удалось извлечь информацию о вылете (туда) из объекта рейса: {type(flight_obj)}")
-                continue
+            # Разбираем объект ryanair-py один раз: дальше везде используется FlightRecord
+            record = FlightRecord.from_raw(flight_obj)
+        except Exception as filter_exc:
+            logger.warning(f"Ошибка при разборе отдельного рейса: {filter_exc}. Рейс: {flight_obj}", exc_info=True)
+            continue
+        if record is None:
+            logger.warning(f"Не удалось извлечь информацию о вылете из объекта рейса: {type(flight_obj)}")
+            continue
 
-            out_dep_time_attr = outbound_flight_part.departureTime
-            out_actual_departure_date = None # Фактическая дата вылета "туда"
+        # Фильтруем по дате вылета "туда"
+        if not (date_from_str <= record.departure_date <= date_to_str):
+            continue
 
-            if isinstance(out_dep_time_attr, str):
-                out_actual_departure_date = datetime.fromisoformat(out_dep_time_attr.replace("Z", "+00:00")).date()
-            elif isinstance(out_dep_time_attr, datetime):
-                out_actual_departure_date = out_dep_time_attr.date()
-            else:
-                logger.warning(f"Неизвестный тип времени вылета (туда) '{type(out_dep_time_attr)}' у рейса.")
+        # Если это поиск туда-обратно, проверяем и фильтруем дату вылета "обратно"
+        if is_round_trip_search_intended:
+            if record.inbound is None:
+                logger.warning(f"Поиск туда-обратно, но отсутствуют данные о рейсе обратно: {record}")
+                continue
+            if not (return_date_from_str <= record.inbound.departure_date <= return_date_to_str):
                 continue
-            
-            # Фильтруем по дате вылета "туда"
-            if not (dep_window_start_date <= out_actual_departure_date <= dep_window_end_date):
-                # logger.debug(f"Рейс отфильтрован (туда): {out_actual_departure_date} не в [{dep_window_start_date}, {dep_window_end_date}]")
-                continue 
-
-            # Если это поиск туда-обратно, проверяем и фильтруем дату вылета "обратно"
-            if is_round_trip_search_intended:
-                # Убедимся, что данные для обратного рейса существуют и корректны
-                if not (hasattr(flight_obj, 'inbound') and flight_obj.inbound and hasattr(flight_obj.inbound, 'departureTime')):
-                    logger.warning(f"Поиск туда-обратно, но отсутствуют или неполны данные о рейсе обратно в объекте: {type(flight_obj)}")
-                    continue # Пропускаем этот рейс, так как он неполный для туда-обратно
-
-                inbound_flight_part = flight_obj.inbound
-                in_dep_time_attr = inbound_flight_part.departureTime
-                in_actual_departure_date = None # Фактическая дата вылета "обратно"
-
-                if isinstance(in_dep_time_attr, str):
-                    in_actual_departure_date = datetime.fromisoformat(in_dep_time_attr.replace("Z", "+00:00")).date()
-                elif isinstance(in_dep_time_attr, datetime):
-                    in_actual_departure_date = in_dep_time_attr.date()
-                else:
-                    logger.warning(f"Неизвестный тип времени вылета (обратно) '{type(in_dep_time_attr)}' у рейса.")
-                    continue
-                
-                # Фильтруем по дате вылета "обратно"
-                # ret_window_start_date и ret_window_end_date должны быть определены, если is_round_trip_search_intended is True
-                if not (ret_window_start_date and ret_window_end_date and \
-                        ret_window_start_date <= in_actual_departure_date <= ret_window_end_date):
-                    # logger.debug(f"Рейс отфильтрован (обратно): {in_actual_departure_date} не в [{ret_window_start_date}, {ret_window_end_date}]")
-                    continue
-            
-            # Если все проверки пройдены, добавляем рейс в отфильтрованный список
-            filtered_flights.append(flight_obj)
 
-        except Exception as filter_exc:
-            logger.warning(f"Ошибка при фильтрации отдельного рейса: {filter_exc}. Рейс: {flight_obj}", exc_info=True)
-            continue # Пропускаем рейс, который не удалось обработать
+        filtered_flights.append(record)
 
     final_count = len(filtered_flights)
     if len(raw_flights) != final_count:
@@ -169,6 +228,127 @@ async def find_flights_api(
     return filtered_flights
     # --- КОНЕЦ БЛОКА ПОСТ-ФИЛЬТРАЦИИ РЕЙСОВ ПО ДАТАМ ---
 
+# ---------------------------------------------------------------------------
+# ПЛАНИРОВЩИК ЗАПРОСОВ: логический поиск -> минимальный набор вызовов API
+# ---------------------------------------------------------------------------
+
+class UpstreamCall(NamedTuple):
+    """Один запрос к Ryanair API и даты вылета (пробы), которые он покрывает."""
+    origin: str
+    destination: str | None
+    date_from: str
+    date_to: str
+    return_date_from: str | None
+    return_date_to: str | None
+    probe_dates: tuple[str, ...]
+
+
+def plan_upstream_calls(
+    origins: list[str],
+    destination: str | None,
+    probes: list[tuple[str, str | None]],
+) -> list[UpstreamCall]:
+    """
+    Строит минимальный набор запросов для поиска из origins по пробам (дата вылета, дата возврата).
+    • В одну сторону по умолчанию — запрос на каждый день. С SEARCH_PLANNER_COALESCE_ONE_WAY
+      все дни склеиваются в один запрос на диапазон [min, max] для каждого аэропорта
+      (Ryanair вернёт только самый дешёвый день по направлению), результат раскладывается по дням локально.
+    • Туда-обратно: у каждой даты вылета своя дата возврата, поэтому запрос на каждую пару.
+    """
+    calls: list[UpstreamCall] = []
+    is_one_way = all(ret_date is None for _, ret_date in probes)
+
+    for origin in origins:
+        if is_one_way and len(probes) > 1 and config.SEARCH_PLANNER_COALESCE_ONE_WAY:
+            probe_dates = tuple(dep_date for dep_date, _ in probes)
+            calls.append(UpstreamCall(origin, destination, min(probe_dates), max(probe_dates), None, None, probe_dates))
+        else:
+            for dep_date, ret_date in probes:
+                calls.append(UpstreamCall(origin, destination, dep_date, dep_date, ret_date, ret_date, (dep_date,)))
+
+    naive_count = len(origins) * len(probes)
+    logger.info(
+        f"Планировщик: {destination or 'Любой'} из {', '.join(origins)} — запланировано {len(calls)} "
+        f"запросов к API вместо {naive_count} (по одному на день)."
+    )
+    return calls
+
+
+async def iter_search_plan(
+    calls: list[UpstreamCall],
+    max_price: Decimal | None,
+):
+    """
+    Выполняет запросы плана параллельно (не больше OFFSET_SEARCH_CONCURRENCY одновременно)
+    с общим дедлайном OFFSET_SEARCH_DEADLINE_SEC. Отдаёт (аэропорт_вылета, {дата: [рейсы]})
+    по мере завершения каждого запроса, не дожидаясь остальных.
+    Если часть запросов не уложилась в дедлайн, после всех полученных порций поднимает SearchTimedOut.
+    """
+    semaphore = asyncio.Semaphore(max(1, config.OFFSET_SEARCH_CONCURRENCY))
+
+    async def _run_call(call: UpstreamCall):
+        async with semaphore:
+            logger.info(
+                f"Поиск (план): {call.origin}, {call.date_from}..{call.date_to} "
+                f"(возврат: {call.return_date_from or 'N/A'})"
+            )
+            return await find_flights_api(
+                departure_airport_iata=call.origin,
+                arrival_airport_iata=call.destination,
+                date_from_str=call.date_from,
+                date_to_str=call.date_to,
+                max_price=max_price,
+                return_date_from_str=call.return_date_from,
+                return_date_to_str=call.return_date_to,
+            )
+
+    tasks = {asyncio.create_task(_run_call(call)): call for call in calls}
+    pending = set(tasks)
+    timed_out = False
+    # Свой дедлайн плана, но не дальше общего дедлайна поиска пользователя
+    deadline = time.monotonic() + search_tasks.time_left(config.OFFSET_SEARCH_DEADLINE_SEC)
+    try:
+        while pending:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            # Порядок завершения внутри пачки не важен, но отдаём по датам для стабильности
+            for task in sorted(done, key=lambda t: tasks[t].date_from):
+                call = tasks[task]
+                if isinstance(task.exception(), search_tasks.SearchTimedOut):
+                    timed_out = True
+                    continue
+                if task.exception():
+                    logger.error(f"Ошибка запроса {call.origin} {call.date_from}..{call.date_to}: {task.exception()}")
+                    continue
+                flights = task.result() or []
+                by_date: dict[str, list] = defaultdict(list)
+                if len(call.probe_dates) == 1:
+                    # Запрос на один день — все рейсы относятся к этой дате
+                    by_date[call.probe_dates[0]].extend(flights)
+                else:
+                    wanted_dates = set(call.probe_dates)
+                    for flight in flights:
+                        if flight.departure_date in wanted_dates:
+                            by_date[flight.departure_date].append(flight)
+                yield call.origin, dict(by_date)
+        if pending:
+            timed_out = True
+            logger.warning(
+                f"Дедлайн поиска истёк: "
+                f"{len(pending)} из {len(tasks)} запросов не успели ответить."
+            )
+    finally:
+        # Дедлайн, отмена снаружи или потребитель перестал читать — не оставляем запросы висеть
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    if timed_out:
+        raise search_tasks.SearchTimedOut()
+
+
 # MODIFIED: Логика find_flights_with_fallback изменена для сбора рейсов по датам
 # ПОЛНОСТЬЮ ИСПРАВЛЕННЫЙ МЕТОД find_flights_with_fallback
 async def find_flights_with_fallback(
@@ -186,11 +366,44 @@ async def find_flights_with_fallback(
     explicit_return_date_to: str | None = None
 ):
     """
-    Основная логика поиска рейсов.
+    Основная логика поиска рейсов (см. iter_flights_with_fallback), результат целиком.
+    Возвращает словарь {дата_строка: [список_рейсов]} с датами по возрастанию или пустой словарь.
+    SearchTimedOut — не все запросы уложились в дедлайн поиска.
+    """
+    all_flights_by_date = defaultdict(list)
+    async for batch in iter_flights_with_fallback(
+        departure_airport_iata, arrival_airport_iata, departure_date_str, max_price,
+        return_date_str, is_one_way, search_days_offset,
+        explicit_departure_date_from, explicit_departure_date_to,
+        explicit_return_date_from, explicit_return_date_to,
+    ):
+        for date_key, flights in batch.items():
+            all_flights_by_date[date_key].extend(flights)
+    return {date_key: all_flights_by_date[date_key] for date_key in sorted(all_flights_by_date)}
+
+
+async def iter_flights_with_fallback(
+    departure_airport_iata: str,
+    arrival_airport_iata: str | None,
+    departure_date_str: str | None, # Используется для +/- offset ИЛИ если None -> годовой поиск
+    max_price: Decimal | None,      # Изменено на Decimal | None для консистентности
+    return_date_str: str | None = None, # Используется для +/- offset для обратного рейса
+    is_one_way: bool = True,
+    search_days_offset: int = 3,
+    # НОВЫЕ ПАРАМЕТРЫ для явного указания диапазона
+    explicit_departure_date_from: str | None = None,
+    explicit_departure_date_to: str | None = None,
+    explicit_return_date_from: str | None = None,
+    explicit_return_date_to: str | None = None
+):
+    """
+    Основная логика поиска рейсов, отдаёт результаты порциями по мере ответов API.
     1. Если explicit_departure_date_from/_to указаны, ищет в этом точном диапазоне.
     2. Если departure_date_str указан (и explicit НЕТ), ищет на эту дату и +/- search_days_offset.
     3. Если departure_date_str is None (и explicit НЕТ), ищет на ближайший год.
-    Возвращает словарь {дата_строка: [список_рейсов]} или пустой словарь.
+    Каждая порция — словарь {дата_строка: [список_рейсов]} по одному запросу к API
+    (для сценария 2 — по каждому запросу плана, как только он ответил).
+    Если дедлайн поиска истёк, после полученных порций поднимается SearchTimedOut.
     """
     all_flights_by_date = defaultdict(list)
 
@@ -240,29 +453,9 @@ async def find_flights_with_fallback(
         if flights_in_range:
             logger.info(f"API (явный диапазон) вернул {len(flights_in_range)} рейсов. Группировка по датам...")
             for flight in flights_in_range:
-                try:
-                    departure_time_obj = None
-                    if hasattr(flight, 'departureTime') and flight.departureTime: # one-way
-                        departure_time_obj = flight.departureTime
-                    elif hasattr(flight, 'outbound') and flight.outbound and hasattr(flight.outbound, 'departureTime'): # round-trip
-                        departure_time_obj = flight.outbound.departureTime
-                    
-                    if departure_time_obj:
-                        if isinstance(departure_time_obj, str):
-                            # Убедимся, что строка корректно парсится в datetime
-                            dt_parsed = datetime.fromisoformat(departure_time_obj.replace("Z", "+00:00"))
-                            dep_date_key = dt_parsed.strftime("%Y-%m-%d")
-                        elif isinstance(departure_time_obj, datetime):
-                            dep_date_key = departure_time_obj.strftime("%Y-%m-%d")
-                        else:
-                            dep_date_key = "unknown_date_explicit_range"
-                        all_flights_by_date[dep_date_key].append(flight)
-                    else:
-                        all_flights_by_date["unknown_time_explicit_range"].append(flight)
-                except Exception as e_group:
-                    logger.warning(f"Не удалось извлечь/сгруппировать дату из рейса при явном поиске по диапазону: {e_group}, рейс: {flight}")
-                    all_flights_by_date["error_grouping_explicit_range"].append(flight)
-        return dict(all_flights_by_date)
+                all_flights_by_date[flight.departure_date].append(flight)
+            yield dict(all_flights_by_date)
+        return
 
     # --- Сценарий 2: Указана одна дата вылета (для +/- search_days_offset) ---
     elif departure_date_str: # departure_date_str есть, а explicit_departure_date_from/to - нет
@@ -290,6 +483,7 @@ async def find_flights_with_fallback(
         
         dates_to_check.sort(key=lambda x: x[0] if x[0] else datetime.max) # Сортировка, учитывая None
 
+        probes = [] # (дата вылета, дата возврата) в порядке дат
         for dep_dt, ret_dt in dates_to_check:
             if not dep_dt: continue # Пропускаем, если дата вылета некорректна (маловероятно здесь)
 
@@ -301,21 +495,14 @@ async def find_flights_with_fallback(
                     logger.warning(f"Для offset-поиска дата возврата {ret_dt} раньше даты вылета {dep_dt}. Пропуск этой пары.")
                     continue
                 current_ret_date_str = ret_dt.strftime("%Y-%m-%d")
+            probes.append((current_dep_date_str, current_ret_date_str))
 
-            logger.info(f"Поиск на дату (offset): {current_dep_date_str} (возврат: {current_ret_date_str or 'N/A'})")
-            flights_on_date = await find_flights_api(
-                departure_airport_iata=departure_airport_iata,
-                arrival_airport_iata=arrival_airport_iata,
-                date_from_str=current_dep_date_str, # Ищем на конкретный день
-                date_to_str=current_dep_date_str,   # Ищем на конкретный день
-                max_price=max_price,
-                return_date_from_str=current_ret_date_str, # Ищем на конкретный день
-                return_date_to_str=current_ret_date_str    # Ищем на конкретный день
-            )
-            if flights_on_date:
-                all_flights_by_date[current_dep_date_str].extend(flights_on_date)
-        
-        return dict(all_flights_by_date)
+        # Планировщик превращает пробы по дням в минимальный набор запросов к API
+        plan = plan_upstream_calls([departure_airport_iata], arrival_airport_iata, probes)
+        async for _, batch in iter_search_plan(plan, max_price):
+            if batch:
+                yield batch
+        return
 
     # --- Сценарий 3: Даты не указаны (поиск на год вперед) ---
     else: # departure_date_str is None, и explicit_departure_date_from/to также None
@@ -347,148 +534,178 @@ async def find_flights_with_fallback(
         if flights_for_year:
             logger.info(f"API (годовой поиск) вернул {len(flights_for_year)} рейсов. Группировка по датам...")
             for flight in flights_for_year:
-                try:
-                    departure_time = None
-                    if hasattr(flight, 'departureTime') and flight.departureTime:
-                        departure_time = flight.departureTime
-                    elif hasattr(flight, 'outbound') and flight.outbound and hasattr(flight.outbound, 'departureTime'):
-                        departure_time = flight.outbound.departureTime
-                    
-                    if departure_time:
-                        if isinstance(departure_time, str):
-                            dep_date_key = datetime.fromisoformat(departure_time.replace("Z", "+00:00")).strftime("%Y-%m-%d")
-                        elif isinstance(departure_time, datetime):
-                            dep_date_key = departure_time.strftime("%Y-%m-%d")
-                        else:
-                            dep_date_key = "unknown_date_year_search"
-                        all_flights_by_date[dep_date_key].append(flight)
-                    else:
-                        all_flights_by_date["unknown_time_year_search"].append(flight)
-                except Exception as e:
-                    logger.warning(f"Не удалось извлечь/сгруппировать дату из рейса при годовом поиске: {e}, рейс: {flight}")
-                    all_flights_by_date["error_grouping_year_search"].append(flight)
-            return dict(all_flights_by_date)
-        return {} # Если flights_for_year пуст
+                all_flights_by_date[flight.departure_date].append(flight)
+            yield dict(all_flights_by_date)
     
-# ---------------------------------------------------------------------------
-# ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ДЛЯ TOP-3
-# ---------------------------------------------------------------------------
-
-def find_country_by_airport(airport_iata: str) -> str:
-    """Возвращает название страны по IATA-коду аэропорта (или '' если не найден)."""
-    for country, cities in config.COUNTRIES_DATA.items():
-        if airport_iata in cities.values():
-            return country
-    return ""
-
-# ---------------------------------------------------------------------------
-# TOP-3
-# ---------------------------------------------------------------------------
-async def get_cheapest_flights_top3(search_params: dict, limit: int = 3) -> list[dict]:
-    """
-    Возвращает list из 'limit' самых дешёвых рейсов.
-    Берём пул через find_flights_with_fallback() → плоский список → сортируем.
-    """
-    flights_by_date = await find_flights_with_fallback(
-        departure_airport_iata = search_params.get("departure_airport_iata"),
-        arrival_airport_iata   = search_params.get("arrival_airport_iata"),
-        departure_date_str     = search_params.get("departure_date_str"),
-        return_date_str        = search_params.get("return_date_str"),
-        is_one_way             = search_params.get("is_one_way", True),
-        max_price              = search_params.get("max_price"),
-        search_days_offset     = search_params.get("search_days_offset", 3),
-    )
-
-    if not flights_by_date:
-        return []
-
-    flat = []
-    for flights in flights_by_date.values():
-        for f in flights:
-            price = helpers.get_flight_price(f)
-            if price is not None:
-                flat.append((price, f))
-
-    if not flat:
-        return []
-
-    flat.sort(key=lambda x: x[0])
-    top = flat[:limit]
-
-    res = []
-    for price, flight in top:
-        dep_iata = getattr(flight, "origin", "")[-3:]
-        arr_iata = getattr(flight, "destination", "")[-3:]
-        res.append({
-            "price": price,
-            "flight": flight,
-            "departure_country": find_country_by_airport(dep_iata),
-            "arrival_country":   find_country_by_airport(arr_iata),
-            # остальные поля handlers_top3 использует по желанию
-        })
-    return res
-
 # ---------------------------------------------------------------------------
 # TOP-3: агрегируем рейсы из пула аэропортов и берём общую тройку
 # ---------------------------------------------------------------------------
-from decimal import Decimal
-from . import helpers, config
-
-async def get_cheapest_flights_top3(search_params: dict, limit: int = 3) -> list[dict]:
+async def get_cheapest_flights_top3(search_params: dict, limit: int = 3,
+                                    unique_destinations: bool = False) -> list[dict]:
     """
     • Если указан departure_airport_iata – ищем из него.
     • Если None и в user_data есть 'airport_pool' – перебираем первые 5 аэропортов этого пула.
     • Иначе берём список config.POPULAR_DEPARTURE_AIRPORTS.
 
+    Аэропорты опрашиваются параллельно с общим дедлайном TOP3_SEARCH_DEADLINE_SEC;
+    рейсы каждого сразу проходят через ограниченную кучу TopKAggregator,
+    общий список всех рейсов пула не собирается и не сортируется.
+    unique_destinations=True — не больше одного (самого дешёвого) рейса на направление.
+
     Возвращаем список словарей:
-        {"price": Decimal, "flight": FlightObj,
-         "departure_country": str, "arrival_country": str}
+        {"price": Decimal, "flight": FlightRecord,
+         "departure_country": str, "arrival_country": str,
+         "partial": bool}  # True — часть аэропортов не ответила, результат по остальным
+    SearchTimedOut — ничего не найдено, но часть аэропортов не уложилась в дедлайн.
     """
     dep_iata = search_params.get("departure_airport_iata")
     airport_pool = ([dep_iata] if dep_iata
                     else search_params.get("airport_pool",
                                            config.POPULAR_DEPARTURE_AIRPORTS)[:5])
 
-    flat: list[tuple[Decimal, object, str]] = []
+    top = TopKAggregator(limit, unique_destinations=unique_destinations)
+    use_prewarmed = _is_prewarmable_top3_search(search_params)
+
+    async def _search(dep: str) -> dict[str, list]:
+        return await find_flights_with_fallback(
+            departure_airport_iata = dep,
+            arrival_airport_iata   = search_params.get("arrival_airport_iata"),
+            departure_date_str     = search_params.get("departure_date_str"),
+            return_date_str        = search_params.get("return_date_str"),
+            is_one_way             = search_params.get("is_one_way", True),
+            max_price              = search_params.get("max_price"),
+            search_days_offset     = search_params.get("search_days_offset", 3),
+        )
 
+    tasks: dict[asyncio.Task, str] = {}
     for dep in airport_pool:
-        try:
-            flights_by_date = await find_flights_with_fallback(
-                departure_airport_iata = dep,
-                arrival_airport_iata   = search_params.get("arrival_airport_iata"),
-                departure_date_str     = search_params.get("departure_date_str"),
-                return_date_str        = search_params.get("return_date_str"),
-                is_one_way             = search_params.get("is_one_way", True),
-                max_price              = search_params.get("max_price"),
-                search_days_offset     = search_params.get("search_days_offset", 3),
-            )
-        except Exception as e:
-            logger.warning(f"Ryanair API error for {dep}: {e}")
-            continue
-
-        for flights in flights_by_date.values():
-            for fl in flights:
-                price = helpers.get_flight_price(fl)
-                if price is not None and price != Decimal('inf'):
-                    flat.append((price, fl, dep))
+        # Сначала пробуем прогретый фоновой задачей пул хабов
+        flights_by_date = get_prewarmed_top3_flights(dep, search_params.get("max_price")) if use_prewarmed else None
+        if flights_by_date is not None:
+            logger.info(f"Top-3: результаты для {dep} взяты из прогретого пула.")
+            for flights in flights_by_date.values():
+                top.add_many(flights)
+        else:
+            tasks[asyncio.create_task(_search(dep))] = dep
 
-    if not flat:
-        return []
+    # Аэропорты опрашиваются параллельно; рейсы попадают в top-k по мере готовности каждого
+    partial = False
+    timed_out = False
+    pending = set(tasks)
+    deadline = time.monotonic() + search_tasks.time_left(config.TOP3_SEARCH_DEADLINE_SEC)
+    try:
+        while pending:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                dep = tasks[task]
+                if task.exception():
+                    if isinstance(task.exception(), search_tasks.SearchTimedOut):
+                        timed_out = True
+                    else:
+                        logger.warning(f"Ryanair API error for {dep}: {task.exception()}")
+                    partial = True
+                    continue
+                for flights in (task.result() or {}).values():
+                    top.add_many(flights)
+    finally:
+        # Дедлайн или отмена поиска — оставшиеся аэропорты больше не ждём
+        for task in pending:
+            task.cancel()
+
+    if pending:
+        partial = True
+        timed_out = True
+        logger.warning(
+            f"Top-3: дедлайн поиска истёк, не ответили: "
+            f"{', '.join(sorted(tasks[t] for t in pending))}. Показываем результат по остальным."
+        )
+        await asyncio.gather(*pending, return_exceptions=True)
 
-    # сортируем и берём TOP-N
-    flat.sort(key=lambda x: x[0])
-    top = flat[:limit]
+    if timed_out and not top.result():
+        raise search_tasks.SearchTimedOut()
 
     res = []
-    for price, fl, dep in top:
-        arr_iata = getattr(fl, "destination", "")[-3:]
+    for fl in top.result():
         res.append({
-            "price": price,                 # ← ключ, который потом используется в handlers_top3
+            "price": fl.price,                 # ← ключ, который потом используется в handlers_top3
             "flight": fl,
-            "departure_country": find_country_by_airport(dep),
-            "arrival_country":   find_country_by_airport(arr_iata),
+            "departure_country": airport_index.country_by_iata(fl.origin),
+            "arrival_country":   airport_index.country_by_iata(fl.destination),
+            "partial": partial,                # часть аэропортов не ответила (ошибка или дедлайн)
         })
     return res
 
 
+# ---------------------------------------------------------------------------
+# TOP-3: фоновый прогрев пула популярных хабов («отовсюду»)
+# ---------------------------------------------------------------------------
+# {IATA хаба: (время обновления по time.monotonic(), {дата: [рейсы]})}, цены без max_price
+_top3_pool_cache: dict[str, tuple[float, dict[str, list]]] = {}
+
+
+def _is_prewarmable_top3_search(search_params: dict) -> bool:
+    """Поиск совпадает с тем, что прогревает фон: туда-обратно, без направления и без дат."""
+    return (
+        not search_params.get("is_one_way", True)
+        and not search_params.get("arrival_airport_iata")
+        and not search_params.get("departure_date_str")
+        and not search_params.get("return_date_str")
+    )
+
+
+def get_prewarmed_top3_flights(dep_iata: str, max_price: Decimal | None) -> dict[str, list] | None:
+    """Прогретые рейсы хаба {дата: [рейсы]} с фильтром по max_price или None, если данных нет или они устарели."""
+    entry = _top3_pool_cache.get(dep_iata)
+    if not entry:
+        return None
+    refreshed_at, flights_by_date = entry
+    if time.monotonic() - refreshed_at > config.TOP3_PREWARM_MAX_AGE_SEC:
+        return None
+    if max_price is None:
+        return flights_by_date
+    max_cents = price_to_cents(max_price)
+    filtered: dict[str, list] = {}
+    for date_key, flights in flights_by_date.items():
+        cheap = [fl for fl in flights if fl.price_cents is not None and fl.price_cents <= max_cents]
+        if cheap:
+            filtered[date_key] = cheap
+    return filtered
+
+
+async def refresh_top3_pool() -> int:
+    """Обновляет результаты для config.POPULAR_DEPARTURE_AIRPORTS. Возвращает число обновлённых хабов."""
+    # Фоновые запросы уступают токены интерактивным поискам пользователей
+    rate_limiter.request_priority.set(rate_limiter.PRIORITY_BACKGROUND)
+    semaphore = asyncio.Semaphore(max(1, config.TOP3_PREWARM_CONCURRENCY))
+
+    async def _refresh(dep: str) -> bool:
+        async with semaphore:
+            flights_by_date = await find_flights_with_fallback(
+                departure_airport_iata=dep,
+                arrival_airport_iata=None,
+                departure_date_str=None,
+                max_price=None,
+                is_one_way=False,
+            )
+        if not flights_by_date:
+            # Пустой ответ может быть ошибкой API — оставляем прежние данные
+            logger.warning(f"Прогрев Top-3: для {dep} ничего не получено, оставляем прежние данные.")
+            return False
+        _top3_pool_cache[dep] = (time.monotonic(), flights_by_date)
+        return True
+
+    results = await asyncio.gather(
+        *(_refresh(dep) for dep in config.POPULAR_DEPARTURE_AIRPORTS),
+        return_exceptions=True,
+    )
+    refreshed = sum(1 for r in results if r is True)
+    logger.info(f"Прогрев Top-3: обновлено {refreshed} из {len(config.POPULAR_DEPARTURE_AIRPORTS)} хабов.")
+    return refreshed
+
 
+async def refresh_top3_pool_job(context) -> None:
+    """Задача для job_queue: периодический прогрев пула хабов для Top-3."""
+    await refresh_top3_pool()
@@ -0,0 +1,191 @@
+# bot/flight_record.py
+"""
+Компактное нормализованное представление рейса.
+
+Объекты ryanair-py (Flight / Trip) разбираются один раз при получении ответа API:
+время вылета, дата, цена в центах и IATA-коды считаются заранее, поэтому
+сортировка, фильтрация и форматирование больше не делают hasattr,
+datetime.fromisoformat(...) и Decimal(str(price)) для каждого рейса.
+"""
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Dict, Optional
+
+
+def _parse_departure_time(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str) and value:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return None
+
+
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _to_epoch(dt: datetime) -> int:
+    # Ryanair отдаёт местное время аэропорта без таймзоны — считаем его как есть
+    if dt.tzinfo is None:
+        return int((dt - _EPOCH_NAIVE).total_seconds())
+    return int((dt - _EPOCH_UTC).total_seconds())
+
+
+def price_to_cents(value: Any) -> Optional[int]:
+    """Цена (Decimal, float, str) в целых центах с округлением; None — если цена не разбирается."""
+    if value is None:
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            # Цены Ryanair — не больше двух знаков после запятой, round() здесь точен
+            return int(round(value * 100))
+        return int((Decimal(str(value)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError, OverflowError):
+        return None
+
+
+def format_cents(cents: Optional[int]) -> str:
+    """12345 -> '123.45', None -> 'N/A'."""
+    if cents is None:
+        return "N/A"
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+class FlightLeg:
+    """Один перелёт (туда или обратно)."""
+    __slots__ = (
+        "departure_time", "departure_epoch", "departure_date",
+        "flight_number", "price_cents", "currency",
+        "origin", "origin_full", "destination", "destination_full",
+    )
+
+    def __init__(self, departure_time: datetime, flight_number: str, price_cents: Optional[int],
+                 currency: str, origin: str, origin_full: str, destination: str, destination_full: str):
+        self.departure_time = departure_time
+        self.departure_epoch = _to_epoch(departure_time)
+        self.departure_date = departure_time.date().isoformat()
+        self.flight_number = flight_number
+        self.price_cents = price_cents
+        self.currency = currency
+        self.origin = origin
+        self.origin_full = origin_full
+        self.destination = destination
+        self.destination_full = destination_full
+
+    @classmethod
+    def from_raw(cls, raw: Any) -> Optional["FlightLeg"]:
+        """Строит перелёт из объекта ryanair-py. None — если нет времени вылета."""
+        departure_time = _parse_departure_time(getattr(raw, "departureTime", None))
+        if departure_time is None:
+            return None
+        return cls(
+            departure_time=departure_time,
+            flight_number=str(getattr(raw, "flightNumber", "N/A")),
+            price_cents=price_to_cents(getattr(raw, "price", None)),
+            currency=str(getattr(raw, "currency", None) or "EUR"),
+            origin=str(getattr(raw, "origin", "") or "")[-3:].upper(),
+            origin_full=str(getattr(raw, "originFull", "N/A")),
+            destination=str(getattr(raw, "destination", "") or "")[-3:].upper(),
+            destination_full=str(getattr(raw, "destinationFull", "N/A")),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "departure_time": self.departure_time.isoformat(),
+            "flight_number": self.flight_number,
+            "price_cents": self.price_cents,
+            "currency": self.currency,
+            "origin": self.origin,
+            "origin_full": self.origin_full,
+            "destination": self.destination,
+            "destination_full": self.destination_full,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FlightLeg":
+        return cls(
+            departure_time=datetime.fromisoformat(data["departure_time"]),
+            flight_number=data["flight_number"],
+            price_cents=data["price_cents"],
+            currency=data["currency"],
+            origin=data["origin"],
+            origin_full=data["origin_full"],
+            destination=data["destination"],
+            destination_full=data["destination_full"],
+        )
+
+
+class FlightRecord:
+    """
+    Рейс в одну сторону (inbound is None) или туда-обратно.
+    Поля верхнего уровня относятся к вылету «туда», price_cents — общая цена.
+    """
+    __slots__ = (
+        "outbound", "inbound", "price_cents", "currency",
+        "departure_epoch", "departure_date", "origin", "destination",
+    )
+
+    def __init__(self, outbound: FlightLeg, inbound: Optional[FlightLeg] = None,
+                 total_price_cents: Optional[int] = None):
+        self.outbound = outbound
+        self.inbound = inbound
+        if inbound is None:
+            self.price_cents = outbound.price_cents
+        elif outbound.price_cents is not None and inbound.price_cents is not None:
+            self.price_cents = outbound.price_cents + inbound.price_cents
+        else:
+            self.price_cents = total_price_cents
+        self.currency = outbound.currency
+        self.departure_epoch = outbound.departure_epoch
+        self.departure_date = outbound.departure_date
+        self.origin = outbound.origin
+        self.destination = outbound.destination
+
+    @property
+    def is_round_trip(self) -> bool:
+        return self.inbound is not None
+
+    @property
+    def price(self) -> Decimal:
+        """Общая цена в Decimal (Decimal('inf'), если цена неизвестна)."""
+        if self.price_cents is None:
+            return Decimal("inf")
+        return Decimal(self.price_cents).scaleb(-2)
+
+    @classmethod
+    def from_raw(cls, raw: Any) -> Optional["FlightRecord"]:
+        """Строит запись из Flight (в одну сторону) или Trip (туда-обратно) ryanair-py."""
+        outbound_raw = getattr(raw, "outbound", None)
+        if outbound_raw is not None:
+            outbound = FlightLeg.from_raw(outbound_raw)
+            inbound_raw = getattr(raw, "inbound", None)
+            inbound = FlightLeg.from_raw(inbound_raw) if inbound_raw is not None else None
+            if outbound is None or inbound is None:
+                return None
+            return cls(outbound, inbound, price_to_cents(getattr(raw, "totalPrice", None)))
+        outbound = FlightLeg.from_raw(raw)
+        if outbound is None:
+            return None
+        return cls(outbound)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "outbound": self.outbound.to_dict(),
+            "inbound": self.inbound.to_dict() if self.inbound else None,
+            "price_cents": self.price_cents,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FlightRecord":
+        inbound = data.get("inbound")
+        return cls(
+            FlightLeg.from_dict(data["outbound"]),
+            FlightLeg.from_dict(inbound) if inbound else None,
+            data.get("price_cents"),
+        )
+
+    def __repr__(self) -> str:
+        route = f"{self.origin}->{self.destination}"
+        if self.inbound:
+            route += f"->{self.inbound.destination}"
+        return f"FlightRecord({route}, {self.departure_date}, {format_cents(self.price_cents)} {self.currency})"
@@ -0,0 +1,103 @@
+# bot/flight_table.py
+"""
+Компактный индекс по набору рейсов для больших выдач («куда угодно», поиск на год).
+
+FlightTable хранит рядом со списком FlightRecord два массива array — цену в центах и номер
+дня вылета — и смещение записи в общем списке. Отбор самых дешёвых рейсов, группировка по
+датам и сортировка по цене идут обычными циклами Python по этим целочисленным ключам,
+без повторного разбора цен и дат из записей; сами записи достаются только для результата.
+"""
+from array import array
+from itertools import compress
+from typing import Dict, Iterable, List, Optional
+
+from .flight_record import FlightRecord
+
+# Цена неизвестна: такие рейсы всегда оказываются в конце сортировки
+NO_PRICE = 2 ** 62
+
+_SECONDS_PER_DAY = 86400
+
+
+class FlightTable:
+    """
+    Колонки (по одной позиции на рейс):
+    • price_cents — общая цена в центах (NO_PRICE, если цены нет);
+    • day — номер дня вылета «туда» (дни от 1970-01-01 по местному времени вылета);
+    • row — смещение записи в records (отфильтрованные таблицы делят один список records).
+    Используется в helpers.filter_cheapest_flights (cheapest_only().group_by_date())
+    и при выводе результатов поиска (sorted_by_price()).
+    """
+    __slots__ = ("records", "price_cents", "day", "row")
+
+    def __init__(self, records: List[FlightRecord], price_cents: array, day: array, row: array):
+        self.records = records
+        self.price_cents = price_cents
+        self.day = day
+        self.row = row
+
+    # --- построение ---
+
+    @classmethod
+    def from_records(cls, records: Iterable[FlightRecord]) -> "FlightTable":
+        records = list(records)
+        return cls(
+            records,
+            array("q", [NO_PRICE if r.price_cents is None else r.price_cents for r in records]),
+            array("l", [r.departure_epoch // _SECONDS_PER_DAY for r in records]),
+            array("l", range(len(records))),
+        )
+
+    @classmethod
+    def from_grouped(cls, flights_by_date: Dict[str, List[FlightRecord]]) -> "FlightTable":
+        """Из словаря {дата: [рейсы]}, который возвращает find_flights_with_fallback."""
+        return cls.from_records(flight for flights in flights_by_date.values() for flight in flights)
+
+    def __len__(self) -> int:
+        return len(self.row)
+
+    # --- отбор (возвращает новую таблицу над теми же records) ---
+
+    def _select(self, mask: Iterable[bool]) -> "FlightTable":
+        mask = list(mask)
+        return FlightTable(
+            self.records,
+            array("q", compress(self.price_cents, mask)),
+            array("l", compress(self.day, mask)),
+            array("l", compress(self.row, mask)),
+        )
+
+    def min_price(self) -> Optional[int]:
+        """Минимальная известная цена в центах или None."""
+        if not self.price_cents:
+            return None
+        cheapest = min(self.price_cents)
+        return None if cheapest == NO_PRICE else cheapest
+
+    def cheapest_only(self) -> "FlightTable":
+        """Все рейсы с минимальной ценой в таблице."""
+        cheapest = self.min_price()
+        if cheapest is None:
+            return self._select(())
+        return self._select(p == cheapest for p in self.price_cents)
+
+    # --- результат ---
+
+    def _records_at(self, positions: Iterable[int]) -> List[FlightRecord]:
+        records, row = self.records, self.row
+        return [records[row[i]] for i in positions]
+
+    def sorted_by_price(self) -> List[FlightRecord]:
+        """Все записи по возрастанию цены (при равной цене — в исходном порядке)."""
+        return self._records_at(sorted(range(len(self.row)), key=self.price_cents.__getitem__))
+
+    def group_by_date(self) -> Dict[str, List[FlightRecord]]:
+        """{дата 'YYYY-MM-DD': [рейсы]} в порядке дат, внутри даты — исходный порядок."""
+        by_day: Dict[int, List[int]] = {}
+        for i, d in enumerate(self.day):
+            by_day.setdefault(d, []).append(i)
+        result: Dict[str, List[FlightRecord]] = {}
+        for d in sorted(by_day):
+            day_records = self._records_at(by_day[d])
+            result[day_records[0].departure_date] = day_records
+        return result
@@ -1,10 +1,17 @@
 # bot/fx_rates.py
+import asyncio
 import logging
 import httpx
 import aiosqlite
 import json
 from datetime import datetime
-from typing import Dict, Optional, Set
+from itertools import product
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+from telegram.ext import ContextTypes
+
+from . import config
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +21,21 @@ BASE_CURRENCY = "EUR"
 CURRENCIES_TO_CACHE = ["PLN", "UAH", "GBP", "CHF", "CZK", "HUF", "RON", "SEK", "NOK", "DKK", "BGN"]
 
 _http_client: Optional[httpx.AsyncClient] = None
+# Пока frankfurter.dev не отвечает, обновление курсов не ждёт его 10-секундный таймаут
+circuit = CircuitBreaker(
+    "frankfurter.dev", config.ENRICHMENT_CIRCUIT_FAILURE_THRESHOLD, config.ENRICHMENT_CIRCUIT_RESET_SEC
+)
+
+class _Snapshot(NamedTuple):
+    date: str                                     # дата загрузки
+    rates: Dict[str, float]                       # {валюта: курс к EUR}
+    lines: Dict[Tuple[str, str], Optional[str]]   # {(валюта вылета, валюта прилёта): готовая строка}
+
+# Снимок курсов в памяти. Курсы меняются раз в день, поэтому форматирование рейса
+# только читает словарь — без БД и сети. Обновление идёт под _refresh_lock
+# и подменяет снимок (курсы вместе с готовыми строками) одним присваиванием.
+_snapshot: Optional[_Snapshot] = None
+_refresh_lock = asyncio.Lock()
 
 async def get_client() -> httpx.AsyncClient:
     global _http_client
@@ -33,41 +55,11 @@ async def init_db():
         await db.commit()
     logger.info("Таблица 'fx_rates' для кэша валют инициализирована.")
 
-async def get_rates() -> Optional[Dict[str, float]]:
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    try:
-        async with aiosqlite.connect(DB_FILE) as db:
-            async with db.execute("SELECT rates_json FROM fx_rates WHERE date = ?", (today_str,)) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    try: return json.loads(row[0])
-                    except json.JSONDecodeError: logger.error(f"Ошибка декодирования JSON из кэша БД для даты {today_str}.")
-    except Exception as e: logger.error(f"Ошибка при доступе к кэшу БД fx_rates: {e}")
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
 
-    logger.info("Курсы в кэше не найдены. Запрос к API frankfurter.dev...")
-    try:
-        client = await get_client()
-        params = {"base": BASE_CURRENCY, "symbols": ",".join(CURRENCIES_TO_CACHE)}
-        response = await client.get("https://api.frankfurter.dev/v1/latest", params=params)
-        response.raise_for_status()
-        data = response.json()
-        if "rates" in data:
-            rates = data["rates"]
-            async with aiosqlite.connect(DB_FILE) as db:
-                await db.execute("INSERT OR REPLACE INTO fx_rates (date, rates_json) VALUES (?, ?)", (today_str, json.dumps(rates)))
-                await db.commit()
-            logger.info(f"Свежие курсы валют от frankfurter.dev сохранены в кэш.")
-            return rates
-        else:
-            logger.error(f"API frankfurter.dev не вернул ожидаемый ответ: {data}")
-            return None
-    except Exception as e:
-        logger.error(f"Ошибка при получении или сохранении курсов валют: {e}", exc_info=True)
-        return None
-
-async def format_rates(origin_currency: str, destination_currency: str) -> Optional[str]:
+def _render_rates(all_rates: Dict[str, float], origin_currency: str, destination_currency: str) -> Optional[str]:
     if origin_currency == destination_currency: return None
-    all_rates = await get_rates()
     if not all_rates: return None
 
     symbols_to_display: Set[str] = set()
@@ -87,4 +79,105 @@ async def format_rates(origin_currency: str, destination_currency: str) -> Optio
     
     if not parts: return None
     
-    return f"💱 { ' • '.join(parts) }\n"
\ No newline at end of file
+    return f"💱 { ' • '.join(parts) }\n"
+
+def _make_snapshot(date_str: str, rates: Dict[str, float]) -> _Snapshot:
+    """Снимок с заранее отрисованными строками для всех пар валют из COUNTRY_TO_CURRENCY."""
+    currencies = set(config.COUNTRY_TO_CURRENCY.values())
+    lines = {
+        (origin, destination): _render_rates(rates, origin, destination)
+        for origin, destination in product(currencies, repeat=2)
+    }
+    return _Snapshot(date_str, rates, lines)
+
+async def _load_latest_from_db() -> Optional[_Snapshot]:
+    try:
+        async with aiosqlite.connect(DB_FILE) as db:
+            async with db.execute("SELECT date, rates_json FROM fx_rates ORDER BY date DESC LIMIT 1") as cursor:
+                row = await cursor.fetchone()
+        if row:
+            return _make_snapshot(row[0], json.loads(row[1]))
+    except json.JSONDecodeError:
+        logger.error("Ошибка декодирования JSON из кэша БД fx_rates.")
+    except Exception as e:
+        logger.error(f"Ошибка при доступе к кэшу БД fx_rates: {e}")
+    return None
+
+async def _fetch_rates() -> Optional[Dict[str, float]]:
+    logger.info("Запрос курсов валют к API frankfurter.dev...")
+    try:
+        client = await get_client()
+        params = {"base": BASE_CURRENCY, "symbols": ",".join(CURRENCIES_TO_CACHE)}
+        response = await circuit.request(lambda: client.get("https://api.frankfurter.dev/v1/latest", params=params))
+        response.raise_for_status()
+        data = response.json()
+        if "rates" in data:
+            return data["rates"]
+        logger.error(f"API frankfurter.dev не вернул ожидаемый ответ: {data}")
+        return None
+    except CircuitOpenError:
+        logger.warning("frankfurter.dev отключён предохранителем, курсы не обновлены.")
+        return None
+    except Exception as e:
+        logger.error(f"Ошибка при получении курсов валют: {e}", exc_info=True)
+        return None
+
+async def refresh_rates(force: bool = False) -> bool:
+    """
+    Загружает свежие курсы, сохраняет их в SQLite и подменяет снимок в памяти.
+    Без force ничего не делает, если снимок уже за сегодня. True — снимок актуален.
+    """
+    global _snapshot
+    async with _refresh_lock:
+        today_str = _today()
+        if not force and _snapshot and _snapshot.date == today_str:
+            return True
+        rates = await _fetch_rates()
+        if not rates:
+            return False
+        try:
+            async with aiosqlite.connect(DB_FILE) as db:
+                await db.execute("INSERT OR REPLACE INTO fx_rates (date, rates_json) VALUES (?, ?)", (today_str, json.dumps(rates)))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении курсов валют в БД: {e}")
+        _snapshot = _make_snapshot(today_str, rates)
+        logger.info(f"Курсы валют обновлены: {len(rates)} валют за {today_str}, {len(_snapshot.lines)} пар валют.")
+        return True
+
+async def load_rates():
+    """При запуске: последний снимок из SQLite в память (без сети, свежие курсы догрузит задача)."""
+    global _snapshot
+    async with _refresh_lock:
+        if _snapshot is None:
+            _snapshot = await _load_latest_from_db()
+            if _snapshot:
+                logger.info(f"Курсы валют за {_snapshot.date} загружены из БД.")
+
+async def _refresh_with_retry(context: ContextTypes.DEFAULT_TYPE, force: bool) -> None:
+    if not await refresh_rates(force=force):
+        logger.warning(f"Курсы валют не обновлены, повтор через {config.FX_REFRESH_RETRY_SEC} с.")
+        context.job_queue.run_once(refresh_stale_rates_job, config.FX_REFRESH_RETRY_SEC)
+
+async def refresh_rates_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Ежедневная задача после публикации курсов ЕЦБ; при неудаче — повтор через FX_REFRESH_RETRY_SEC."""
+    await _refresh_with_retry(context, force=True)
+
+async def refresh_stale_rates_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Разовая задача (запуск, повтор): обновляет курсы, только если снимок не сегодняшний."""
+    await _refresh_with_retry(context, force=False)
+
+def get_rates() -> Optional[Dict[str, float]]:
+    """Текущие курсы из памяти (без I/O) или None, если их ещё ни разу не удалось загрузить."""
+    snapshot = _snapshot
+    return snapshot.rates if snapshot else None
+
+def format_rates(origin_currency: str, destination_currency: str) -> Optional[str]:
+    """Готовая строка курсов для пары валют — одно обращение к словарю снимка."""
+    snapshot = _snapshot
+    if snapshot is None: return None
+    key = (origin_currency, destination_currency)
+    if key in snapshot.lines:
+        return snapshot.lines[key]
+    # Валюта не из COUNTRY_TO_CURRENCY — отрисовываем на месте
+    return _render_rates(snapshot.rates, origin_currency, destination_currency)
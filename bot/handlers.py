@@ -1,4 +1,5 @@
 # bot/handlers.py
+import asyncio
 import logging
 import os
 from telegram import Update, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery # Добавлен CallbackQuery
@@ -21,6 +22,12 @@ from . import config, keyboards, helpers, flight_api, message_formatter
 from . import user_history
 from .config import PriceChoice
 from . import user_stats
+from .flight_table import FlightTable
+from .flight_record import format_cents
+from .live_message import LiveMessage
+from .top_k import TopKAggregator
+from .airport_index import airport_index
+from .search_tasks import SearchCancelled, SearchTimedOut, searches
 # Импортируем ВСЕ константы, включая новые CB_BACK_... и MSG_FLIGHT_TYPE_PROMPT
 from .config import (
     S_SELECTING_FLIGHT_TYPE, S_SELECTING_DEPARTURE_COUNTRY, S_SELECTING_DEPARTURE_CITY,
@@ -357,6 +364,29 @@ async def ask_specific_date(source_update_or_query: Union[Update, CallbackQuery,
 # bot/handlers.py
 # ... (после ask_... функций) ...
 
+def _format_search_progress(preview: TopKAggregator, collected: Dict[str, list], finished: bool = False,
+                            timed_out: bool = False) -> str:
+    """Текст живого сообщения о ходе поиска: сколько найдено и самые дешёвые на данный момент."""
+    flights_count = sum(len(flights) for flights in collected.values())
+    if finished and timed_out:
+        header = f"⏱ Время поиска истекло, результаты неполные. Найдено рейсов: {flights_count}."
+    elif finished:
+        header = f"✅ Поиск завершён. Найдено рейсов: {flights_count}."
+    else:
+        header = f"⏳ Идёт поиск… Найдено рейсов: {flights_count} (дат: {len(collected)})."
+    best = preview.result()
+    if not best or finished:
+        return header
+    lines = [header, "Самые дешёвые на данный момент:"]
+    for flight in best:
+        arrow = "⇄" if flight.is_round_trip else "→"
+        lines.append(
+            f"• {flight.departure_date} {flight.origin}{arrow}{flight.destination} — "
+            f"{format_cents(flight.price_cents)} {flight.currency}"
+        )
+    return "\n".join(lines)
+
+
 # ПОЛНОСТЬЮ ИСПРАВЛЕННЫЙ МЕТОД launch_flight_search
 async def launch_flight_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
@@ -418,27 +448,52 @@ async def launch_flight_search(update: Update, context: ContextTypes.DEFAULT_TYP
             # ... (существующая логика отправки сообщения об ошибке) ...
             return ConversationHandler.END
         
-        if effective_chat_id: # Отправляем сообщение о начале поиска
-            await context.bot.send_message(chat_id=effective_chat_id, text=config.MSG_SEARCHING_FLIGHTS)
-
-        all_flights_data: Dict[str, list] = await flight_api.find_flights_with_fallback(
-            departure_airport_iata=dep_iata,
-            arrival_airport_iata=arr_iata,
-            departure_date_str=dep_date_for_offset_or_year_search, # Для +/- offset или годового поиска
-            max_price=user_max_price,
-            return_date_str=ret_date_for_offset_search, # Для +/- offset
-            is_one_way=is_one_way,
-            # Новые параметры для явного диапазона
-            explicit_departure_date_from=explicit_dep_date_from,
-            explicit_departure_date_to=explicit_dep_date_to,
-            explicit_return_date_from=explicit_ret_date_from,
-            explicit_return_date_to=explicit_ret_date_to
-        )
+        live = None
+        if effective_chat_id: # Сообщение о начале поиска, дальше правим его по мере ответов API
+            live = LiveMessage(context.bot, effective_chat_id, config.SEARCH_PROGRESS_EDIT_INTERVAL_SEC)
+            await live.start(config.MSG_SEARCHING_FLIGHTS)
+
+        collected: Dict[str, list] = defaultdict(list)
+        preview = TopKAggregator(config.SEARCH_PROGRESS_PREVIEW_SIZE)
+
+        async def _stream_search() -> None:
+            async for batch in flight_api.iter_flights_with_fallback(
+                departure_airport_iata=dep_iata,
+                arrival_airport_iata=arr_iata,
+                departure_date_str=dep_date_for_offset_or_year_search, # Для +/- offset или годового поиска
+                max_price=user_max_price,
+                return_date_str=ret_date_for_offset_search, # Для +/- offset
+                is_one_way=is_one_way,
+                # Новые параметры для явного диапазона
+                explicit_departure_date_from=explicit_dep_date_from,
+                explicit_departure_date_to=explicit_dep_date_to,
+                explicit_return_date_from=explicit_ret_date_from,
+                explicit_return_date_to=explicit_ret_date_to
+            ):
+                for date_str, flights_on_date in batch.items():
+                    collected[date_str].extend(flights_on_date)
+                    preview.add_many(flights_on_date)
+                if live:
+                    await live.update(_format_search_progress(preview, collected))
+
+        # Поиск привязан к пользователю: /cancel или новый поиск останавливают его вместе с запросами к API
+        timed_out = False
+        try:
+            await searches.run(update.effective_user.id, _stream_search(), config.SEARCH_DEADLINE_SEC)
+        except SearchCancelled:
+            logger.info("launch_flight_search: поиск отменён пользователем, результаты не отправляем.")
+            if live:
+                await live.finish("🛑 Поиск остановлен.")
+            return ConversationHandler.END
+        except SearchTimedOut:
+            # Показываем то, что успело прийти, но не выдаём это за полный ответ
+            logger.warning("launch_flight_search: дедлайн поиска истёк, результаты неполные.")
+            timed_out = True
 
-        logger.info(f"API flight_api.find_flights_with_fallback вернул: {'Данные есть (ключи: ' + str(list(all_flights_data.keys())) + ')' if isinstance(all_flights_data, dict) and all_flights_data else 'Пустой результат или не словарь'}")
-        if not isinstance(all_flights_data, dict):
-             logger.warning(f"find_flights_with_fallback вернул не словарь: {type(all_flights_data)}")
-             all_flights_data = {}
+        all_flights_data: Dict[str, list] = {date_str: collected[date_str] for date_str in sorted(collected)}
+        logger.info(f"Поиск flight_api.iter_flights_with_fallback вернул: {'Данные есть (ключи: ' + str(list(all_flights_data.keys())) + ')' if all_flights_data else 'Пустой результат'}")
+        if live:
+            await live.finish(_format_search_progress(preview, collected, finished=True, timed_out=timed_out))
 
         final_flights_to_show: Dict[str, list]
         if price_preference == config.CALLBACK_PRICE_LOWEST and all_flights_data:
@@ -448,7 +503,7 @@ async def launch_flight_search(update: Update, context: ContextTypes.DEFAULT_TYP
             final_flights_to_show = all_flights_data
             logger.info(f"Для '{price_preference}': используются все полученные рейсы ({'Данные есть' if final_flights_to_show else 'Пусто'})")
 
-        return await process_and_send_flights(update, context, final_flights_to_show)
+        return await process_and_send_flights(update, context, final_flights_to_show, timed_out=timed_out)
 
     except Exception as e:
         logger.error(f"Критическая ошибка в launch_flight_search: {e}", exc_info=True)
@@ -461,7 +516,9 @@ async def launch_flight_search(update: Update, context: ContextTypes.DEFAULT_TYP
 
 # bot/handlers.py
 
-async def process_and_send_flights(update: Update, context: ContextTypes.DEFAULT_TYPE, flights_by_date: Dict[str, list]) -> int:
+async def process_and_send_flights(update: Update, context: ContextTypes.DEFAULT_TYPE, flights_by_date: Dict[str, list],
+                                   timed_out: bool = False) -> int:
+    """timed_out — дедлайн поиска истёк: пустой результат не означает, что рейсов нет."""
     chat_id = update.effective_chat.id if update.effective_chat else None
     if not chat_id and update.callback_query and update.callback_query.message:
         chat_id = update.callback_query.message.chat_id
@@ -471,7 +528,9 @@ async def process_and_send_flights(update: Update, context: ContextTypes.DEFAULT
         return ConversationHandler.END
 
     if not flights_by_date or not any(flights_by_date.values()):
-        await context.bot.send_message(chat_id=chat_id, text=config.MSG_NO_FLIGHTS_FOUND)
+        await context.bot.send_message(
+            chat_id=chat_id, text=config.MSG_SEARCH_TIMED_OUT if timed_out else config.MSG_NO_FLIGHTS_FOUND
+        )
         
         dep_country = context.user_data.get('departure_country')
         dep_airport_iata = context.user_data.get('departure_airport_iata')
@@ -496,14 +555,12 @@ async def process_and_send_flights(update: Update, context: ContextTypes.DEFAULT
             )
             return config.ASK_SAVE_SEARCH_PREFERENCES
     else:
-        await context.bot.send_message(chat_id=chat_id, text=config.MSG_FLIGHTS_FOUND_SEE_BELOW)
+        await context.bot.send_message(
+            chat_id=chat_id, text=config.MSG_SEARCH_PARTIAL if timed_out else config.MSG_FLIGHTS_FOUND_SEE_BELOW
+        )
         
-        all_flights_with_original_date = []
-        for date_str, flights_list_item in flights_by_date.items():
-            for flight_obj in flights_list_item:
-                all_flights_with_original_date.append({'original_date_str': date_str, 'flight': flight_obj})
-
-        globally_sorted_flights_with_date = sorted(all_flights_with_original_date, key=lambda x: helpers.get_flight_price(x['flight']))
+        # Сортировка по колонке цен в центах; рейсы без цены уходят в конец
+        globally_sorted_flights = FlightTable.from_grouped(flights_by_date).sorted_by_price()
 
         flights_message_parts = []
         last_printed_date_str = None
@@ -514,9 +571,20 @@ async def process_and_send_flights(update: Update, context: ContextTypes.DEFAULT
         departure_country_name = context.user_data.get('departure_country')
         arrival_country_name = context.user_data.get('arrival_country')
 
-        for item in globally_sorted_flights_with_date:
-            flight = item['flight']
-            original_date_str = item['original_date_str']
+        # Фаза 1: погода и курсы для всей выдачи сразу; дальше — только рендер
+        flights_extras = await message_formatter.enrich_flights(
+            message_formatter.FlightContext(
+                flight,
+                departure_city_name=departure_city_name_for_weather,
+                arrival_city_name=arrival_city_name_for_weather,
+                departure_country_name=departure_country_name,
+                arrival_country_name=arrival_country_name,
+            )
+            for flight in globally_sorted_flights
+        )
+
+        for flight, flight_extras in zip(globally_sorted_flights, flights_extras):
+            original_date_str = flight.departure_date
             if original_date_str != last_printed_date_str:
                 try:
                     date_obj = datetime.strptime(original_date_str, "%Y-%m-%d")
@@ -528,14 +596,7 @@ async def process_and_send_flights(update: Update, context: ContextTypes.DEFAULT
                     flights_message_parts.append(formatted_date_header)
                     last_printed_date_str = original_date_str
             
-            # <<<<<<<<<<<<<<< ИСПРАВЛЕННЫЙ ВЫЗОВ >>>>>>>>>>>>>>>
-            formatted_flight_msg = await message_formatter.format_flight_details(
-                flight,
-                departure_city_name=departure_city_name_for_weather,
-                arrival_city_name=arrival_city_name_for_weather,
-                departure_country_name=departure_country_name,
-                arrival_country_name=arrival_country_name
-            )
+            formatted_flight_msg = message_formatter.render_flight_details(flight, flight_extras)
             flights_message_parts.append(formatted_flight_msg)
         
         if flights_message_parts:
@@ -620,6 +681,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     )
     context.user_data.clear()
     user_id = update.effective_user.id
+    searches.cancel(user_id, reason="/start") # новый сценарий — незаконченный поиск больше не нужен
     has_searches = await user_history.has_saved_searches(user_id) # <--- await
     main_menu_keyboard = keyboards.get_main_menu_keyboard(has_saved_searches=has_searches)
     chat_id = update.effective_chat.id if update.effective_chat else None
@@ -890,7 +952,7 @@ async def back_std_ret_year_to_arr_city_handler(update: Update, context: Context
     await context.bot.send_message(
         chat_id=query.message.chat_id,
         text="Выберите город прилёта:",
-        reply_markup=keyboards.get_city_reply_keyboard(country)
+        reply_markup=keyboards.get_city_reply_keyboard(country, departure_iata=context.user_data.get('departure_airport_iata'))
     )
     return config.S_SELECTING_ARRIVAL_CITY
 
@@ -969,7 +1031,7 @@ async def back_price_to_std_arr_city_oneway_handler(update: Update, context: Con
         await context.bot.send_message(
             chat_id=query.message.chat_id,
             text="Выберите страну прилёта:",
-            reply_markup=keyboards.get_country_reply_keyboard()
+            reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata'))
         )
         return config.S_SELECTING_ARRIVAL_COUNTRY
 
@@ -979,7 +1041,7 @@ async def back_price_to_std_arr_city_oneway_handler(update: Update, context: Con
     await context.bot.send_message(
         chat_id=query.message.chat_id,
         text="Выберите город прилёта:",
-        reply_markup=keyboards.get_city_reply_keyboard(arrival_country)
+        reply_markup=keyboards.get_city_reply_keyboard(arrival_country, departure_iata=context.user_data.get('departure_airport_iata'))
     )
     return config.S_SELECTING_ARRIVAL_CITY
 
@@ -1247,7 +1309,7 @@ async def back_flex_arr_city_to_arr_country_handler(update: Update, context: Con
     await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text="Выберите страну прилёта:",
-        reply_markup=keyboards.get_country_reply_keyboard()
+        reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata'))
     )
     return config.SELECTING_FLEX_ARRIVAL_COUNTRY
 
@@ -1268,7 +1330,7 @@ async def back_flex_ask_dates_to_location_handler(update: Update, context: Conte
         await context.bot.send_message(
             chat_id=query.message.chat_id,
             text="Выберите город прилёта:",
-            reply_markup=keyboards.get_city_reply_keyboard(arrival_country)
+            reply_markup=keyboards.get_city_reply_keyboard(arrival_country, departure_iata=context.user_data.get('departure_airport_iata'))
         )
         return config.SELECTING_FLEX_ARRIVAL_CITY
     else: # Если город прилета был пропущен (arrival_airport_iata is None) или не дошли до него
@@ -1312,7 +1374,7 @@ async def standard_departure_city(update: Update, context: ContextTypes.DEFAULT_
     if not country:
         await update.message.reply_text("Ошибка: страна вылета не определена. Начните заново /start.")
         return ConversationHandler.END
-    iata_code = helpers.get_airport_iata(country, city)
+    iata_code = airport_index.iata_by_city(country, city)
     if not iata_code:
         await update.message.reply_text("Город не найден! Пожалуйста, выберите из списка.", reply_markup=keyboards.get_city_reply_keyboard(country))
         return config.S_SELECTING_DEPARTURE_CITY
@@ -1444,29 +1506,29 @@ async def standard_departure_date_selected(update: Update, context: ContextTypes
     await query.edit_message_text(text=f"Дата вылета: {date_obj.strftime('%d-%m-%Y')}")
     # Переход к выбору страны прилета. Кнопку "Назад" отсюда не добавляем, т.к. это ReplyKeyboard.
     # "Назад" от страны прилета должен вести сюда (S_SELECTING_DEPARTURE_DATE)
-    await context.bot.send_message(chat_id=update.effective_chat.id, text="🌍 Выберите страну прилёта:", reply_markup=keyboards.get_country_reply_keyboard())
+    await context.bot.send_message(chat_id=update.effective_chat.id, text="🌍 Выберите страну прилёта:", reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata')))
     return config.S_SELECTING_ARRIVAL_COUNTRY
 
 async def standard_arrival_country(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     country = update.message.text
     if country not in config.COUNTRIES_DATA:
-        await update.message.reply_text("Страна не найдена! Пожалуйста, выберите из списка.", reply_markup=keyboards.get_country_reply_keyboard())
+        await update.message.reply_text("Страна не найдена! Пожалуйста, выберите из списка.", reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata')))
         return config.S_SELECTING_ARRIVAL_COUNTRY
 
     departure_airport_iata = context.user_data.get('departure_airport_iata')
     if departure_airport_iata and country in config.COUNTRIES_DATA and len(config.COUNTRIES_DATA[country]) == 1:
         single_city_name = list(config.COUNTRIES_DATA[country].keys())[0]
-        single_airport_iata = helpers.get_airport_iata(country, single_city_name)
+        single_airport_iata = airport_index.iata_by_city(country, single_city_name)
         if single_airport_iata == departure_airport_iata:
             await update.message.reply_text(
                 f"Единственный аэропорт в стране \"{country}\" ({single_city_name}) совпадает с вашим аэропортом вылета. "
                 "Выберите другую страну прилёта."
             )
-            await update.message.reply_text("Выберите другую страну прилёта:", reply_markup=keyboards.get_country_reply_keyboard())
+            await update.message.reply_text("Выберите другую страну прилёта:", reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata')))
             return config.S_SELECTING_ARRIVAL_COUNTRY
 
     context.user_data['arrival_country'] = country
-    await update.message.reply_text("🏙️ Выберите город прилёта:", reply_markup=keyboards.get_city_reply_keyboard(country))
+    await update.message.reply_text("🏙️ Выберите город прилёта:", reply_markup=keyboards.get_city_reply_keyboard(country, departure_iata=context.user_data.get('departure_airport_iata')))
     return config.S_SELECTING_ARRIVAL_CITY
 
 async def standard_arrival_city(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -1474,7 +1536,7 @@ async def standard_arrival_city(update: Update, context: ContextTypes.DEFAULT_TY
         logger.warning("standard_arrival_city: пустое сообщение")
         await update.message.reply_text(
             "Пожалуйста, выберите город прилёта. Для начала, выберите страну прилёта:",
-            reply_markup=keyboards.get_country_reply_keyboard()
+            reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata'))
         )
         return config.S_SELECTING_ARRIVAL_COUNTRY
 
@@ -1484,17 +1546,17 @@ async def standard_arrival_city(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("Ошибка: страна прилёта не определена. Начните /start.", reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
 
-    iata_code = helpers.get_airport_iata(country, city)
+    iata_code = airport_index.iata_by_city(country, city)
     if not iata_code:
         await update.message.reply_text(
             f"Город '{city}' не найден. Выберите другую страну прилёта:",
-            reply_markup=keyboards.get_country_reply_keyboard()
+            reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata'))
         )
         return config.S_SELECTING_ARRIVAL_COUNTRY
     if iata_code == context.user_data.get('departure_airport_iata'):
         await update.message.reply_text(
             "Аэропорт прилёта не может совпадать с аэропортом вылета. Выберите другую страну:",
-            reply_markup=keyboards.get_country_reply_keyboard()
+            reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata'))
         )
         return config.S_SELECTING_ARRIVAL_COUNTRY
 
@@ -1766,7 +1828,7 @@ async def flex_departure_city(update: Update, context: ContextTypes.DEFAULT_TYPE
     if not country:
         await update.message.reply_text("❗Ошибка: страна вылета не определена. /start")
         return ConversationHandler.END
-    iata_code = helpers.get_airport_iata(country, city)
+    iata_code = airport_index.iata_by_city(country, city)
     if not iata_code:
         await update.message.reply_text("🤷 Город не найден! Выберите из списка.", reply_markup=keyboards.get_city_reply_keyboard(country))
         return config.SELECTING_FLEX_DEPARTURE_CITY
@@ -1795,7 +1857,7 @@ async def flex_ask_arrival_airport(update: Update, context: ContextTypes.DEFAULT
         if query.message:
             try: await query.edit_message_text(text="👍 Аэропорт прилёта: ДА")
             except Exception: pass
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="🌍 Выберите страну прилёта:", reply_markup=keyboards.get_country_reply_keyboard())
+        await context.bot.send_message(chat_id=update.effective_chat.id, text="🌍 Выберите страну прилёта:", reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata')))
         return config.SELECTING_FLEX_ARRIVAL_COUNTRY
     else: # ask_arr_no
         if query.message:
@@ -1815,16 +1877,16 @@ async def flex_ask_arrival_airport(update: Update, context: ContextTypes.DEFAULT
 async def flex_arrival_country(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     country = update.message.text
     if country not in config.COUNTRIES_DATA:
-        await update.message.reply_text("🤷 Страна не найдена! Выберите из списка.", reply_markup=keyboards.get_country_reply_keyboard())
+        await update.message.reply_text("🤷 Страна не найдена! Выберите из списка.", reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata')))
         return config.SELECTING_FLEX_ARRIVAL_COUNTRY
     context.user_data['arrival_country'] = country
-    await update.message.reply_text("🏙️ Выберите город прилёта:", reply_markup=keyboards.get_city_reply_keyboard(country))
+    await update.message.reply_text("🏙️ Выберите город прилёта:", reply_markup=keyboards.get_city_reply_keyboard(country, departure_iata=context.user_data.get('departure_airport_iata')))
     return config.SELECTING_FLEX_ARRIVAL_CITY
 
 async def flex_arrival_city(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if not update.message or not update.message.text:
         logger.warning("flex_arrival_city: пустое сообщение")
-        await update.message.reply_text("🏙️ Выберите город прилёта. Для начала, выберите страну:", reply_markup=keyboards.get_country_reply_keyboard())
+        await update.message.reply_text("🏙️ Выберите город прилёта. Для начала, выберите страну:", reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata')))
         return config.SELECTING_FLEX_ARRIVAL_COUNTRY # Возврат к выбору страны
 
     city = update.message.text
@@ -1833,16 +1895,16 @@ async def flex_arrival_city(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("🤷 Ошибка: страна прилёта не определена. /start", reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
 
-    iata_code = helpers.get_airport_iata(country, city)
+    iata_code = airport_index.iata_by_city(country, city)
     if not iata_code:
         await update.message.reply_text(
             f"Город '{city}' 🤷 не найден. Выберите другую страну прилёта:",
-            reply_markup=keyboards.get_country_reply_keyboard()
+            reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata'))
         )
         return config.SELECTING_FLEX_ARRIVAL_COUNTRY
     departure_iata = context.user_data.get('departure_airport_iata')
     if departure_iata and iata_code == departure_iata:
-        await update.message.reply_text("🤷 Аэропорт прилёта не совпадает с вылетом. Выберите другую страну:", reply_markup=keyboards.get_country_reply_keyboard())
+        await update.message.reply_text("🤷 Аэропорт прилёта не совпадает с вылетом. Выберите другую страну:", reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata')))
         return config.SELECTING_FLEX_ARRIVAL_COUNTRY
 
     context.user_data['arrival_airport_iata'] = iata_code
@@ -3110,6 +3172,54 @@ async def enter_custom_price_handler(update: Update, context: ContextTypes.DEFAU
 # bot/handlers.py
 # ... (после process_and_send_flights) ...
 
+async def _format_alternative_airport_block(
+    source_airport_info: str,
+    flights_by_date: Dict[str, list],
+    departure_city_name: str,
+    arrival_city_name: Union[str, None],
+    departure_country_name: Union[str, None],
+    arrival_country_name: Union[str, None],
+) -> str:
+    """Блок результатов одного альтернативного аэропорта: заголовок, даты по порядку, рейсы."""
+    parts = [f"\n✈️ --- Из аэропорта: {source_airport_info} ---\n"]
+    dates = sorted(flights_by_date.items())
+    # Блок уходит сразу по готовности аэропорта — обогащаем все его рейсы одним проходом
+    extras = iter(await message_formatter.enrich_flights(
+        message_formatter.FlightContext(
+            flight_alt,
+            departure_city_name=departure_city_name,
+            arrival_city_name=arrival_city_name,
+            departure_country_name=departure_country_name,
+            arrival_country_name=arrival_country_name,
+        )
+        for _, flights_on_this_date in dates
+        for flight_alt in flights_on_this_date
+    ))
+    for date_key, flights_on_this_date in dates:
+        try:
+            date_obj_alt = datetime.strptime(date_key, "%Y-%m-%d")
+            parts.append(f"\n--- 📅 {date_obj_alt.strftime('%d %B %Y (%A)')} ---\n")
+        except ValueError:
+            parts.append(f"\n--- 📅 {date_key} ---\n")
+
+        for flight_alt in flights_on_this_date:
+            parts.append(message_formatter.render_flight_details(flight_alt, next(extras)))
+        parts.append("\n") # Пустая строка после рейсов на одну дату
+    return "".join(parts)
+
+
+async def _send_html_in_chunks(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str, error_text: str) -> None:
+    """Отправляет длинный HTML-текст частями по 4096 символов (лимит Telegram)."""
+    for i in range(0, len(text), 4096):
+        chunk = text[i:i + 4096]
+        try:
+            await context.bot.send_message(chat_id=chat_id, text=chunk, parse_mode="HTML", disable_web_page_preview=True)
+        except Exception as e_send_chunk:
+            logger.error(f"Не удалось отправить чанк рейсов: {e_send_chunk}")
+            if i == 0: # Если это первый чанк и он не отправился
+                await context.bot.send_message(chat_id=chat_id, text=error_text)
+
+
 async def handle_search_other_airports_decision(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     if not query:
@@ -3183,10 +3293,16 @@ async def handle_search_other_airports_decision(update: Update, context: Context
             return config.ASK_SAVE_SEARCH_PREFERENCES
 
         text_searching_alt = f"⏳ Ищу рейсы из других аэропортов в {departure_country}..."
+        # Одно сообщение о ходе поиска, которое правится на месте
+        live = LiveMessage(context.bot, effective_chat_id, config.SEARCH_PROGRESS_EDIT_INTERVAL_SEC)
+        progress_message_id = None
         if query.message:
-            try: await query.edit_message_text(text=text_searching_alt)
-            except Exception: await context.bot.send_message(effective_chat_id, text=text_searching_alt)
-        else: await context.bot.send_message(effective_chat_id, text=text_searching_alt)
+            try:
+                await query.edit_message_text(text=text_searching_alt)
+                progress_message_id = query.message.message_id
+            except Exception:
+                pass
+        await live.start(text_searching_alt, message_id=progress_message_id)
         
         context.user_data["_already_searched_alternatives"] = True # Флаг, что уже искали
 
@@ -3200,97 +3316,114 @@ async def handle_search_other_airports_decision(update: Update, context: Context
             await context.bot.send_message(chat_id=effective_chat_id, text=no_alt_airports_msg)
             # Переход к сохранению будет ниже, вне этого else
         else:
-            # Используем defaultdict(dict), если flights_from_alt_by_date это Dict[str, list]
-            # и мы хотим хранить {airport_key: {date_key: [flights]}}
-            # В вашем коде found_alternative_flights_data[key] = processed_for_this_airport,
-            # где processed_for_this_airport это Dict[str, list]. Значит тип правильный.
-            found_alternative_flights_data: Dict[str, Dict[str, list]] = defaultdict(dict)
-            found_any = False
             original_arrival_city_name_for_weather = context.user_data.get('arrival_city_name') # Для погоды
-
-            for current_alternative_city_name, iata_code in alternative_airports.items():
-                logger.info(f"Поиск из альтернативного аэропорта: {current_alternative_city_name} ({iata_code})")
-                text_checking_alt = f"⏳ Проверяю вылеты из {current_alternative_city_name} ({iata_code})..."
-                await context.bot.send_message(chat_id=effective_chat_id, text=text_checking_alt)
-
-                # --- ИЗМЕНЕННЫЙ ВЫЗОВ find_flights_with_fallback ---
-                flights_from_alt_by_date: Dict[str, list] = await flight_api.find_flights_with_fallback(
-                    departure_airport_iata=iata_code, # Новый аэропорт вылета
-                    arrival_airport_iata=context.user_data.get('arrival_airport_iata'), # Оригинальный аэропорт прилета
-                    
-                    # Параметры для +/- offset или годового поиска (будут None если был явный диапазон)
-                    departure_date_str=dep_date_for_offset_or_year_search_alt,
-                    return_date_str=ret_date_for_offset_search_alt,
-                    
-                    max_price=user_max_price,
-                    is_one_way=is_one_way,
-                    
-                    # Параметры для явного диапазона дат
-                    explicit_departure_date_from=explicit_dep_date_from_alt,
-                    explicit_departure_date_to=explicit_dep_date_to_alt,
-                    explicit_return_date_from=explicit_ret_date_from_alt,
-                    explicit_return_date_to=explicit_ret_date_to_alt
-                    # search_days_offset можно оставить по умолчанию, если не нужно менять
-                )
-                # --- КОНЕЦ ИЗМЕНЕННОГО ВЫЗОВА ---
-                
-                if flights_from_alt_by_date: 
-                    processed_for_this_airport: Dict[str, list]
-                    if price_preference == config.CALLBACK_PRICE_LOWEST:
-                        processed_for_this_airport = helpers.filter_cheapest_flights(flights_from_alt_by_date)
-                    else: 
-                        processed_for_this_airport = flights_from_alt_by_date
-                    
-                    if processed_for_this_airport: 
-                        found_any = True
-                        # Ключ - информация об аэропорте, значение - словарь {дата: [рейсы]}
-                        found_alternative_flights_data[f"{current_alternative_city_name} ({iata_code})"] = processed_for_this_airport
-            
-            # Оригинальная логика отображения найденных альтернативных рейсов
-            if found_any:
-                alt_flights_final_message_parts = [f"✈️✨ Найдены рейсы из других аэропортов в {departure_country}:\n"]
-                for source_airport_info, flights_by_sub_date_dict_item in found_alternative_flights_data.items():
-                    if not flights_by_sub_date_dict_item: continue
-                    
-                    city_name_for_current_dep_weather = source_airport_info.split('(')[0].strip()
-                    alt_flights_final_message_parts.append(f"\n✈️ --- Из аэропорта: {source_airport_info} ---\n")
-                    
-                    # Сортируем даты для каждого аэропорта
-                    sorted_dates_for_airport = sorted(flights_by_sub_date_dict_item.items())
-                    for date_key, flights_on_this_date in sorted_dates_for_airport:
+            semaphore = asyncio.Semaphore(max(1, config.ALT_AIRPORTS_SEARCH_CONCURRENCY))
+
+            async def _search_alternative(city_name: str, iata_code: str):
+                async with semaphore:
+                    logger.info(f"Поиск из альтернативного аэропорта: {city_name} ({iata_code})")
+                    flights_from_alt_by_date: Dict[str, list] = await flight_api.find_flights_with_fallback(
+                        departure_airport_iata=iata_code, # Новый аэропорт вылета
+                        arrival_airport_iata=context.user_data.get('arrival_airport_iata'), # Оригинальный аэропорт прилета
+
+                        # Параметры для +/- offset или годового поиска (будут None если был явный диапазон)
+                        departure_date_str=dep_date_for_offset_or_year_search_alt,
+                        return_date_str=ret_date_for_offset_search_alt,
+
+                        max_price=user_max_price,
+                        is_one_way=is_one_way,
+
+                        # Параметры для явного диапазона дат
+                        explicit_departure_date_from=explicit_dep_date_from_alt,
+                        explicit_departure_date_to=explicit_dep_date_to_alt,
+                        explicit_return_date_from=explicit_ret_date_from_alt,
+                        explicit_return_date_to=explicit_ret_date_to_alt
+                    )
+                if flights_from_alt_by_date and price_preference == config.CALLBACK_PRICE_LOWEST:
+                    flights_from_alt_by_date = helpers.filter_cheapest_flights(flights_from_alt_by_date)
+                return city_name, iata_code, flights_from_alt_by_date
+
+            async def _sweep() -> None:
+                # Аэропорты проверяются параллельно (не больше ALT_AIRPORTS_SEARCH_CONCURRENCY одновременно),
+                # результаты каждого отправляются сразу, как только он ответил
+                tasks = [
+                    asyncio.create_task(_search_alternative(city_name, iata_code))
+                    for city_name, iata_code in alternative_airports.items()
+                ]
+                checked_count = 0
+                airports_with_flights = 0
+                airports_timed_out = 0  # не уложились в дедлайн: «рейсов нет» про них сказать нельзя
+                header_sent = False
+                try:
+                    for next_done in asyncio.as_completed(tasks):
+                        checked_count += 1
                         try:
-                            date_obj_alt = datetime.strptime(date_key, "%Y-%m-%d")
-                            alt_flights_final_message_parts.append(f"\n--- 📅 {date_obj_alt.strftime('%d %B %Y (%A)')} ---\n")
-                        except ValueError:
-                            alt_flights_final_message_parts.append(f"\n--- 📅 {date_key} ---\n")
-                        
-                        for flight_alt in flights_on_this_date:
-                            formatted_flight_msg = await message_formatter.format_flight_details(
-                                flight_alt,
-                                departure_city_name=city_name_for_current_dep_weather, # Используем текущий альтернативный город вылета
+                            current_alternative_city_name, iata_code, processed_for_this_airport = await next_done
+                        except SearchTimedOut:
+                            airports_timed_out += 1
+                            processed_for_this_airport = None
+                        except Exception as e_alt:
+                            logger.error(f"Ошибка поиска из альтернативного аэропорта: {e_alt}", exc_info=True)
+                            processed_for_this_airport = None
+
+                        if processed_for_this_airport:
+                            airports_with_flights += 1
+                            if not header_sent:
+                                await context.bot.send_message(
+                                    chat_id=effective_chat_id,
+                                    text=f"✈️✨ Найдены рейсы из других аэропортов в {departure_country}:"
+                                )
+                                header_sent = True
+                            alt_block = await _format_alternative_airport_block(
+                                f"{current_alternative_city_name} ({iata_code})",
+                                processed_for_this_airport,
+                                departure_city_name=current_alternative_city_name, # Текущий альтернативный город вылета
                                 arrival_city_name=original_arrival_city_name_for_weather, # Оригинальный город прилета
-                                departure_country_name=departure_country, # <-- Новое
-                                arrival_country_name=arrival_country_name
+                                departure_country_name=departure_country,
+                                arrival_country_name=arrival_country_name,
                             )
-                            alt_flights_final_message_parts.append(formatted_flight_msg)
-                        alt_flights_final_message_parts.append("\n") # Добавляем пустую строку после рейсов на одну дату
-                
-                full_alt_message = "".join(alt_flights_final_message_parts)
-                if len(full_alt_message.strip()) > len(f"✈️✨ Найдены рейсы из других аэропортов в {departure_country}:\n".strip()):
-                    for i_alt_msg in range(0, len(full_alt_message), 4096): # 4096 - лимит длины сообщения Telegram
-                        chunk_alt = full_alt_message[i_alt_msg:i_alt_msg + 4096]
-                        try:
-                            await context.bot.send_message(chat_id=effective_chat_id, text=chunk_alt, parse_mode="HTML", disable_web_page_preview=True)
-                        except Exception as e_send_alt_chunk:
-                            logger.error(f"Не удалось отправить чанк альтернативных рейсов: {e_send_alt_chunk}")
-                            if i_alt_msg == 0: # Если это первый чанк и он не отправился
-                                await context.bot.send_message(chat_id=effective_chat_id, text="Произошла ошибка при отображении части альтернативных результатов.")
-                else: 
-                     no_alt_flights_msg = f"🤷 Из других аэропортов в {departure_country} рейсов по вашим критериям не найдено (после форматирования)."
-                     await context.bot.send_message(chat_id=effective_chat_id, text=no_alt_flights_msg)
-            else: # not found_any
-                no_alt_flights_msg = f"🤷 Из других аэропортов в {departure_country} рейсов по вашим критериям не найдено."
-                await context.bot.send_message(chat_id=effective_chat_id, text=no_alt_flights_msg)
+                            await _send_html_in_chunks(
+                                context, effective_chat_id, alt_block,
+                                "Произошла ошибка при отображении части альтернативных результатов."
+                            )
+
+                        await live.update(
+                            f"{text_searching_alt}\n"
+                            f"Проверено аэропортов: {checked_count - airports_timed_out} из {len(tasks)}, "
+                            f"с рейсами: {airports_with_flights}."
+                        )
+                finally:
+                    # Отмена поиска или ошибка отправки — дожидаемся отменённых запросов, не оставляя их висеть
+                    pending = [task for task in tasks if not task.done()]
+                    for task in pending:
+                        task.cancel()
+                    if pending:
+                        await asyncio.gather(*pending, return_exceptions=True)
+
+                if airports_timed_out:
+                    await live.finish(
+                        f"⏱ Время поиска истекло. Проверено аэропортов в {departure_country}: "
+                        f"{len(tasks) - airports_timed_out} из {len(tasks)}, с рейсами: {airports_with_flights}; "
+                        f"не успели ответить: {airports_timed_out}."
+                    )
+                else:
+                    await live.finish(
+                        f"✅ Проверено аэропортов в {departure_country}: {len(tasks)}, с рейсами: {airports_with_flights}."
+                    )
+                if not airports_with_flights:
+                    if airports_timed_out:
+                        no_alt_flights_msg = config.MSG_SEARCH_TIMED_OUT
+                    else:
+                        no_alt_flights_msg = f"🤷 Из других аэропортов в {departure_country} рейсов по вашим критериям не найдено."
+                    await context.bot.send_message(chat_id=effective_chat_id, text=no_alt_flights_msg)
+
+            # Перебор привязан к пользователю: /cancel или новый поиск останавливают его вместе с запросами к API
+            try:
+                await searches.run(update.effective_user.id, _sweep(), config.SEARCH_DEADLINE_SEC)
+            except SearchCancelled:
+                logger.info("handle_search_other_airports_decision: поиск отменён пользователем.")
+                await live.finish("🛑 Поиск остановлен.")
+                return ConversationHandler.END
 
     elif query.data == config.CALLBACK_NO_OTHER_AIRPORTS:
         msg_cancel_alt_search = "🛑 Понял. Поиск из других аэропортов отменен."
@@ -3308,6 +3441,25 @@ async def handle_search_other_airports_decision(update: Update, context: Context
     return config.ASK_SAVE_SEARCH_PREFERENCES
 
 
+async def search_in_progress_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Ответ на любой ввод в диалоге, пока его обработчик ещё ищет рейсы (состояние WAITING)."""
+    if update.callback_query:
+        await update.callback_query.answer(config.MSG_SEARCH_IN_PROGRESS, show_alert=True)
+    elif update.message:
+        await update.message.reply_text(config.MSG_SEARCH_IN_PROGRESS)
+
+
+def search_in_progress_handlers(callback_pattern: str) -> list:
+    """
+    Последние обработчики состояния WAITING: текст и кнопки самого диалога (callback_pattern)
+    получают ответ «поиск идёт»; кнопки других диалогов и глобальных обработчиков не перехватываются.
+    """
+    return [
+        MessageHandler(filters.TEXT & ~filters.COMMAND, search_in_progress_handler),
+        CallbackQueryHandler(search_in_progress_handler, pattern=callback_pattern),
+    ]
+
+
 async def cancel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     message_to_send = config.MSG_CANCELLED
     reply_markup_to_send = ReplyKeyboardRemove()
@@ -3324,6 +3476,8 @@ async def cancel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text(message_to_send, reply_markup=reply_markup_to_send)
     elif chat_id_to_send:
         await context.bot.send_message(chat_id=chat_id_to_send, text=message_to_send, reply_markup=reply_markup_to_send)
+    if update.effective_user:
+        searches.cancel(update.effective_user.id)
     context.user_data.clear()
     return ConversationHandler.END
 
@@ -3417,7 +3571,7 @@ async def handle_entire_range_selected(update: Update, context: ContextTypes.DEF
             await context.bot.send_message(
                 chat_id=query.message.chat_id, # Используем chat_id из query.message
                 text="🌍 Выберите страну прилёта:", 
-                reply_markup=keyboards.get_country_reply_keyboard()
+                reply_markup=keyboards.get_country_reply_keyboard(departure_iata=context.user_data.get('departure_airport_iata'))
             )
             return config.S_SELECTING_ARRIVAL_COUNTRY
         elif current_flow == config.FLOW_FLEX:
@@ -3537,15 +3691,21 @@ def create_top3_conversation_handler() -> ConversationHandler:
                 CallbackQueryHandler(
                     handlers_top3.handle_scope_choice,
                     pattern="^(top3_use_saved|top3_new_search|"
-                            f"{config.CALLBACK_TOP3_SPECIFIC_CITY}|{config.CALLBACK_TOP3_FROM_ANYWHERE})$"),
+                            f"{config.CALLBACK_TOP3_SPECIFIC_CITY}|{config.CALLBACK_TOP3_FROM_ANYWHERE})$",
+                    block=False),
             ],
             config.TOP3_ASK_COUNTRY: [MessageHandler(filters.TEXT & ~filters.COMMAND,
                                                      handlers_top3.handle_country_choice)],
             config.TOP3_ASK_CITY:    [MessageHandler(filters.TEXT & ~filters.COMMAND,
-                                                     handlers_top3.handle_city_choice)],
+                                                     handlers_top3.handle_city_choice, block=False)],
             config.TOP3_ASK_SAVE:    [CallbackQueryHandler(
                 handlers_top3.handle_save_choice,
-                pattern=f"^({config.CALLBACK_TOP3_SAVE_YES}|{config.CALLBACK_TOP3_SAVE_NO})$")]
+                pattern=f"^({config.CALLBACK_TOP3_SAVE_YES}|{config.CALLBACK_TOP3_SAVE_NO})$")],
+            # Пока идёт поиск (block=False у запускающих его обработчиков), доступна только отмена
+            ConversationHandler.WAITING: [
+                CommandHandler("cancel", handlers_top3.cancel_top3),
+                *search_in_progress_handlers("^top3_"),
+            ],
         },
         fallbacks=[CommandHandler("cancel", handlers_top3.cancel_top3)],
         allow_reentry=True,
@@ -3573,13 +3733,21 @@ def create_conversation_handler() -> ConversationHandler:
     entire_range_pattern_dep = f"^{config.CALLBACK_ENTIRE_RANGE_SELECTED}dep_"
     entire_range_pattern_ret = f"^{config.CALLBACK_ENTIRE_RANGE_SELECTED}ret_"
 
+    # Кнопки шагов этого диалога (без точек входа): пока идёт поиск, на них отвечаем «поиск идёт»
+    dialog_callbacks_pattern = (
+        f"^({config.CALLBACK_PREFIX_STANDARD}|{config.CALLBACK_PREFIX_FLEX}|{config.CALLBACK_ENTIRE_RANGE_SELECTED}"
+        f"|price_|cb_back_|no_valid_|{config.CALLBACK_NO_SPECIFIC_DATES}|no_dates$"
+        f"|{config.CALLBACK_YES_OTHER_AIRPORTS}$|{config.CALLBACK_NO_OTHER_AIRPORTS}$"
+        f"|{config.CALLBACK_SAVE_SEARCH_YES}$|{config.CALLBACK_SAVE_SEARCH_NO}$)"
+    )
+
 
     conv_handler = ConversationHandler(
         entry_points=[
             CommandHandler('start', start_command),
             CallbackQueryHandler(start_search_callback, pattern='^(start_standard_search|start_flex_search)$'),
             CallbackQueryHandler(start_flex_anywhere_callback, pattern='^start_flex_anywhere$'),
-            CallbackQueryHandler(_start_last_saved_search_wrapper, pattern=f"^{config.CALLBACK_START_LAST_SAVED_SEARCH}$")
+            CallbackQueryHandler(_start_last_saved_search_wrapper, pattern=f"^{config.CALLBACK_START_LAST_SAVED_SEARCH}$", block=False)
         ],
         states={
             # --- Стандартный поиск ---
@@ -3600,7 +3768,7 @@ def create_conversation_handler() -> ConversationHandler:
             ],
             config.S_SELECTING_DEPARTURE_DATE: [ # Состояние выбора конкретной даты вылета
                 CallbackQueryHandler(standard_departure_date_selected, pattern=f"^{config.CALLBACK_PREFIX_STANDARD}dep_date_"), # Выбор одиночной даты
-                CallbackQueryHandler(handle_entire_range_selected, pattern=entire_range_pattern_dep), # Выбор всего диапазона для вылета
+                CallbackQueryHandler(handle_entire_range_selected, pattern=entire_range_pattern_dep, block=False), # Выбор всего диапазона для вылета
                 CallbackQueryHandler(back_std_dep_date_to_range_handler, pattern=f"^{config.CB_BACK_STD_DEP_DATE_TO_RANGE}$")
             ],
             config.S_SELECTING_ARRIVAL_COUNTRY: [MessageHandler(filters.TEXT & ~filters.COMMAND, standard_arrival_country)],
@@ -3619,7 +3787,7 @@ def create_conversation_handler() -> ConversationHandler:
             ],
             config.S_SELECTING_RETURN_DATE: [ # Состояние выбора конкретной даты возврата
                 CallbackQueryHandler(standard_return_date_selected, pattern=f"^{config.CALLBACK_PREFIX_STANDARD}ret_date_"), # Выбор одиночной даты
-                CallbackQueryHandler(handle_entire_range_selected, pattern=entire_range_pattern_ret), # Выбор всего диапазона для возврата
+                CallbackQueryHandler(handle_entire_range_selected, pattern=entire_range_pattern_ret, block=False), # Выбор всего диапазона для возврата
                 CallbackQueryHandler(back_std_ret_date_to_range_handler, pattern=f"^{config.CB_BACK_STD_RET_DATE_TO_RANGE}$")
             ],
 
@@ -3638,7 +3806,7 @@ def create_conversation_handler() -> ConversationHandler:
             config.SELECTING_FLEX_ARRIVAL_COUNTRY: [MessageHandler(filters.TEXT & ~filters.COMMAND, flex_arrival_country)],
             config.SELECTING_FLEX_ARRIVAL_CITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, flex_arrival_city)],
             config.ASK_FLEX_DATES: [
-                CallbackQueryHandler(flex_ask_dates, pattern=f"^(?:{config.CALLBACK_PREFIX_FLEX}ask_dates_yes|{config.CALLBACK_NO_SPECIFIC_DATES})$"),
+                CallbackQueryHandler(flex_ask_dates, pattern=f"^(?:{config.CALLBACK_PREFIX_FLEX}ask_dates_yes|{config.CALLBACK_NO_SPECIFIC_DATES})$", block=False),
                 CallbackQueryHandler(back_flex_ask_dates_to_location_handler, pattern=f"^{config.CB_BACK_FLEX_ASK_DATES_TO_ARR_CITY}$"),
                 CallbackQueryHandler(back_flex_ask_dates_to_location_handler, pattern=f"^{config.CB_BACK_FLEX_ASK_DATES_TO_DEP_CITY_NO_ARR}$")
             ],
@@ -3655,8 +3823,8 @@ def create_conversation_handler() -> ConversationHandler:
                 CallbackQueryHandler(back_flex_dep_range_to_month_handler, pattern=f"^{config.CB_BACK_FLEX_DEP_RANGE_TO_MONTH}$")
             ],
             config.SELECTING_FLEX_DEPARTURE_DATE: [ # Состояние выбора конкретной даты вылета (гибкий)
-                CallbackQueryHandler(flex_departure_date_selected, pattern=f"^{config.CALLBACK_PREFIX_FLEX}dep_date_"), # Выбор одиночной даты
-                CallbackQueryHandler(handle_entire_range_selected, pattern=entire_range_pattern_dep), # Выбор всего диапазона для вылета
+                CallbackQueryHandler(flex_departure_date_selected, pattern=f"^{config.CALLBACK_PREFIX_FLEX}dep_date_", block=False), # Выбор одиночной даты
+                CallbackQueryHandler(handle_entire_range_selected, pattern=entire_range_pattern_dep, block=False), # Выбор всего диапазона для вылета
                 CallbackQueryHandler(back_flex_dep_date_to_range_handler, pattern=f"^{config.CB_BACK_FLEX_DEP_DATE_TO_RANGE}$")
             ],
             config.SELECTING_FLEX_RETURN_YEAR: [
@@ -3672,31 +3840,39 @@ def create_conversation_handler() -> ConversationHandler:
                 CallbackQueryHandler(back_flex_ret_range_to_month_handler, pattern=f"^{config.CB_BACK_FLEX_RET_RANGE_TO_MONTH}$")
             ],
             config.SELECTING_FLEX_RETURN_DATE: [ # Состояние выбора конкретной даты возврата (гибкий)
-                CallbackQueryHandler(flex_return_date_selected, pattern=f"^{config.CALLBACK_PREFIX_FLEX}ret_date_"), # Выбор одиночной даты
-                CallbackQueryHandler(handle_entire_range_selected, pattern=entire_range_pattern_ret), # Выбор всего диапазона для возврата
+                CallbackQueryHandler(flex_return_date_selected, pattern=f"^{config.CALLBACK_PREFIX_FLEX}ret_date_", block=False), # Выбор одиночной даты
+                CallbackQueryHandler(handle_entire_range_selected, pattern=entire_range_pattern_ret, block=False), # Выбор всего диапазона для возврата
                 CallbackQueryHandler(back_flex_ret_date_to_range_handler, pattern=f"^{config.CB_BACK_FLEX_RET_DATE_TO_RANGE}$")
             ],
 
             # --- ОБЩИЕ СОСТОЯНИЯ ДЛЯ ЦЕНЫ ---
             config.SELECTING_PRICE_OPTION: [
-                CallbackQueryHandler(handle_price_option_selected, pattern=price_option_pattern),
+                CallbackQueryHandler(handle_price_option_selected, pattern=price_option_pattern, block=False),
                 CallbackQueryHandler(back_price_to_std_arr_city_oneway_handler, pattern=f"^{config.CB_BACK_PRICE_TO_STD_ARR_CITY_ONEWAY}$"),
                 CallbackQueryHandler(back_price_to_std_ret_date_twoway_handler, pattern=f"^{config.CB_BACK_PRICE_TO_STD_RET_DATE_TWOWAY}$"),
                 CallbackQueryHandler(back_price_to_flex_flight_type_handler, pattern=f"^{config.CB_BACK_PRICE_TO_FLEX_FLIGHT_TYPE}$"),
                 CallbackQueryHandler(back_price_to_entering_custom_handler, pattern=f"^{config.CB_BACK_PRICE_TO_ENTERING_CUSTOM}$")
             ],
             config.ENTERING_CUSTOM_PRICE: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, enter_custom_price_handler),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, enter_custom_price_handler, block=False),
                 # Если пользователь нажимает инлайн-кнопку "Назад" на сообщении "Введите цену"
                 CallbackQueryHandler(back_price_to_entering_custom_handler, pattern=f"^{config.CB_BACK_PRICE_TO_ENTERING_CUSTOM}$")
             ],
             config.ASK_SEARCH_OTHER_AIRPORTS: [
-                CallbackQueryHandler(handle_search_other_airports_decision, pattern=f"^{config.CALLBACK_YES_OTHER_AIRPORTS}$|^{config.CALLBACK_NO_OTHER_AIRPORTS}$")
+                CallbackQueryHandler(handle_search_other_airports_decision, pattern=f"^{config.CALLBACK_YES_OTHER_AIRPORTS}$|^{config.CALLBACK_NO_OTHER_AIRPORTS}$", block=False)
             ],
 
             config.ASK_SAVE_SEARCH_PREFERENCES: [
                 CallbackQueryHandler(_handle_save_search_preference_wrapper, pattern=f"^{config.CALLBACK_SAVE_SEARCH_YES}$|^{config.CALLBACK_SAVE_SEARCH_NO}$")
             ],
+
+            # Пока обработчик ищет рейсы (у таких обработчиков block=False), доступны только отмена и /start,
+            # на остальной ввод бот отвечает, что поиск ещё идёт
+            ConversationHandler.WAITING: [
+                CommandHandler('cancel', cancel_handler),
+                CommandHandler('start', start_command),
+                *search_in_progress_handlers(dialog_callbacks_pattern),
+            ],
         },
         fallbacks=[
             CommandHandler('cancel', cancel_handler),
@@ -4,7 +4,9 @@ from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler, CallbackQueryHandler, MessageHandler, CommandHandler, filters
 from telegram.error import BadRequest
 
-from . import config, keyboards, flight_api, message_formatter, user_history, helpers
+from . import config, keyboards, flight_api, message_formatter, user_history
+from .airport_index import airport_index
+from .search_tasks import SearchCancelled, SearchTimedOut, searches
 
 logger = logging.getLogger(__name__)
 
@@ -110,7 +112,7 @@ async def handle_country_choice(update: Update, context: ContextTypes.DEFAULT_TY
 async def handle_city_choice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     country = context.user_data["departure_country"]
     city    = update.message.text
-    iata    = helpers.get_airport_iata(country, city)
+    iata    = airport_index.iata_by_city(country, city)
     if not iata:
         await update.message.reply_text("Город не найден, попробуйте ещё раз.")
         return config.TOP3_ASK_CITY
@@ -137,25 +139,31 @@ async def execute_search(
     params_base = context.user_data.copy()
     params_base.pop("is_one_way", None)
 
-    all_flights: list[dict] = []
-
     # ---- только туда-обратно ----
+    # Один проход по всему пулу: рейсы каждого аэропорта сразу попадают в общий top-3
+    # (как и раньше — три самых дешёвых рейса, направления могут повторяться), без склейки и пересортировки списков
+    tmp = {**params_base, "is_one_way": False,
+           "search_days_offset": params_base.get("search_days_offset", 5)}
     if airport_pool:
-        for dep_iata in airport_pool[:5]:
-            tmp = {**params_base, "departure_airport_iata": dep_iata, "is_one_way": False,
-                   "search_days_offset": params_base.get("search_days_offset", 5)}
-            flights = await flight_api.get_cheapest_flights_top3(tmp, limit=10)
-            if flights:
-                all_flights.extend(flights)
-    else:
-        tmp = {**params_base, "is_one_way": False,
-               "search_days_offset": params_base.get("search_days_offset", 5)}
-        flights = await flight_api.get_cheapest_flights_top3(tmp, limit=6)
-        if flights:
-            all_flights.extend(flights)
-
-    if not all_flights:
-        await context.bot.send_message(chat_id, "😔 Ничего не нашёл, попробуйте позже.")
+        tmp.update({"departure_airport_iata": None, "airport_pool": airport_pool[:5]})
+    # Поиск привязан к пользователю: /cancel останавливает его вместе с запросами к API
+    try:
+        top3 = await searches.run(
+            update.effective_user.id,
+            flight_api.get_cheapest_flights_top3(tmp, limit=3, unique_destinations=False),
+            config.SEARCH_DEADLINE_SEC,
+        )
+    except SearchCancelled:
+        logger.info("Top-3: поиск отменён пользователем.")
+        return ConversationHandler.END
+    except SearchTimedOut:
+        logger.warning("Top-3: дедлайн поиска истёк, ни один аэропорт не успел ответить.")
+        top3 = None
+
+    if not top3:
+        await context.bot.send_message(
+            chat_id, config.MSG_SEARCH_TIMED_OUT if top3 is None else "😔 Ничего не нашёл, попробуйте позже."
+        )
         # показать меню, чтобы пользователь не зависал
         has_saved = await user_history.has_saved_searches(update.effective_user.id)
         main_kb = keyboards.get_main_menu_keyboard(has_saved_searches=has_saved)
@@ -163,30 +171,37 @@ async def execute_search(
         context.user_data.clear()
         return ConversationHandler.END
 
-    all_flights.sort(key=lambda x: x["price"])
-    top3 = all_flights[:3]
-
     from_text = (
         "популярных европейских хабов"
         if airport_pool
         else context.user_data.get("departure_city_name", "—")
     )
 
+    header = f"🔁 <b>Топ-3 (в обе стороны)</b>\nИз: {from_text}\n"
+    if top3[0].get("partial"):
+        header += "⚠️ Часть аэропортов не ответила вовремя — показаны лучшие варианты из ответивших.\n"
+
     # заголовок для RT
     await context.bot.send_message(
         chat_id,
-        f"🔁 <b>Топ-3 (в обе стороны)</b>\nИз: {from_text}\n",
+        header,
         parse_mode="HTML",
     )
 
-    for idx, item in enumerate(top3, 1):
-        formatted = await message_formatter.format_flight_details(
+    # погода и курсы для всех трёх вариантов — одним параллельным проходом
+    top3_extras = await message_formatter.enrich_flights(
+        message_formatter.FlightContext(
             item["flight"],
             departure_city_name=context.user_data.get("departure_city_name"),
             arrival_city_name=item.get("arrival_city"),
             departure_country_name=item.get("departure_country"),
             arrival_country_name=item.get("arrival_country"),
         )
+        for item in top3
+    )
+
+    for idx, (item, extras) in enumerate(zip(top3, top3_extras), 1):
+        formatted = message_formatter.render_flight_details(item["flight"], extras)
         await context.bot.send_message(
             chat_id,
             f"🏆 <b>#{idx}</b>\n{formatted}",
@@ -251,6 +266,7 @@ async def cancel_top3(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         await update.callback_query.edit_message_text("🛑 Поиск Top-3 отменён.")
     else:
         await update.message.reply_text("🛑 Поиск Top-3 отменён.", reply_markup=ReplyKeyboardRemove())
+    searches.cancel(update.effective_user.id)
     context.user_data.clear()
     return ConversationHandler.END
 
@@ -17,6 +17,7 @@ from .config import (
     CALLBACK_START_TOP3,
     CALLBACK_ENTIRE_RANGE_SELECTED
 )
+from .route_index import route_index
 
 logger = logging.getLogger(__name__)
 
@@ -49,25 +50,37 @@ def get_flight_type_reply_keyboard() -> ReplyKeyboardMarkup:
         input_field_placeholder='1 (в одну) или 2 (в обе стороны)'
     )
 
-def get_country_reply_keyboard() -> ReplyKeyboardMarkup:
-    """Клавиатура для выбора страны."""
+def get_country_reply_keyboard(departure_iata: str | None = None) -> ReplyKeyboardMarkup:
+    """
+    Клавиатура для выбора страны. Если передан departure_iata (выбор страны прилёта) —
+    показываем только страны, куда есть прямые рейсы из этого аэропорта.
+    """
     if not COUNTRIES_DATA:
         logger.warning("Нет данных о странах для генерации клавиатуры.")
         return ReplyKeyboardMarkup([["Ошибка: нет данных о странах"]], one_time_keyboard=False, resize_keyboard=True)
 
-    country_names = sorted(list(COUNTRIES_DATA.keys()))
+    country_names = sorted(COUNTRIES_DATA.keys())
+    reachable = route_index.reachable_countries(departure_iata)
+    if reachable:
+        country_names = [name for name in country_names if name in reachable]
     keyboard = [country_names[i:i + 3] for i in range(0, len(country_names), 3)]
     return ReplyKeyboardMarkup(keyboard, one_time_keyboard=False, resize_keyboard=True)
 
 def get_city_reply_keyboard(
         country_name: str,
         override_cities: dict[str, str] | None = None,
+        departure_iata: str | None = None,
 ) -> ReplyKeyboardMarkup:
     """
     Клавиатура городов. Если override_cities передан —
     строим клавиатуру из него, иначе берём данные из COUNTRIES_DATA.
+    Если передан departure_iata (выбор города прилёта) — только города с прямыми рейсами из него.
     """
     cities_dict = override_cities or COUNTRIES_DATA.get(country_name, {})
+    if departure_iata and not override_cities:
+        reachable = route_index.reachable_cities(departure_iata, country_name)
+        if reachable:
+            cities_dict = reachable
     if not cities_dict:
         logger.warning(f"Нет городов для страны «{country_name}»")
         return ReplyKeyboardMarkup([["Нет доступных городов"]], one_time_keyboard=False, resize_keyboard=True)
@@ -0,0 +1,53 @@
+# bot/live_message.py
+import logging
+import time
+
+from telegram import Bot
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class LiveMessage:
+    """
+    Одно сообщение о ходе поиска, которое редактируется на месте вместо отправки новых.
+    Правки ограничены по частоте (не чаще min_interval секунд), промежуточный текст,
+    пришедший раньше срока, просто пропускается — следующий update() или finish() его перекроет.
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, min_interval: float):
+        self._bot = bot
+        self._chat_id = chat_id
+        self._min_interval = min_interval
+        self._message_id: int | None = None
+        self._text: str | None = None
+        self._edited_at = 0.0
+
+    async def start(self, text: str, message_id: int | None = None) -> None:
+        """Отправляет сообщение или, если передан message_id, продолжает править уже отправленное."""
+        if message_id is None:
+            message = await self._bot.send_message(chat_id=self._chat_id, text=text)
+            message_id = message.message_id
+        self._message_id = message_id
+        self._text = text
+        # Первая правка (первые найденные рейсы) уходит сразу, дальше — с ограничением частоты
+
+    async def update(self, text: str, force: bool = False) -> None:
+        """Правит сообщение, если с прошлой правки прошло min_interval (или force=True)."""
+        if self._message_id is None or text == self._text:
+            return
+        if not force and time.monotonic() - self._edited_at < self._min_interval:
+            return
+        try:
+            await self._bot.edit_message_text(chat_id=self._chat_id, message_id=self._message_id, text=text)
+            self._text = text
+        except RetryAfter as e:
+            logger.warning(f"LiveMessage: Telegram просит подождать {e.retry_after} с, правка пропущена.")
+        except BadRequest as e:
+            if "Message is not modified" not in str(e):
+                logger.warning(f"LiveMessage: не удалось изменить сообщение: {e}")
+        self._edited_at = time.monotonic()
+
+    async def finish(self, text: str) -> None:
+        """Итоговый текст — отправляется без учёта ограничения частоты."""
+        await self.update(text, force=True)
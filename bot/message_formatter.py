@@ -1,301 +1,233 @@
 # bot/message_formatter.py
+import asyncio
 import logging
-import json
 from datetime import datetime, timezone
-from decimal import Decimal, InvalidOperation
-from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Tuple
 
 from bot import weather_api
-from bot import helpers
 from bot import fx_rates
-from . import flight_api
-
-
-# === кэш IATA -> город ====================================================
-_AIRPORTS = {}
-_airports_path = Path(__file__).resolve().parent / "airports_raw.json"  # <-- ВАЖНО: parent, не parent.parent
-if _airports_path.exists():
-    raw = json.loads(_airports_path.read_text(encoding="utf-8"))
-    # raw – dict вида: {"STN": {"city": "London" | {"name":"London"}, ...}, ...}
-    for code, info in raw.items():
-        if isinstance(info.get("city"), dict):
-            city_name = info["city"].get("name")
-        else:
-            city_name = info.get("city")
-        if city_name:
-            _AIRPORTS[code.upper()] = city_name
-
-def _iata_to_city(val: str | None) -> str | None:
-    if val and len(val) == 3 and val.isalpha():
-        return _AIRPORTS.get(val.upper())
-    return None
+from .airport_index import airport_index
+from .flight_record import FlightRecord, format_cents
 
 
+logger = logging.getLogger(__name__)
 
-def _iata_to_city(val: str | None) -> str | None:
-    """Если val = 'BGY' → вернёт 'Bergamo', иначе None."""
-    if val and len(val) == 3 and val.isalpha():
-        return _AIRPORTS.get(val.upper())
-    return None
+WeatherMap = Dict[weather_api.WeatherKey, dict | None]
+# (город, координаты аэропорта или None, целевое время)
+WeatherTarget = Tuple[str | None, weather_api.Coordinates | None, datetime | None]
 
 
-logger = logging.getLogger(__name__)
+def _weather_date(target_dt: datetime) -> datetime:
+    # Дальше 5 дней прогноза нет — показываем погоду на сейчас
+    try:
+        if isinstance(target_dt, datetime) and (target_dt - datetime.now(timezone.utc)).days > 5:
+            return datetime.now(timezone.utc)
+    except Exception:
+        pass
+    return target_dt
+
+
+def _weather_targets(flight: FlightRecord,
+                     departure_city_name: str | None,
+                     arrival_city_name: str | None) -> Tuple[WeatherTarget, WeatherTarget]:
+    """
+    (вылет, прилёт) для блока погоды рейса. Координаты берутся из справочника
+    аэропортов по IATA рейса — погода запрашивается по ним, без угадывания названий.
+    """
+    dep_target_dt = flight.outbound.departure_time
+    arr_target_dt = flight.inbound.departure_time if flight.is_round_trip else dep_target_dt
+
+    # --- конвертируем IATA → город, если прилетели 3-буквенные коды ---
+    dep_city_for_weather = airport_index.city_by_iata(departure_city_name) or departure_city_name
+    arr_city_for_weather = airport_index.city_by_iata(arrival_city_name) or arrival_city_name
+
+    if not dep_city_for_weather:
+        dep_city_for_weather = flight.origin
+
+    if not arr_city_for_weather:
+        arr_city_for_weather = flight.destination
+
+    # ещё раз конвертируем IATA → город, если вдруг попал код
+    dep_city_for_weather = airport_index.city_by_iata(dep_city_for_weather) or dep_city_for_weather
+    arr_city_for_weather = airport_index.city_by_iata(arr_city_for_weather) or arr_city_for_weather
+
+    return (
+        (dep_city_for_weather, airport_index.coordinates_by_iata(flight.origin), dep_target_dt),
+        (arr_city_for_weather, airport_index.coordinates_by_iata(flight.destination), arr_target_dt),
+    )
+
+
+async def _prefetch_weather(items: Iterable[Tuple[FlightRecord, str | None, str | None]]) -> WeatherMap:
+    """
+    Погода для всей выдачи заранее: уникальные пары (город, слот) по всем рейсам
+    запрашиваются одним параллельным проходом. items — (рейс, город вылета, город прилёта),
+    из FlightContext; по результату _enrich берёт погоду без повторных запросов.
+    """
+    if weather_api.circuit.is_open():
+        return {}  # OWM отключён предохранителем — _enrich пропустит погоду
+    lookups = []
+    for flight, departure_city_name, arrival_city_name in items:
+        if flight is None:
+            continue
+        for city, coordinates, target_dt in _weather_targets(flight, departure_city_name, arrival_city_name):
+            if city and city != 'N/A' and target_dt:
+                lookups.append((city, _weather_date(target_dt), coordinates))
+    try:
+        return await weather_api.get_weather_batch(lookups)
+    except Exception as e:
+        # Без предзагрузки _enrich запросит погоду сам
+        logger.error(f"Ошибка предзагрузки погоды: {e}", exc_info=True)
+        return {}
+
+
+def _weather_skipped(city: str, coordinates: weather_api.Coordinates | None,
+                     target_dt: datetime, weather: WeatherMap | None) -> bool:
+    """True — погоды нет в предзагрузке, а OWM отключён предохранителем: не ждём его."""
+    if weather is not None and weather_api.weather_key(city, target_dt, coordinates) in weather:
+        return False
+    if weather_api.circuit.is_open():
+        weather_api.circuit.skip()
+        return True
+    return False
+
+
+async def _get_weather(city: str, coordinates: weather_api.Coordinates | None,
+                       target_dt: datetime, weather: WeatherMap | None) -> dict | None:
+    if weather is not None:
+        key = weather_api.weather_key(city, target_dt, coordinates)
+        if key in weather:
+            return weather[key]
+    return await weather_api.get_weather_with_forecast(city, target_dt, coordinates)
+
+
+class FlightContext(NamedTuple):
+    """Рейс и то, что о нём известно из поиска (города и страны, выбранные пользователем)."""
+    flight: FlightRecord
+    departure_city_name: str | None = None
+    arrival_city_name: str | None = None
+    departure_country_name: str | None = None
+    arrival_country_name: str | None = None
+
+
+class FlightExtras(NamedTuple):
+    """Всё, что нужно рендеру рейса помимо самого рейса (результат фазы обогащения)."""
+    weather: Tuple[dict | None, ...]  # по городу на каждый запрос погоды (None — не получена); () — без блока погоды
+    rates_line: str | None            # готовая строка курсов валют
+
+
+_NO_EXTRAS = FlightExtras((), None)
+
+
+def _rates_line(flight: FlightRecord,
+                departure_country_name: str | None,
+                arrival_country_name: str | None) -> str | None:
+    # ---------- пытаемся вывести страны, если их не передали ----------
+    # IATA аэропортов вылета / прилёта уже нормализованы в FlightRecord; через справочник аэропортов
+    if flight.origin and not departure_country_name:
+        departure_country_name = airport_index.country_by_iata(flight.origin)
+    if flight.destination and not arrival_country_name:
+        arrival_country_name = airport_index.country_by_iata(flight.destination)
+
+    if departure_country_name and arrival_country_name:
+        origin_currency = airport_index.currency_by_country(departure_country_name)
+        destination_currency = airport_index.currency_by_country(arrival_country_name)
+        if origin_currency and destination_currency:
+            # Курсы из снимка в памяти — без БД и сети
+            return fx_rates.format_rates(origin_currency, destination_currency)
+    return None
 
-def _get_simple_attr(obj: any, attr_name: str, default: str = 'N/A') -> str:
-    val = getattr(obj, attr_name, default)
-    return str(val)
 
-async def format_flight_details(flight: any,
-                                departure_city_name: str | None = None,
-                                arrival_city_name: str | None = None,
-                                departure_country_name: str | None = None,
-                                arrival_country_name: str | None = None) -> str:
+async def _enrich(context: FlightContext, weather: WeatherMap) -> FlightExtras:
+    flight = context.flight
+    if flight is None:
+        return _NO_EXTRAS
+    weather_infos = []
+    for city, coordinates, target_dt in _weather_targets(flight, context.departure_city_name, context.arrival_city_name):
+        if not city or city == 'N/A' or not target_dt:
+            continue
+        try_dt = _weather_date(target_dt)
+        if _weather_skipped(city, coordinates, try_dt, weather):
+            continue
+        info = await _get_weather(city, coordinates, try_dt, weather)
+        if not info:
+            logger.info(f"Прогноз погоды для города {city} на {target_dt} не получен.")
+        weather_infos.append(info)
+    return FlightExtras(
+        tuple(weather_infos),
+        _rates_line(flight, context.departure_country_name, context.arrival_country_name),
+    )
+
+
+async def enrich_flights(contexts: Iterable[FlightContext]) -> List[FlightExtras]:
+    """
+    Фаза 1 (I/O): погода, курсы и страны для всей выдачи. Погода — одним параллельным
+    проходом по уникальным (место, слот), данные рейсов собираются тоже параллельно.
+    Результат — по FlightExtras на каждый рейс, в том же порядке.
+    """
+    contexts = list(contexts)
+    weather = await _prefetch_weather(
+        (context.flight, context.departure_city_name, context.arrival_city_name) for context in contexts
+    )
+    results = await asyncio.gather(*(_enrich(context, weather) for context in contexts), return_exceptions=True)
+    extras = []
+    for context, result in zip(contexts, results):
+        if isinstance(result, Exception):
+            # Рейс всё равно покажем — без погоды и курсов
+            logger.error(f"Ошибка обогащения рейса {type(context.flight)}: {result}", exc_info=result)
+            result = _NO_EXTRAS
+        extras.append(result)
+    return extras
+
+
+def _weather_line(info: dict) -> str:
+    label = "сейчас" if info["type"] == "current" else info["dt"].strftime("%Y-%m-%d %H:%M")
+    return f"  В г. {info['city']} ({label}): {info['temperature']}°C {info['emoji']}"
+
+
+def render_flight_details(flight: FlightRecord, extras: FlightExtras = _NO_EXTRAS) -> str:
+    """Фаза 2: текст рейса по готовым данным — чистая функция, без I/O и await."""
     flight_info_parts = []
     custom_separator = "────────✈️────────\n"
     weather_separator = "----------------------------------------\n"
 
-    logger.debug(f"Начало форматирования для объекта flight: {type(flight)}")
     if flight is None:
-        logger.error("format_flight_details вызван с flight=None")
+        logger.error("render_flight_details вызван с flight=None")
         return "Ошибка: переданы неверные данные для форматирования рейса.\n"
 
     try:
-        # === 1) Вычисление целевых дат для погоды ===
-        dep_target_dt = None
-        arr_target_dt = None
-
-        # Если есть поле price, считаем, что это one-way
-        if hasattr(flight, 'price') and flight.price is not None:
-            dt_raw = getattr(flight, 'departureTime', None)
-            if isinstance(dt_raw, str):
-                try:
-                    dep_target_dt = datetime.fromisoformat(dt_raw.replace("Z", "+00:00"))
-                except Exception:
-                    dep_target_dt = None
-            elif isinstance(dt_raw, datetime):
-                dep_target_dt = dt_raw
-            arr_target_dt = dep_target_dt    
-        # Иначе если есть outbound и inbound, считаем round-trip
-        elif hasattr(flight, 'outbound') and flight.outbound and hasattr(flight, 'inbound') and flight.inbound:
-            out_raw = getattr(flight.outbound, 'departureTime', None)
-            in_raw = getattr(flight.inbound, 'departureTime', None)
-            if isinstance(out_raw, str):
-                try:
-                    dep_target_dt = datetime.fromisoformat(out_raw.replace("Z", "+00:00"))
-                except Exception:
-                    dep_target_dt = None
-            elif isinstance(out_raw, datetime):
-                dep_target_dt = out_raw
-            if isinstance(in_raw, str):
-                try:
-                    arr_target_dt = datetime.fromisoformat(in_raw.replace("Z", "+00:00"))
-                except Exception:
-                    arr_target_dt = None
-            elif isinstance(in_raw, datetime):
-                arr_target_dt = in_raw
-
-        # === 2) Основная информация о рейсе ===
-        if hasattr(flight, 'price') and flight.price is not None:  # Рейс в одну сторону
+        # === 1) Основная информация о рейсе ===
+        if not flight.is_round_trip:  # Рейс в одну сторону
             logger.debug("Форматирование рейса в одну сторону")
-
-            departure_time_val = getattr(flight, 'departureTime', None)
-            departure_time_str = str(departure_time_val)
-            if isinstance(departure_time_val, str):
-                try:
-                    dt_obj = datetime.fromisoformat(departure_time_val.replace("Z", "+00:00"))
-                    departure_time_str = dt_obj.strftime("%Y-%m-%d %H:%M")
-                except ValueError:
-                    logger.warning(f"Could not parse date string: {departure_time_val}")
-            elif isinstance(departure_time_val, datetime):
-                departure_time_str = departure_time_val.strftime("%Y-%m-%d %H:%M")
-
-            flight_number_val = _get_simple_attr(flight, 'flightNumber')
-            origin_full_val = _get_simple_attr(flight, 'originFull')
-            destination_full_val = _get_simple_attr(flight, 'destinationFull')
-
-            price_attr = getattr(flight, 'price', None)
-            price_str = "N/A"
-            if price_attr is not None:
-                try:
-                    price_val_decimal = Decimal(str(price_attr)).quantize(Decimal('0.01'))
-                    price_str = str(price_val_decimal)
-                except (InvalidOperation, ValueError) as e_price:
-                    logger.warning(f"Invalid price format for one-way: {price_attr}, error: {e_price}")
-            currency_val = _get_simple_attr(flight, 'currency', 'EUR')
-
-            flight_info_parts.append(f"✈️ Рейс: {flight_number_val}\n")
-            flight_info_parts.append(f"🗺️ Маршрут: {origin_full_val} → {destination_full_val}\n")
-            flight_info_parts.append(f"🛫 Вылет: {departure_time_str}\n")
-            flight_info_parts.append(f"💶 Цена: {price_str} {currency_val}\n")
-
-        elif hasattr(flight, 'outbound') and flight.outbound and hasattr(flight, 'inbound') and flight.inbound:
+            leg = flight.outbound
+            flight_info_parts.append(f"✈️ Рейс: {leg.flight_number}\n")
+            flight_info_parts.append(f"🗺️ Маршрут: {leg.origin_full} → {leg.destination_full}\n")
+            flight_info_parts.append(f"🛫 Вылет: {leg.departure_time.strftime('%Y-%m-%d %H:%M')}\n")
+            flight_info_parts.append(f"💶 Цена: {format_cents(leg.price_cents)} {leg.currency}\n")
+        else:
             logger.debug("Форматирование рейса туда-обратно")
             outbound = flight.outbound
             inbound = flight.inbound
 
-            # --- Outbound ---
-            out_departure_time_val = getattr(outbound, 'departureTime', None)
-            out_departure_time_str = str(out_departure_time_val)
-            if isinstance(out_departure_time_val, str):
-                try:
-                    dt_obj = datetime.fromisoformat(out_departure_time_val.replace("Z", "+00:00"))
-                    out_departure_time_str = dt_obj.strftime("%Y-%m-%d %H:%M")
-                except ValueError:
-                    logger.warning(f"Could not parse outbound date string: {out_departure_time_val}")
-            elif isinstance(out_departure_time_val, datetime):
-                out_departure_time_str = out_departure_time_val.strftime("%Y-%m-%d %H:%M")
-
-            out_flight_number_val = _get_simple_attr(outbound, 'flightNumber')
-            out_origin_full_val = _get_simple_attr(outbound, 'originFull')
-            out_destination_full_val = _get_simple_attr(outbound, 'destinationFull')
-            out_currency_val = _get_simple_attr(outbound, 'currency', 'EUR')
-
-            out_price_attr = getattr(outbound, 'price', None)
-            out_price_str = "N/A"
-            out_price_val_decimal = None
-            if out_price_attr is not None:
-                try:
-                    out_price_val_decimal = Decimal(str(out_price_attr)).quantize(Decimal('0.01'))
-                    out_price_str = str(out_price_val_decimal)
-                except (InvalidOperation, ValueError) as e_price:
-                    logger.warning(f"Invalid price format for outbound: {out_price_attr}, error: {e_price}")
-
-            # --- Inbound ---
-            in_departure_time_val = getattr(inbound, 'departureTime', None)
-            in_departure_time_str = str(in_departure_time_val)
-            if isinstance(in_departure_time_val, str):
-                try:
-                    dt_obj = datetime.fromisoformat(in_departure_time_val.replace("Z", "+00:00"))
-                    in_departure_time_str = dt_obj.strftime("%Y-%m-%d %H:%M")
-                except ValueError:
-                    logger.warning(f"Could not parse inbound date string: {in_departure_time_val}")
-            elif isinstance(in_departure_time_val, datetime):
-                in_departure_time_str = in_departure_time_val.strftime("%Y-%m-%d %H:%M")
-
-            in_flight_number_val = _get_simple_attr(inbound, 'flightNumber')
-            in_origin_full_val = _get_simple_attr(inbound, 'originFull')
-            in_destination_full_val = _get_simple_attr(inbound, 'destinationFull')
-
-            in_price_attr = getattr(inbound, 'price', None)
-            in_price_str = "N/A"
-            in_price_val_decimal = None
-            if in_price_attr is not None:
-                try:
-                    in_price_val_decimal = Decimal(str(in_price_attr)).quantize(Decimal('0.01'))
-                    in_price_str = str(in_price_val_decimal)
-                except (InvalidOperation, ValueError) as e_price:
-                    logger.warning(f"Invalid price format for inbound: {in_price_attr}, error: {e_price}")
-
             total_price_str = "N/A"
-            if isinstance(out_price_val_decimal, Decimal) and isinstance(in_price_val_decimal, Decimal):
-                total_price_val = (out_price_val_decimal + in_price_val_decimal).quantize(Decimal('0.01'))
-                total_price_str = str(total_price_val)
+            if outbound.price_cents is not None and inbound.price_cents is not None:
+                total_price_str = format_cents(outbound.price_cents + inbound.price_cents)
 
             flight_info_parts.append(f"🔄 Рейс туда и обратно\n\n")
             flight_info_parts.append(f"➡️ Вылет туда:\n")
-            flight_info_parts.append(f"  ✈️ Рейс: {out_flight_number_val}\n")
-            flight_info_parts.append(f"  🗺️ Маршрут: {out_origin_full_val} → {out_destination_full_val}\n")
-            flight_info_parts.append(f"  🛫 Вылет: {out_departure_time_str}\n")
-            flight_info_parts.append(f"  💶 Цена: {out_price_str} {out_currency_val}\n\n")
+            flight_info_parts.append(f"  ✈️ Рейс: {outbound.flight_number}\n")
+            flight_info_parts.append(f"  🗺️ Маршрут: {outbound.origin_full} → {outbound.destination_full}\n")
+            flight_info_parts.append(f"  🛫 Вылет: {outbound.departure_time.strftime('%Y-%m-%d %H:%M')}\n")
+            flight_info_parts.append(f"  💶 Цена: {format_cents(outbound.price_cents)} {outbound.currency}\n\n")
             flight_info_parts.append(f"⬅️ Вылет обратно:\n")
-            flight_info_parts.append(f"  ✈️ Рейс: {in_flight_number_val}\n")
-            flight_info_parts.append(f"  🗺️ Маршрут: {in_origin_full_val} → {in_destination_full_val}\n")
-            flight_info_parts.append(f"  🛫 Вылет: {in_departure_time_str}\n")
-            flight_info_parts.append(f"  💶 Цена: {in_price_str} {out_currency_val}\n\n")
-            flight_info_parts.append(f"💵 Общая цена: {total_price_str} {out_currency_val}\n")
-        else:
-            logger.warning(f"Не удалось отформатировать рейс (основная часть), неизвестная структура: {flight}.")
-            flight_info_parts.append("Не удалось отобразить информацию о рейсе (неизвестная структура).\n")
+            flight_info_parts.append(f"  ✈️ Рейс: {inbound.flight_number}\n")
+            flight_info_parts.append(f"  🗺️ Маршрут: {inbound.origin_full} → {inbound.destination_full}\n")
+            flight_info_parts.append(f"  🛫 Вылет: {inbound.departure_time.strftime('%Y-%m-%d %H:%M')}\n")
+            flight_info_parts.append(f"  💶 Цена: {format_cents(inbound.price_cents)} {outbound.currency}\n\n")
+            flight_info_parts.append(f"💵 Общая цена: {total_price_str} {outbound.currency}\n")
 
        
-        # === 4) Блок прогноза погоды ===
-        dep_city_for_weather = _iata_to_city(departure_city_name) or departure_city_name
-        arr_city_for_weather = _iata_to_city(arrival_city_name)   or arrival_city_name
-
-
-        # --- конвертируем IATA → город, если прилетели 3-буквенные коды ---
-        if dep_city_for_weather and len(dep_city_for_weather) == 3:
-            dep_city_for_weather = _AIRPORTS.get(dep_city_for_weather, dep_city_for_weather)
-
-        if arr_city_for_weather and len(arr_city_for_weather) == 3:
-            arr_city_for_weather = _AIRPORTS.get(arr_city_for_weather, arr_city_for_weather)
-
-
-
-        if not dep_city_for_weather:
-            origin_source = None
-            if hasattr(flight, 'outbound') and flight.outbound:
-                origin_source = flight.outbound
-            elif hasattr(flight, 'origin'):
-                origin_source = flight
-            if origin_source:
-                origin_val = _get_simple_attr(origin_source, 'origin', '')
-                dep_city_for_weather = origin_val.split(',')[0].strip() if ',' in origin_val else origin_val
-
-        if not arr_city_for_weather:
-            destination_source = None
-            if hasattr(flight, 'outbound') and flight.outbound:
-                destination_source = flight.outbound
-            elif hasattr(flight, 'inbound') and flight.inbound:
-                destination_source = flight.inbound
-            elif hasattr(flight, 'destination'):
-                destination_source = flight
-            if destination_source:
-                dest_val = _get_simple_attr(destination_source, 'destination', '')
-                arr_city_for_weather = dest_val.split(',')[0].strip() if ',' in dest_val else dest_val
-
-        # ещё раз конвертируем IATA → город, если вдруг попал код
-        dep_city_for_weather = _iata_to_city(dep_city_for_weather) or dep_city_for_weather
-        arr_city_for_weather = _iata_to_city(arr_city_for_weather) or arr_city_for_weather
-        
-
-        weather_text_parts = []
-        attempted_dep_weather = False
-        attempted_arr_weather = False
-
-        # 4.1) Погода для города вылета
-        if dep_city_for_weather and dep_city_for_weather != 'N/A' and dep_target_dt:
-            attempted_dep_weather = True
-            logger.debug(f"Запрос прогноза для города вылета: {dep_city_for_weather} на {dep_target_dt}")
-            try_dt = dep_target_dt
-            try:
-                if isinstance(dep_target_dt, datetime) and (dep_target_dt - datetime.now(timezone.utc)).days > 5:
-                    try_dt = datetime.now(timezone.utc)
-            except Exception:
-                pass
-
-            dep_weather_info = await weather_api.get_weather_with_forecast(dep_city_for_weather, try_dt)
-
-            if dep_weather_info:
-                label = "сейчас" if dep_weather_info["type"] == "current" else dep_weather_info["dt"].strftime("%Y-%m-%d %H:%M")
-                weather_text_parts.append(
-                    f"  В г. {dep_weather_info['city']} ({label}): {dep_weather_info['temperature']}°C {dep_weather_info['emoji']}"
-                )
-            else:
-                logger.info(f"Прогноз погоды для города вылета {dep_city_for_weather} на {dep_target_dt} не получен.")
-
-        # 4.2) Погода для города прилёта (если есть дата и город)
-        if arr_city_for_weather and arr_city_for_weather != 'N/A' and arr_target_dt:
-            attempted_arr_weather = True
-            logger.debug(f"Запрос прогноза для города прилета: {arr_city_for_weather} на {arr_target_dt}")
-            try_dt = arr_target_dt
-            try:
-                if isinstance(arr_target_dt, datetime) and (arr_target_dt - datetime.now(timezone.utc)).days > 5:
-                    try_dt = datetime.now(timezone.utc)
-            except Exception:
-                pass
-
-            arr_weather_info = await weather_api.get_weather_with_forecast(arr_city_for_weather, try_dt)
-
-            if arr_weather_info:
-                label = "сейчас" if arr_weather_info["type"] == "current" else arr_weather_info["dt"].strftime("%Y-%m-%d %H:%M")
-                weather_text_parts.append(
-                    f"  В г. {arr_weather_info['city']} ({label}): {arr_weather_info['temperature']}°C {arr_weather_info['emoji']}"
-                )
-            else:
-                logger.info(f"Прогноз погоды для города прилета {arr_city_for_weather} на {arr_target_dt} не получен.")
-
-
+        # === 2) Блок прогноза погоды (данные собраны в enrich_flights) ===
+        weather_text_parts = [_weather_line(info) for info in extras.weather if info]
 
         # 🔎 CTA: больше вариантов перед погодой
         flight_info_parts.append(f"\n{weather_separator}")
@@ -305,7 +237,7 @@ async def format_flight_details(flight: any,
         )
         
 
-        if attempted_dep_weather or attempted_arr_weather:
+        if extras.weather:
             flight_info_parts.append(f"{weather_separator}☝️ Прогноз доступен только на текущий день и до 5 дней вперёд.\n")
             flight_info_parts.append(f"{weather_separator}🌬️ Прогноз погоды:\n")
             if weather_text_parts:
@@ -313,42 +245,9 @@ async def format_flight_details(flight: any,
             else:
                 flight_info_parts.append("  В данный момент прогноз погоды недоступен.\n")
 
-                # ---------- пытаемся вывести страны, если их не передали ----------
-        if not departure_country_name or not arrival_country_name:
-            # определяем IATA аэропортов вылета / прилёта
-            dep_iata = None
-            arr_iata = None
-
-            if hasattr(flight, "origin"):
-                dep_iata = flight.origin[-3:]
-            elif hasattr(flight, "outbound") and flight.outbound:
-                dep_iata = getattr(flight.outbound, "origin", "")[-3:]
-
-            if hasattr(flight, "destination"):
-                arr_iata = flight.destination[-3:]
-            elif hasattr(flight, "outbound") and flight.outbound:
-                arr_iata = getattr(flight.outbound, "destination", "")[-3:]
-
-            # через вспомогательную функцию flight_api.find_country_by_airport
-            if dep_iata and not departure_country_name:
-                departure_country_name = flight_api.find_country_by_airport(dep_iata)
-            if arr_iata and not arrival_country_name:
-                arrival_country_name = flight_api.find_country_by_airport(arr_iata)
-        # -------------------------------------------------------------------
-        
-        
-        # <<< НАЧАЛО НОВОГО БЛОКА ДЛЯ КУРСОВ ВАЛЮТ >>>
-        rates_line = None
-        if departure_country_name and arrival_country_name:
-            origin_currency = helpers.get_country_currency(departure_country_name)
-            destination_currency = helpers.get_country_currency(arrival_country_name)
-            
-            if origin_currency and destination_currency:
-                rates_line = await fx_rates.format_rates(origin_currency, destination_currency)
-        
-        if rates_line:
-            flight_info_parts.append(rates_line)
-        # <<< КОНЕЦ НОВОГО БЛОКА ДЛЯ КУРСОВ ВАЛЮТ >>>
+        # === 3) Курсы валют ===
+        if extras.rates_line:
+            flight_info_parts.append(extras.rates_line)
         #flight_info_parts.append(
         #    '☕ <b><a href="https://tronscan.org/#/address/TZ6rTYbF5Go94Q4f9uZwcVZ4g3oAnzwDHN">'
         #    'Поддержать проект в USDT (TRC-20)</a></b>\n'
@@ -358,7 +257,7 @@ async def format_flight_details(flight: any,
 
 
 
-        # === 5) Основная линия с ✈️ в самом конце ===
+        # === 4) Основная линия с ✈️ в самом конце ===
         flight_info_parts.append(f"\n{custom_separator}")
 
         return "".join(flight_info_parts)
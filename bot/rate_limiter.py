@@ -0,0 +1,186 @@
+# bot/rate_limiter.py
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Классы приоритета: чем меньше число, тем раньше запрос получает токен
+PRIORITY_INTERACTIVE = 0  # поиск, который ждёт пользователь
+PRIORITY_BACKGROUND = 1   # фоновые задачи (прогрев Top-3 и т.п.)
+
+# Приоритет текущего запроса. Фоновые задачи выставляют PRIORITY_BACKGROUND,
+# значение наследуется всеми задачами, созданными внутри.
+request_priority: ContextVar[int] = ContextVar("ryanair_request_priority", default=PRIORITY_INTERACTIVE)
+
+
+class SharedPriority:
+    """
+    Приоритет общего запроса (single-flight), который ждут несколько вызывающих:
+    присоединившийся вызывающий с более высоким приоритетом поднимает его через limiter.boost().
+    """
+    __slots__ = ("priority", "future")
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.future: Optional[asyncio.Future] = None  # ожидание токена, пока запрос в очереди
+
+
+# Задан внутри общего запроса: acquire() берёт приоритет отсюда, а не из request_priority
+shared_priority: ContextVar[Optional[SharedPriority]] = ContextVar("ryanair_shared_priority", default=None)
+
+
+def is_throttling_error(exc: BaseException) -> bool:
+    """
+    True, если Ryanair ответил 429 или 5xx. Смотрим только на HTTP-статус ответа
+    (ryanair-py поднимает requests.HTTPError из raise_for_status); текст исключения
+    не разбираем — номер рейса или порт в нём не должны тормозить всех пользователей.
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    return isinstance(status, int) and (status == 429 or 500 <= status < 600)
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket для запросов к Ryanair API, общий для всех вызовов find_flights_api.
+    • Токены пополняются со скоростью rate в секунду, не больше burst.
+    • Ожидающие запросы обслуживаются по приоритету, внутри приоритета — по очереди.
+    • При 429/5xx скорость уменьшается вдвое и выдача токенов приостанавливается (backoff),
+      после успешных ответов скорость постепенно возвращается к исходной.
+    """
+
+    def __init__(self, rate_per_sec: float, burst: int, min_rate_per_sec: float, max_backoff_sec: float):
+        self._base_rate = rate_per_sec
+        self._rate = rate_per_sec
+        self._min_rate = min_rate_per_sec
+        self._capacity = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._max_backoff = max_backoff_sec
+        self._backoff_sec = 0.0
+        self._paused_until = 0.0
+
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self._acquired = 0
+        self._throttled = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _record_wait(self, waited: float) -> None:
+        self._acquired += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    async def acquire(self, priority: Optional[int] = None) -> None:
+        """Ждёт токен. Приоритет по умолчанию — общего запроса (shared_priority) или request_priority."""
+        shared = shared_priority.get()
+        if priority is None:
+            priority = shared.priority if shared is not None else request_priority.get()
+        started = time.monotonic()
+
+        self._refill()
+        if not self._waiters and started >= self._paused_until and self._tokens >= 1:
+            self._tokens -= 1
+            self._record_wait(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        if shared is not None:
+            shared.future = future
+        try:
+            await future
+        finally:
+            if shared is not None:
+                shared.future = None
+        self._record_wait(time.monotonic() - started)
+
+    def boost(self, shared: SharedPriority, priority: int) -> None:
+        """Поднимает приоритет общего запроса; если он уже ждёт токен — переставляет его в очереди."""
+        if priority >= shared.priority:
+            return
+        shared.priority = priority
+        future = shared.future
+        if future is not None and not future.done():
+            # Старая запись останется в куче: диспетчер пропустит её, когда future уже выполнен
+            heapq.heappush(self._waiters, (priority, next(self._seq), future))
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():  # ожидающий уже отменён
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+
+    def report_throttled(self) -> None:
+        """Ryanair ответил 429/5xx: снижаем скорость и делаем паузу."""
+        self._throttled += 1
+        self._rate = max(self._min_rate, self._rate / 2)
+        self._backoff_sec = min(self._max_backoff, max(1.0, self._backoff_sec * 2))
+        self._paused_until = time.monotonic() + self._backoff_sec
+        self._tokens = 0.0
+        logger.warning(
+            f"Ryanair API: признаки троттлинга. Скорость снижена до {self._rate:.2f} запр/с, "
+            f"пауза {self._backoff_sec:.0f} с."
+        )
+
+    def report_success(self) -> None:
+        """Успешный ответ: постепенно возвращаем исходную скорость."""
+        self._backoff_sec = 0.0
+        if self._rate < self._base_rate:
+            self._rate = min(self._base_rate, self._rate * 1.25)
+
+    def stats(self) -> Dict[str, float]:
+        self._refill()
+        # Поднятый запрос лежит в куче дважды — учитываем его по лучшему приоритету
+        best: Dict[asyncio.Future, int] = {}
+        for p, _, f in self._waiters:
+            if not f.done():
+                best[f] = min(p, best.get(f, p))
+        waiting_interactive = sum(1 for p in best.values() if p == PRIORITY_INTERACTIVE)
+        waiting_background = len(best) - waiting_interactive
+        return {
+            "tokens": round(self._tokens, 2),
+            "rate_per_sec": round(self._rate, 2),
+            "waiting_interactive": waiting_interactive,
+            "waiting_background": waiting_background,
+            "acquired": self._acquired,
+            "throttled": self._throttled,
+            "avg_wait_sec": round(self._wait_total / self._acquired, 3) if self._acquired else 0.0,
+            "max_wait_sec": round(self._wait_max, 3),
+            "paused_for_sec": round(max(0.0, self._paused_until - time.monotonic()), 1),
+        }
+
+
+limiter = TokenBucketLimiter(
+    rate_per_sec=config.RYANAIR_RATE_PER_SEC,
+    burst=config.RYANAIR_RATE_BURST,
+    min_rate_per_sec=config.RYANAIR_MIN_RATE_PER_SEC,
+    max_backoff_sec=config.RYANAIR_MAX_BACKOFF_SEC,
+)
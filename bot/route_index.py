@@ -0,0 +1,118 @@
+# bot/route_index.py
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+from telegram.ext import ContextTypes
+
+from . import config
+from .airport_index import airport_index
+
+logger = logging.getLogger(__name__)
+
+ROUTES_PATH = Path(__file__).resolve().parents[1] / "data" / "routes.json"
+
+
+def _read_routes(path: Path) -> Dict[str, FrozenSet[str]]:
+    """{IATA вылета: frozenset(IATA прилёта)} из data/routes.json."""
+    if not path.exists():
+        logger.warning(f"Файл маршрутов {path} не найден, фильтрация по маршрутам отключена.")
+        return {}
+    try:
+        raw = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Ошибка чтения {path}: {e}")
+        return {}
+    return {origin.upper(): frozenset(code.upper() for code in dests) for origin, dests in raw.items()}
+
+
+class RouteIndex:
+    """
+    Сеть маршрутов Ryanair: аэропорт вылета → аэропорты с прямыми рейсами.
+    • Если по аэропорту вылета данных нет, считается, что летать можно куда угодно
+      (ничего не отсекаем, чтобы не потерять рейсы из-за устаревшего файла).
+      Пустой индекс (data/routes.json ещё не скачан) ничего не фильтрует.
+    • reload() подменяет словарь целиком — читатели не видят наполовину обновлённых данных.
+    """
+
+    def __init__(self, routes: Dict[str, Iterable[str]]):
+        self._routes: Dict[str, FrozenSet[str]] = {o: frozenset(d) for o, d in routes.items()}
+        self._mtime: Optional[float] = None
+
+    @classmethod
+    def load(cls, path: Path = ROUTES_PATH) -> "RouteIndex":
+        index = cls({})
+        index.reload(path)
+        return index
+
+    def reload(self, path: Path = ROUTES_PATH) -> None:
+        routes = _read_routes(path)
+        self._mtime = path.stat().st_mtime if path.exists() else None
+        if routes or not self._routes:
+            self._routes = routes
+        total = sum(len(d) for d in self._routes.values())
+        logger.info(f"Сеть маршрутов: {len(self._routes)} аэропортов вылета, {total} направлений.")
+
+    def loaded_at(self) -> Optional[float]:
+        """mtime файла, из которого загружена сеть маршрутов (None — файла не было)."""
+        return self._mtime
+
+    def destinations(self, origin: Optional[str]) -> Optional[FrozenSet[str]]:
+        """Прямые направления из origin или None, если данных по аэропорту нет."""
+        if not origin:
+            return None
+        return self._routes.get(origin.upper())
+
+    def is_served(self, origin: Optional[str], destination: Optional[str]) -> bool:
+        """False только если маршрут точно не обслуживается."""
+        if not destination:
+            return True
+        served = self.destinations(origin)
+        return served is None or destination.upper() in served
+
+    def reachable_countries(self, origin: Optional[str]) -> Optional[Set[str]]:
+        """Страны, куда есть прямые рейсы из origin (None — фильтровать нечем)."""
+        served = self.destinations(origin)
+        if served is None:
+            return None
+        return {country for country in map(airport_index.country_by_iata, served) if country}
+
+    def reachable_cities(self, origin: Optional[str], country: str) -> Optional[Dict[str, str]]:
+        """{город: IATA} страны country, куда есть прямые рейсы из origin (None — фильтровать нечем)."""
+        served = self.destinations(origin)
+        if served is None:
+            return None
+        return {
+            city: iata
+            for city, iata in config.COUNTRIES_DATA.get(country, {}).items()
+            if iata.upper() in served
+        }
+
+
+route_index = RouteIndex.load()
+
+
+def _download_routes() -> bool:
+    # Скрипт обновления использует синхронный requests — импортируем только в фоновом потоке
+    from . import update_routes
+    return update_routes.write_routes(update_routes.fetch_routes(update_routes.load_airport_codes()))
+
+
+async def refresh_routes_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Периодическая задача: перекачивает data/routes.json, если он устарел, и перечитывает индекс."""
+    try:
+        mtime = os.path.getmtime(ROUTES_PATH) if ROUTES_PATH.exists() else 0.0
+        if time.time() - mtime >= config.ROUTES_MAX_AGE_SEC:
+            logger.info("Сеть маршрутов устарела, загружаем заново...")
+            if not await asyncio.to_thread(_download_routes):
+                logger.warning("Не удалось обновить сеть маршрутов, остаёмся на прежних данных.")
+                return
+        elif mtime == route_index.loaded_at():
+            return
+        route_index.reload()
+    except Exception as e:
+        logger.error(f"Ошибка обновления сети маршрутов: {e}", exc_info=True)
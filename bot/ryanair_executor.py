@@ -0,0 +1,103 @@
+# bot/ryanair_executor.py
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class RyanairExecutor:
+    """
+    Слой выполнения для синхронного клиента ryanair-py.
+    Каждый вызов уходит в ограниченный пул потоков, поэтому event loop
+    Application не блокируется, пока идёт запрос к Ryanair.
+    Семафор ограничивает число одновременных запросов, остальные ждут в очереди.
+    """
+
+    def __init__(self, max_workers: int, max_concurrent: int):
+        self._max_workers = max_workers
+        self._max_concurrent = max_concurrent
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="ryanair")
+        return self._pool
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Создаём лениво, чтобы семафор принадлежал работающему event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrent)
+        return self._semaphore
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Выполняет func(*args, **kwargs) в пуле потоков и ждёт результат, не блокируя loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore()
+
+        self._queued += 1
+        if semaphore.locked():
+            logger.info(f"Ryanair API: все слоты заняты, запрос ждёт в очереди (очередь={self._queued}, в работе={self._in_flight}).")
+        try:
+            await semaphore.acquire()
+        finally:
+            self._queued -= 1
+
+        self._in_flight += 1
+        future = self._get_pool().submit(functools.partial(func, *args, **kwargs))
+        release_now = True
+        try:
+            result = await asyncio.wrap_future(future)
+            self._completed += 1
+            return result
+        except asyncio.CancelledError:
+            # Поиск отменён. Ещё не начатый вызов снимается с пула, а уже идущий HTTP-запрос
+            # прервать нельзя — его слот освобождается, только когда поток действительно закончит
+            self._cancelled += 1
+            if not future.cancel() and not future.done():
+                release_now = False
+                future.add_done_callback(lambda _f: loop.call_soon_threadsafe(self._release, semaphore))
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            if release_now:
+                self._release(semaphore)
+
+    def _release(self, semaphore: asyncio.Semaphore) -> None:
+        self._in_flight -= 1
+        semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Текущее состояние слоя: глубина очереди и число запросов в работе."""
+        return {
+            "queued": self._queued,
+            "in_flight": self._in_flight,
+            "completed": self._completed,
+            "failed": self._failed,
+            "cancelled": self._cancelled,
+            "max_concurrent": self._max_concurrent,
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            logger.info("Пул потоков для Ryanair API остановлен.")
+
+
+executor = RyanairExecutor(
+    max_workers=config.RYANAIR_MAX_WORKERS,
+    max_concurrent=config.RYANAIR_MAX_CONCURRENT_CALLS,
+)
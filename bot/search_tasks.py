@@ -0,0 +1,88 @@
+# bot/search_tasks.py
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Coroutine, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Момент (по time.monotonic()), к которому текущий поиск должен закончиться.
+# Как и rate_limiter.request_priority, значение наследуется всеми задачами,
+# созданными внутри поиска, и доходит до find_flights_api.
+search_deadline: ContextVar[Optional[float]] = ContextVar("search_deadline", default=None)
+
+
+def time_left(cap: Optional[float] = None) -> Optional[float]:
+    """
+    Сколько секунд осталось до дедлайна текущего поиска (не меньше 0, не больше cap).
+    None — дедлайна нет и cap не задан.
+    """
+    deadline = search_deadline.get()
+    if deadline is None:
+        return cap
+    remaining = max(0.0, deadline - time.monotonic())
+    return remaining if cap is None else min(cap, remaining)
+
+
+class SearchCancelled(Exception):
+    """Поиск остановлен пользователем (/cancel) или вытеснен его новым поиском."""
+
+
+class SearchTimedOut(Exception):
+    """Дедлайн поиска истёк раньше, чем ответили все запросы к Ryanair: результат неполный."""
+
+
+class SearchRegistry:
+    """
+    Поиски пользователей как отслеживаемые задачи: не больше одного поиска на пользователя.
+    • run() запускает поиск с дедлайном, предыдущий поиск этого пользователя отменяется;
+    • cancel() останавливает поиск по /cancel — отмена доходит до всех параллельных
+      запросов поиска, ждущие токена/слота запросы к Ryanair так и не уходят.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self.started = 0
+        self.cancelled = 0
+
+    async def run(self, user_id: int, coro: Coroutine[Any, Any, Any], timeout: float) -> Any:
+        """Выполняет coro как поиск пользователя. SearchCancelled — если поиск отменили."""
+        self.cancel(user_id, reason="новый поиск")
+        token = search_deadline.set(time.monotonic() + timeout)
+        try:
+            task = asyncio.create_task(coro)
+        finally:
+            search_deadline.reset(token)
+        self._tasks[user_id] = task
+        self.started += 1
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Отменили сам поиск через cancel() (он снимает задачу с учёта), а не обработчик, который его ждёт
+            if task.cancelled() and self._tasks.get(user_id) is not task:
+                raise SearchCancelled() from None
+            raise
+        finally:
+            if self._tasks.get(user_id) is task:
+                del self._tasks[user_id]
+
+    def cancel(self, user_id: Optional[int], reason: str = "/cancel") -> bool:
+        """Отменяет текущий поиск пользователя. True — было что отменять."""
+        task = self._tasks.pop(user_id, None) if user_id is not None else None
+        if task is None or task.done():
+            return False
+        task.cancel()
+        self.cancelled += 1
+        logger.info(f"Поиск пользователя {user_id} отменён ({reason}).")
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": sum(1 for task in self._tasks.values() if not task.done()),
+            "started": self.started,
+            "cancelled": self.cancelled,
+        }
+
+
+searches = SearchRegistry()
@@ -0,0 +1,62 @@
+# bot/single_flight.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Схлопывание одинаковых одновременных запросов: если запрос с таким же ключом
+    уже выполняется, следующие вызывающие ждут тот же результат, а не идут в сеть.
+    Работа идёт в отдельной задаче, поэтому отмена одного из ожидающих не ломает остальных;
+    если же отменились все ожидающие, запрос тоже отменяется — результат больше никому не нужен.
+    Подклассы могут переопределить _start / _join / _wait (см. fare_cache.FareSingleFlight).
+    """
+
+    def __init__(self, name: str = "Single-flight"):
+        self._name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.leaders = 0      # запросов, реально выполненных
+        self.saved_calls = 0  # запросов, присоединившихся к уже идущему
+
+    def _start(self, func: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Запускает общую задачу для первого вызывающего."""
+        return asyncio.ensure_future(func())
+
+    def _join(self, task: asyncio.Task) -> None:
+        """Вызывается, когда к идущей задаче присоединяется ещё один вызывающий."""
+
+    async def _wait(self, task: asyncio.Task) -> Any:
+        """Ожидание общей задачи одним вызывающим; shield — чтобы его отмена не отменила задачу."""
+        return await asyncio.shield(task)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.saved_calls += 1
+            logger.info(f"{self._name}: запрос {key} уже выполняется, ждём его результат (сэкономлено: {self.saved_calls}).")
+            self._join(task)
+        else:
+            self.leaders += 1
+            task = self._start(func)
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _t, _key=key: self._in_flight.pop(_key, None))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await self._wait(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._in_flight),
+            "leaders": self.leaders,
+            "saved_calls": self.saved_calls,
+        }
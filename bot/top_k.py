@@ -0,0 +1,91 @@
+# bot/top_k.py
+import heapq
+import itertools
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .flight_record import FlightRecord
+
+# Элемент кучи: (-цена в центах, -порядковый номер, запись).
+# Корень кучи — худший из отобранных рейсов: самый дорогой, при равной цене — пришедший позже.
+_HeapEntry = Tuple[int, int, FlightRecord]
+
+
+class TopKAggregator:
+    """
+    Потоковый отбор N самых дешёвых рейсов на ограниченной куче.
+    • Рейсы добавляются порциями по мере готовности результатов каждого аэропорта,
+      в памяти держится не больше N отобранных (плюс вытесненные при дедупликации).
+    • unique_destinations=True: для каждого направления остаётся только самый дешёвый рейс.
+    • Рейсы без цены пропускаются.
+    """
+
+    def __init__(self, limit: int, unique_destinations: bool = False):
+        self._limit = max(0, limit)
+        self._unique = unique_destinations
+        self._heap: List[_HeapEntry] = []
+        self._seq = itertools.count()
+        self._by_destination: Dict[str, _HeapEntry] = {}  # живые элементы кучи по направлению
+        self._stale = 0  # элементы кучи, заменённые более дешёвым рейсом того же направления
+        self.seen = 0
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._stale
+
+    def _is_live(self, entry: _HeapEntry) -> bool:
+        return not self._unique or self._by_destination.get(entry[2].destination) is entry
+
+    def _pop_worst(self) -> Optional[_HeapEntry]:
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self._is_live(entry):
+                return entry
+            self._stale -= 1
+        return None
+
+    def _peek_worst(self) -> Optional[_HeapEntry]:
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+            self._stale -= 1
+        return self._heap[0] if self._heap else None
+
+    def add(self, record: FlightRecord) -> None:
+        self.seen += 1
+        if record.price_cents is None or self._limit == 0:
+            return
+        entry: _HeapEntry = (-record.price_cents, -next(self._seq), record)
+
+        if self._unique:
+            current = self._by_destination.get(record.destination)
+            if current is not None:
+                if entry <= current:  # не дешевле уже отобранного рейса в это направление
+                    return
+                self._by_destination[record.destination] = entry
+                heapq.heappush(self._heap, entry)
+                self._stale += 1
+                if self._stale > self._limit:
+                    self._heap = [e for e in self._heap if self._is_live(e)]
+                    heapq.heapify(self._heap)
+                    self._stale = 0
+                return
+
+        if len(self) >= self._limit:
+            worst = self._peek_worst()
+            if entry <= worst:  # дороже худшего из отобранных
+                return
+            self._pop_worst()
+            if self._unique:
+                del self._by_destination[worst[2].destination]
+
+        heapq.heappush(self._heap, entry)
+        if self._unique:
+            self._by_destination[record.destination] = entry
+
+    def add_many(self, records: Iterable[FlightRecord]) -> None:
+        for record in records:
+            self.add(record)
+
+    def result(self) -> List[FlightRecord]:
+        """Отобранные рейсы по возрастанию цены (при равной цене — в порядке поступления)."""
+        live = [entry for entry in self._heap if self._is_live(entry)]
+        live.sort(reverse=True)
+        return [record for _, _, record in live]
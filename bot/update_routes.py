@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+update_routes.py
+
+Downloads the Ryanair route network (origin -> directly served destinations)
+for every airport in data/airports_raw.json and writes data/routes.json.
+Creates a backup of the old routes.json. An empty download never overwrites
+the existing file.
+
+Airports are fetched in a small thread pool under an overall deadline;
+airports that did not answer in time are left out of the file (the bot
+treats an unknown origin as "may fly anywhere").
+"""
+
+import json
+import pathlib
+import sys
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Served destinations of one airport
+URL = "https://www.ryanair.com/api/views/locate/searchWidget/routes/en/airport/{code}"
+
+# Paths relative to project root
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DATA_DIR = ROOT / "data"
+AIRPORTS = DATA_DIR / "airports_raw.json"
+OUT = DATA_DIR / "routes.json"
+BACKUP = DATA_DIR / "routes.backup.json"
+
+MAX_WORKERS = 8         # parallel requests to ryanair.com
+REQUEST_TIMEOUT = 10    # seconds per airport
+DEADLINE = 300          # seconds for the whole download
+
+
+def load_airport_codes() -> list[str]:
+    airports = json.loads(AIRPORTS.read_text(encoding="utf-8"))
+    return sorted({airport["code"] for airport in airports if airport.get("code")})
+
+
+def fetch_destinations(session: requests.Session, code: str) -> list[str] | None:
+    """Direct destinations of one airport, or None if the request failed."""
+    try:
+        response = session.get(URL.format(code=code), timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        routes = response.json()
+    except Exception as e:
+        print(f"[error] failed to fetch routes for {code}: {e}", file=sys.stderr)
+        return None
+    destinations = set()
+    for route in routes:
+        # Routes via a connectingAirport are not direct
+        if route.get("connectingAirport"):
+            continue
+        arrival = (route.get("arrivalAirport") or {}).get("code")
+        if arrival:
+            destinations.add(arrival)
+    return sorted(destinations)
+
+
+def fetch_routes(codes: list[str], workers: int = MAX_WORKERS, deadline: float = DEADLINE) -> dict[str, list[str]]:
+    """
+    {origin: [destinations]} for every airport that answered within the deadline.
+    Takes at most deadline + REQUEST_TIMEOUT seconds: requests still in flight
+    at the deadline are allowed to finish, queued ones are dropped.
+    """
+    result: dict[str, list[str]] = {}
+    with requests.Session() as session:
+        session.mount("https://", HTTPAdapter(pool_maxsize=workers))
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = {pool.submit(fetch_destinations, session, code): code for code in codes}
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                destinations = future.result()
+                if destinations is not None:
+                    result[futures[future]] = destinations
+        except TimeoutError:
+            print(f"[error] deadline of {deadline}s exceeded, "
+                  f"{len(codes) - len(result)} airports skipped", file=sys.stderr)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    return result
+
+
+def write_routes(routes: dict[str, list[str]]) -> bool:
+    if not routes:
+        print("[error] empty route network, keeping the old file", file=sys.stderr)
+        return False
+    if OUT.exists():
+        BACKUP.write_text(OUT.read_text(encoding="utf-8"), encoding="utf-8")
+        print(f"[backup] created {BACKUP.relative_to(ROOT)}")
+    tmp = OUT.with_suffix(".tmp")
+    tmp.write_text(json.dumps(routes, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    tmp.replace(OUT)
+    total = sum(len(destinations) for destinations in routes.values())
+    print(f"[update] wrote {OUT.relative_to(ROOT)}: {len(routes)} airports, {total} routes")
+    return True
+
+
+def main():
+    # ensure data/ exists
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+    try:
+        codes = load_airport_codes()
+    except Exception as e:
+        print(f"[error] failed to read {AIRPORTS}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not write_routes(fetch_routes(codes)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,58 @@
 # bot/weather_api.py
 import httpx  # Используем httpx для асинхронных запросов
+import asyncio
+import bisect
+import calendar
+import importlib.util
 import logging
+import time
+from collections import OrderedDict
 from datetime import datetime
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
 from bot import config  # Для доступа к API ключу
+from bot.circuit_breaker import CircuitBreaker, CircuitOpenError
+from bot.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# HTTP/2 в httpx требует пакет h2; без него работаем по HTTP/1.1 с keep-alive
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=_HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=config.WEATHER_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.WEATHER_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.WEATHER_HTTP_KEEPALIVE_EXPIRY_SEC,
+        ),
+        timeout=httpx.Timeout(
+            config.WEATHER_HTTP_READ_TIMEOUT_SEC,
+            connect=config.WEATHER_HTTP_CONNECT_TIMEOUT_SEC,
+        ),
+    )
+
+async def init_client():
+    """Создаёт общий клиент при запуске бота (post_init)."""
+    global _http_client
+    if _http_client is None:
+        _http_client = _create_client()
+        logger.info(f"HTTP-клиент для погоды создан (HTTP/2: {'да' if _HTTP2_AVAILABLE else 'нет, пакет h2 не установлен'}).")
+
+async def get_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None: _http_client = _create_client()
+    return _http_client
+
+async def close_client():
+    global _http_client
+    if _http_client:
+        await _http_client.aclose()
+        _http_client = None
+        logger.info("HTTP-клиент для погоды был успешно закрыт.")
+
 # Упрощённая карта погодных условий к эмодзи
 WEATHER_EMOJI_MAP = {
     "clear": "☀️",       # Ясно
@@ -38,12 +85,233 @@ def _map_weather_condition_to_emoji(weather_id: int) -> str:
         return WEATHER_EMOJI_MAP["clouds"]
     return WEATHER_EMOJI_MAP["unknown"]
 
-async def get_weather_with_forecast(city_name: str, target_dt: datetime) -> dict | None:
+# (широта, долгота) аэропорта из справочника
+Coordinates = Tuple[float, float]
+
+
+class _TtlCache:
+    """
+    TTL + LRU кэш ответов OpenWeatherMap, ключ — место (координаты или город в нижнем регистре);
+    в негативном кэше — (вид запроса, место).
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class _Forecast:
+    """5-дневный прогноз города: слоты по 3 часа, отсортированные по времени (UTC timestamp)."""
+    __slots__ = ("city", "timestamps", "slots")
+
+    def __init__(self, city: str, slots: List[Tuple[int, float, int]]):
+        slots.sort()
+        self.city = city
+        self.timestamps = [ts for ts, _, _ in slots]
+        self.slots = slots  # (timestamp, температура, id погоды)
+
+    def nearest(self, target_ts: float) -> Optional[Tuple[int, float, int]]:
+        """Слот, ближайший к target_ts (при равенстве — более ранний)."""
+        if not self.slots:
+            return None
+        i = bisect.bisect_left(self.timestamps, target_ts)
+        if i == 0:
+            return self.slots[0]
+        if i == len(self.slots):
+            return self.slots[-1]
+        before, after = self.slots[i - 1], self.slots[i]
+        return before if target_ts - before[0] <= after[0] - target_ts else after
+
+
+# Прогноз меняется редко — держим его около часа; текущая погода живёт меньше
+_forecast_cache = _TtlCache(config.WEATHER_FORECAST_CACHE_TTL_SEC, config.WEATHER_CACHE_MAX_CITIES)
+_current_cache = _TtlCache(config.WEATHER_CURRENT_CACHE_TTL_SEC, config.WEATHER_CACHE_MAX_CITIES)
+# Места, которые OpenWeatherMap не знает: повторные запросы не уходят в сеть до истечения TTL
+_unresolved_cache = _TtlCache(config.WEATHER_NEGATIVE_CACHE_TTL_SEC, config.WEATHER_CACHE_MAX_CITIES)
+# Одновременные запросы одного города (20 рейсов в Бергамо) ждут один HTTP-запрос
+_single_flight = SingleFlight("Погода: single-flight")
+# Пока OWM не отвечает, запросы погоды не отправляются и не ждут таймаута
+circuit = CircuitBreaker(
+    "OpenWeatherMap", config.ENRICHMENT_CIRCUIT_FAILURE_THRESHOLD, config.ENRICHMENT_CIRCUIT_RESET_SEC
+)
+_SKIPPED = object()
+
+
+# Ближе ±3 часов к текущему моменту берём текущую погоду, дальше — слот 3-часового прогноза
+_CURRENT_WINDOW_SEC = 3 * 3600
+_FORECAST_SLOT_SEC = 3 * 3600
+
+# (место, "current" или номер 3-часового слота прогноза)
+WeatherKey = Tuple[str, Any]
+
+
+def _to_utc_timestamp(dt: datetime) -> float:
+    """Наивное время считаем UTC (как и раньше при сравнении со слотами прогноза)."""
+    if dt.tzinfo is None:
+        return calendar.timegm(dt.timetuple()) + dt.microsecond / 1e6
+    return dt.timestamp()
+
+
+def _location_key(city_name: str, coordinates: Optional[Coordinates]) -> str:
+    if coordinates:
+        return f"{coordinates[0]:.3f},{coordinates[1]:.3f}"
+    return city_name.strip().lower()
+
+
+def _owm_params(city_name: str, coordinates: Optional[Coordinates]) -> dict:
+    params = {
+        "appid": config.OPENWEATHER_API_KEY,
+        "units": "metric",
+        "lang": "ru"
+    }
+    # По координатам OWM отвечает всегда; свободный текст q= может не распознать
+    if coordinates:
+        params["lat"], params["lon"] = coordinates
+    else:
+        params["q"] = city_name
+    return params
+
+
+class _PlaceNotFound(Exception):
+    """OpenWeatherMap ответил 404 «city not found»: такого места у него нет."""
+
+
+def _not_found(resp: httpx.Response, city_name: str) -> bool:
+    """Только настоящий 404 «city not found»; прочие 404 (например, неверный URL) — обычная ошибка."""
+    if resp.status_code != 404:
+        return False
+    try:
+        data = resp.json()
+    except ValueError:
+        return False
+    if not isinstance(data, dict) or "not found" not in str(data.get("message", "")).lower():
+        return False
+    logger.info(f"OpenWeatherMap не знает место '{city_name}', запоминаем на {config.WEATHER_NEGATIVE_CACHE_TTL_SEC} с.")
+    return True
+
+
+async def _fetch_current(city_name: str, coordinates: Optional[Coordinates]) -> dict | None:
+    # Общий пул соединений: без нового TCP+TLS рукопожатия на каждый запрос
+    client = await get_client()
+    resp = await circuit.request(
+        lambda: client.get(f"{config.OPENWEATHER_BASE_URL}/weather", params=_owm_params(city_name, coordinates))
+    )
+    if _not_found(resp, city_name):
+        raise _PlaceNotFound(city_name)
+    resp.raise_for_status()
+    data = resp.json()
+
+    if data.get("cod") != 200:
+        logger.error(f"Ошибка API OpenWeatherMap (current) для '{city_name}': {data.get('message', 'Неизвестная ошибка')}")
+        return None
+
+    main_data = data.get("main")
+    weather_data = data.get("weather")
+    if main_data and weather_data and len(weather_data) > 0:
+        temp = main_data.get("temp")
+        weather_id = weather_data[0].get("id")
+        if temp is not None and weather_id is not None:
+            return {
+                # По координатам OWM называет ближайший населённый пункт (часто пригород с аэропортом)
+                "city": city_name if coordinates else data.get("name", city_name),
+                "temperature": round(float(temp)),
+                "emoji": _map_weather_condition_to_emoji(weather_id),
+            }
+    logger.warning(f"Неполные данные (current) для города '{city_name}': {data}")
+    return None
+
+
+async def _fetch_forecast(city_name: str, coordinates: Optional[Coordinates]) -> _Forecast | None:
+    client = await get_client()
+    resp = await circuit.request(
+        lambda: client.get(f"{config.OPENWEATHER_BASE_URL}/forecast", params=_owm_params(city_name, coordinates))
+    )
+    if _not_found(resp, city_name):
+        raise _PlaceNotFound(city_name)
+    resp.raise_for_status()
+    data = resp.json()
+
+    if data.get("cod") != "200" or "list" not in data:
+        logger.error(f"Ошибка API OpenWeatherMap (forecast) для '{city_name}': {data.get('message', data)}")
+        return None
+
+    # Список слотов каждые 3 часа (обычно 40 элементов) — сохраняем целиком, а не один слот
+    slots = []
+    for item in data["list"]:
+        temp = (item.get("main") or {}).get("temp")
+        weather_data = item.get("weather") or [{}]
+        weather_id = weather_data[0].get("id")
+        if temp is not None and weather_id is not None:
+            slots.append((item.get("dt", 0), float(temp), weather_id))
+    if not slots:
+        logger.warning(f"Пустой прогноз для '{city_name}': {data}")
+        return None
+    return _Forecast(city_name if coordinates else data.get("city", {}).get("name", city_name), slots)
+
+
+async def _cached(cache: _TtlCache, kind: str, city_name: str,
+                  coordinates: Optional[Coordinates], fetch) -> Any:
+    """
+    Ответ из кэша или один HTTP-запрос на все одновременные обращения к месту.
+    В негативный кэш (по виду запроса и месту) попадает только 404 «city not found»;
+    сетевые ошибки, отказы предохранителя, ошибки API и неполные ответы не кэшируются.
+    """
+    key = _location_key(city_name, coordinates)
+    value = cache.get(key)
+    if value is None:
+        if _unresolved_cache.get((kind, key)):
+            return None
+
+        async def _fetch_and_cache():
+            try:
+                fetched = await fetch(city_name, coordinates)
+            except _PlaceNotFound:
+                _unresolved_cache.put((kind, key), True)
+                return None
+            if fetched is not None:
+                cache.put(key, fetched)
+            return fetched
+        value = await _single_flight.do((kind, key), _fetch_and_cache)
+    return value
+
+
+async def get_weather_with_forecast(city_name: str, target_dt: datetime,
+                                    coordinates: Optional[Coordinates] = None) -> dict | None:
     """
     Возвращает погоду (текущую или прогноз) для заданного города и времени.
-    - Если target_dt близок к текущему моменту (±3 часа), запрашивает текущую погоду (/weather).
-    - Если target_dt дальше (до 5 дней), запрашивает 5-дневный прогноз (/forecast) 
-      и выбирает ближайший по времени слот.
+    - Если известны координаты (аэропорта), запрос идёт по lat/lon, в ответе — city_name.
+    - Если target_dt близок к текущему моменту (±3 часа), берёт текущую погоду (/weather).
+    - Если target_dt дальше (до 5 дней), берёт 5-дневный прогноз (/forecast)
+      и выбирает ближайший по времени слот (бинарный поиск по времени слотов).
+    Ответы кэшируются по месту: прогноз на WEATHER_FORECAST_CACHE_TTL_SEC,
+    текущая погода на WEATHER_CURRENT_CACHE_TTL_SEC, «место не найдено» —
+    на WEATHER_NEGATIVE_CACHE_TTL_SEC.
     Возвращает словарь:
     {
       "city": <имя города из API или переданное>,
@@ -52,8 +320,17 @@ async def get_weather_with_forecast(city_name: str, target_dt: datetime) -> dict
       "type": "current" или "forecast",
       "dt": <datetime UTC, к которому привязан вывод>
     }
-    В случае ошибки возвращает None.
+    В случае ошибки (и пока OWM отключён предохранителем) возвращает None.
     """
+    try:
+        return await _get_weather(city_name, target_dt, coordinates)
+    except CircuitOpenError:
+        logger.debug(f"OpenWeatherMap отключён предохранителем, погода для '{city_name}' пропущена.")
+        return None
+
+
+async def _get_weather(city_name: str, target_dt: datetime, coordinates: Optional[Coordinates]) -> dict | None:
+    """get_weather_with_forecast, но отказ предохранителя пробрасывается как CircuitOpenError."""
     if not config.OPENWEATHER_API_KEY:
         logger.warning("API ключ для OpenWeatherMap не настроен.")
         return None
@@ -62,93 +339,38 @@ async def get_weather_with_forecast(city_name: str, target_dt: datetime) -> dict
         return None
 
     now_utc = datetime.utcnow()
-    # Разница в секундах между целевым временем и настоящим (UTC)
-    diff_seconds = (target_dt.replace(tzinfo=None) - now_utc).total_seconds()
 
     try:
-        async with httpx.AsyncClient() as client:
-            # Если целевая дата в пределах ±3 часов, берем текущую погоду
-            if abs(diff_seconds) <= 3 * 3600:
-                url_current = "http://api.openweathermap.org/data/2.5/weather"
-                params = {
-                    "q": city_name,
-                    "appid": config.OPENWEATHER_API_KEY,
-                    "units": "metric",
-                    "lang": "ru"
-                }
-                resp = await client.get(url_current, params=params)
-                resp.raise_for_status()
-                data = resp.json()
-
-                if data.get("cod") != 200:
-                    logger.error(f"Ошибка API OpenWeatherMap (current) для '{city_name}': {data.get('message', 'Неизвестная ошибка')}") 
-                    return None
-
-                main_data = data.get("main")
-                weather_data = data.get("weather")
-                if main_data and weather_data and len(weather_data) > 0:
-                    temp = main_data.get("temp")
-                    weather_id = weather_data[0].get("id")
-                    city_from_api = data.get("name", city_name)
-                    if temp is not None and weather_id is not None:
-                        emoji = _map_weather_condition_to_emoji(weather_id)
-                        return {
-                            "city": city_from_api,
-                            "temperature": round(float(temp)),
-                            "emoji": emoji,
-                            "type": "current",
-                            "dt": now_utc
-                        }
-                logger.warning(f"Неполные данные (current) для города '{city_name}': {data}")
-                return None
-
-            # Иначе: target_dt дальше чем ±3 часа → запрашиваем 5-дневный прогноз
-            url_forecast = "http://api.openweathermap.org/data/2.5/forecast"
-            params = {
-                "q": city_name,
-                "appid": config.OPENWEATHER_API_KEY,
-                "units": "metric",
-                "lang": "ru"
-            }
-            resp = await client.get(url_forecast, params=params)
-            resp.raise_for_status()
-            data = resp.json()
-
-            if data.get("cod") != "200" or "list" not in data:
-                logger.error(f"Ошибка API OpenWeatherMap (forecast) для '{city_name}': {data.get('message', data)}")
+        target_ts = _to_utc_timestamp(target_dt)
+        # Если целевая дата в пределах ±3 часов, берем текущую погоду
+        if abs(target_ts - time.time()) <= _CURRENT_WINDOW_SEC:
+            current = await _cached(_current_cache, "current", city_name, coordinates, _fetch_current)
+            if current is None:
                 return None
+            return {**current, "type": "current", "dt": now_utc}
 
-            forecast_list = data["list"]  # Список слотов каждый 3 часа (обычно 40 элементов)
-            best_item = None
-            best_diff = None
-
-            # Ищем элемент, у которого timestamp ближе всего к target_dt
-            for item in forecast_list:
-                item_dt = datetime.utcfromtimestamp(item.get("dt", 0))
-                diff = abs((item_dt - target_dt).total_seconds())
-                if best_diff is None or diff < best_diff:
-                    best_diff = diff
-                    best_item = item
-
-            if best_item:
-                main_data = best_item.get("main", {})
-                weather_data = best_item.get("weather", [{}])
-                if main_data and "temp" in main_data and weather_data and weather_data[0].get("id") is not None:
-                    temp = main_data.get("temp")
-                    weather_id = weather_data[0].get("id")
-                    city_from_api = data.get("city", {}).get("name", city_name)
-                    if temp is not None and weather_id is not None:
-                        emoji = _map_weather_condition_to_emoji(weather_id)
-                        return {
-                            "city": city_from_api,
-                            "temperature": round(float(temp)),
-                            "emoji": emoji,
-                            "type": "forecast",
-                            "dt": datetime.utcfromtimestamp(best_item.get("dt", 0))
-                        }
+        # Иначе: target_dt дальше чем ±3 часа → слот 5-дневного прогноза
+        forecast = await _cached(_forecast_cache, "forecast", city_name, coordinates, _fetch_forecast)
+        if forecast is None:
+            return None
+        best = forecast.nearest(target_ts)
+        if best is None:
             logger.warning(f"Не найден подходящий слот (forecast) для города '{city_name}' и времени {target_dt}")
             return None
+        slot_ts, temp, weather_id = best
+        return {
+            "city": forecast.city,
+            "temperature": round(temp),
+            "emoji": _map_weather_condition_to_emoji(weather_id),
+            "type": "forecast",
+            "dt": datetime.utcfromtimestamp(slot_ts)
+        }
 
+    except CircuitOpenError:
+        raise
+    except asyncio.TimeoutError:
+        logger.warning(f"Дедлайн поиска истёк в ожидании погоды для '{city_name}'.")
+        return None
     except httpx.HTTPStatusError as e:
         status = e.response.status_code if e.response else "?"
         text = e.response.text if e.response else ""
@@ -160,3 +382,52 @@ async def get_weather_with_forecast(city_name: str, target_dt: datetime) -> dict
     except Exception as e:
         logger.error(f"Непредвиденная ошибка при получении прогноза для '{city_name}': {e}", exc_info=True)
         return None
+
+
+def weather_key(city_name: str, target_dt: datetime,
+                coordinates: Optional[Coordinates] = None) -> WeatherKey:
+    """Ключ (место, слот): запросы с одинаковым ключом получают один и тот же ответ."""
+    target_ts = _to_utc_timestamp(target_dt)
+    location = _location_key(city_name, coordinates)
+    if abs(target_ts - time.time()) <= _CURRENT_WINDOW_SEC:
+        return location, "current"
+    return location, round(target_ts / _FORECAST_SLOT_SEC)
+
+
+async def get_weather_batch(
+    lookups: Iterable[Tuple[str, datetime, Optional[Coordinates]]],
+) -> Dict[WeatherKey, dict | None]:
+    """
+    Погода для набора (город, время, координаты) одним параллельным проходом
+    (не больше WEATHER_PREFETCH_CONCURRENCY запросов одновременно).
+    Одинаковые пары (место, слот) запрашиваются один раз; результат — {weather_key: погода или None}.
+    Пары, пропущенные из-за разомкнутого предохранителя, в результат не попадают.
+    """
+    unique: Dict[WeatherKey, Tuple[str, datetime, Optional[Coordinates]]] = {}
+    for city_name, target_dt, coordinates in lookups:
+        if city_name and target_dt:
+            unique.setdefault(weather_key(city_name, target_dt, coordinates), (city_name, target_dt, coordinates))
+    if not unique:
+        return {}
+
+    semaphore = asyncio.Semaphore(max(1, config.WEATHER_PREFETCH_CONCURRENCY))
+
+    async def _one(city_name: str, target_dt: datetime, coordinates: Optional[Coordinates]) -> dict | None:
+        async with semaphore:
+            try:
+                return await _get_weather(city_name, target_dt, coordinates)
+            except CircuitOpenError:
+                return _SKIPPED
+
+    results = await asyncio.gather(*(_one(*lookup) for lookup in unique.values()))
+    logger.info(f"Погода: {len(unique)} уникальных пар (место, слот) получены одним проходом.")
+    return {key: result for key, result in zip(unique, results) if result is not _SKIPPED}
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    return {
+        "forecast": _forecast_cache.stats(),
+        "current": _current_cache.stats(),
+        "unresolved": _unresolved_cache.stats(),
+        "circuit": circuit.stats(),
+    }
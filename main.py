@@ -1,6 +1,6 @@
 # main.py
 import logging
-from datetime import time
+from datetime import time, timezone
 
 from telegram import Update
 from telegram.ext import (
@@ -12,8 +12,11 @@ from telegram.ext import (
 
 from bot import config
 from bot import fx_rates
+from bot import fare_store
 from bot import user_history
 from bot import user_stats
+from bot import weather_api
+from bot.ryanair_executor import executor as ryanair_executor
 
 # Handlers
 from bot.handlers import (
@@ -22,6 +25,8 @@ from bot.handlers import (
     end_search_session_callback,       # глобальный обработчик
 )
 from bot.handlers import create_top3_conversation_handler  # фабрика топ-3
+from bot.flight_api import refresh_top3_pool_job            # прогрев пула хабов Top-3
+from bot.route_index import refresh_routes_job              # обновление сети маршрутов
 
 # Админ-панель и ежедневный отчёт
 from bot.admin_handlers import stats_command, stats_callback_handler, daily_report_job
@@ -76,13 +81,18 @@ async def _post_init_all(application: Application) -> None:
     await user_history.init_db()
     await user_stats.init_db()
     await fx_rates.init_db()
+    await fx_rates.load_rates()
+    await fare_store.init_db()
+    await weather_api.init_client()
     logger.info("База данных инициализирована через post_init.")
     await _log_bot_identity(application)
 
 async def on_shutdown(application: Application) -> None:
-    """Чистое завершение: закрываем HTTP-клиент курсов валют и пр."""
-    logger.info("Выполняется остановка бота, закрытие HTTP-клиента...")
+    """Чистое завершение: закрываем HTTP-клиенты курсов валют и погоды, пул потоков Ryanair и пр."""
+    logger.info("Выполняется остановка бота, закрытие HTTP-клиентов...")
     await fx_rates.close_client()
+    await weather_api.close_client()
+    ryanair_executor.shutdown()
 
 
 def main() -> None:
@@ -112,6 +122,35 @@ def main() -> None:
             "ADMIN_TELEGRAM_ID не установлен. Ежедневный отчет по статистике не будет отправляться."
         )
 
+    # Очистка устаревших тарифов в хранилище на диске
+    application.job_queue.run_repeating(
+        fare_store.sweep_expired_job,
+        interval=config.FARE_STORE_SWEEP_INTERVAL_SEC,
+        first=60,
+    )
+
+    # Фоновый прогрев пула хабов для Top-3 «отовсюду»
+    application.job_queue.run_repeating(
+        refresh_top3_pool_job,
+        interval=config.TOP3_PREWARM_INTERVAL_SEC,
+        first=10,
+    )
+
+    # Обновление курсов валют: при запуске (если в БД не сегодняшние) и после ежедневной публикации ЕЦБ
+    application.job_queue.run_once(fx_rates.refresh_stale_rates_job, 5)
+    fx_hour, fx_minute = map(int, config.FX_REFRESH_TIME_UTC.split(":"))
+    application.job_queue.run_daily(
+        fx_rates.refresh_rates_job,
+        time(hour=fx_hour, minute=fx_minute, tzinfo=timezone.utc),
+    )
+
+    # Обновление сети маршрутов (data/routes.json) для клавиатур прилёта и отсечения пустых пар
+    application.job_queue.run_repeating(
+        refresh_routes_job,
+        interval=config.ROUTES_REFRESH_INTERVAL_SEC,
+        first=30,
+    )
+
     # Основные ConversationHandler'ы
     conv_handler = create_conversation_handler()
     top3_handler = create_top3_conversation_handler()
@@ -0,0 +1,110 @@
+# tools/bench_flight_record.py
+"""
+Сравнение стоимости разбора рейсов: «сырые» объекты ryanair-py, которые каждый
+потребитель разбирает заново (hasattr + fromisoformat + Decimal(str(price))),
+против FlightRecord, разобранного один раз при получении ответа API.
+
+Запуск из корня репозитория:
+    python tools/bench_flight_record.py [число_рейсов]
+"""
+import random
+import sys
+import timeit
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bot.flight_record import FlightRecord  # noqa: E402
+
+# Та же структура, что у ryanair.types
+Flight = namedtuple("Flight", ("departureTime", "flightNumber", "price", "currency",
+                               "origin", "originFull", "destination", "destinationFull"))
+Trip = namedtuple("Trip", ("totalPrice", "outbound", "inbound"))
+
+AIRPORTS = ["DUB", "STN", "BGY", "BCN", "MAD", "KRK", "WMI", "BVA", "CRL", "LIS", "OPO", "VIE"]
+
+
+def make_raw_flights(count: int) -> list:
+    rnd = random.Random(42)
+    start = datetime(2026, 1, 1, 6, 0)
+    flights = []
+    for i in range(count):
+        origin, destination = rnd.sample(AIRPORTS, 2)
+        out_time = start + timedelta(days=rnd.randint(0, 364), minutes=rnd.randint(0, 960))
+        out_leg = Flight(out_time, f"FR{1000 + i}", round(rnd.uniform(9.99, 250), 2), "EUR",
+                         origin, f"{origin}, X", destination, f"{destination}, Y")
+        if i % 2:
+            flights.append(out_leg)
+            continue
+        in_time = out_time + timedelta(days=rnd.randint(1, 14))
+        in_leg = Flight(in_time, f"FR{5000 + i}", round(rnd.uniform(9.99, 250), 2), "EUR",
+                        destination, f"{destination}, Y", origin, f"{origin}, X")
+        flights.append(Trip(round(out_leg.price + in_leg.price, 2), out_leg, in_leg))
+    return flights
+
+
+# --- старый путь: каждый шаг заново разбирает объект ---
+
+def _raw_price(flight) -> Decimal:
+    if hasattr(flight, "price") and flight.price is not None:
+        return Decimal(str(flight.price))
+    total = Decimal(str(flight.outbound.price))
+    if hasattr(flight, "inbound") and flight.inbound:
+        total += Decimal(str(flight.inbound.price))
+    return total
+
+
+def _raw_date(flight) -> str:
+    value = flight.departureTime if hasattr(flight, "departureTime") else flight.outbound.departureTime
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value.strftime("%Y-%m-%d")
+
+
+def pipeline_raw(flights: list, max_price: Decimal) -> None:
+    cheap = [f for f in flights if _raw_price(f) <= max_price]
+    by_date = defaultdict(list)
+    for f in cheap:
+        by_date[_raw_date(f)].append(f)
+    min_price = min(_raw_price(f) for group in by_date.values() for f in group)
+    [f for group in by_date.values() for f in group if _raw_price(f) == min_price]
+    sorted(cheap, key=_raw_price)
+
+
+# --- новый путь: разбор один раз, дальше только поля записи ---
+
+def pipeline_records(records: list, max_cents: int) -> None:
+    cheap = [r for r in records if r.price_cents is not None and r.price_cents <= max_cents]
+    by_date = defaultdict(list)
+    for r in cheap:
+        by_date[r.departure_date].append(r)
+    min_cents = min(r.price_cents for group in by_date.values() for r in group)
+    [r for group in by_date.values() for r in group if r.price_cents == min_cents]
+    sorted(cheap, key=lambda r: r.price_cents)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeat = 20
+    raw = make_raw_flights(count)
+    max_price = Decimal("300")
+
+    build_sec = timeit.timeit(lambda: [FlightRecord.from_raw(f) for f in raw], number=repeat) / repeat
+    records = [FlightRecord.from_raw(f) for f in raw]
+
+    raw_sec = timeit.timeit(lambda: pipeline_raw(raw, max_price), number=repeat) / repeat
+    rec_sec = timeit.timeit(lambda: pipeline_records(records, 30000), number=repeat) / repeat
+
+    print(f"Рейсов: {count}, повторов: {repeat}")
+    print(f"  сырые объекты (фильтр + группировка + минимум + сортировка): {raw_sec * 1000:8.2f} мс")
+    print(f"  построение FlightRecord (один раз при получении):            {build_sec * 1000:8.2f} мс")
+    print(f"  FlightRecord (фильтр + группировка + минимум + сортировка):  {rec_sec * 1000:8.2f} мс")
+    print(f"  ускорение конвейера: x{raw_sec / rec_sec:.1f}, "
+          f"с учётом построения: x{raw_sec / (build_sec + rec_sec):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# tools/bench_render.py
+"""
+Стоимость рендера выдачи без I/O: message_formatter.render_flight_details по готовым
+данным обогащения (FlightExtras: погода вылета/прилёта и строка курсов) — то, что
+остаётся после enrich_flights. Рейсы в одну сторону и туда-обратно вперемешку.
+
+Запуск из корня репозитория:
+    python tools/bench_render.py [число_рейсов]
+"""
+import logging
+import random
+import sys
+import timeit
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bot.flight_record import FlightRecord  # noqa: E402
+from bot.message_formatter import FlightExtras, render_flight_details  # noqa: E402
+
+# Та же структура, что у ryanair.types
+Flight = namedtuple("Flight", ("departureTime", "flightNumber", "price", "currency",
+                               "origin", "originFull", "destination", "destinationFull"))
+Trip = namedtuple("Trip", ("totalPrice", "outbound", "inbound"))
+
+AIRPORTS = ["DUB", "STN", "BGY", "BCN", "MAD", "KRK", "WMI", "BVA", "CRL", "LIS", "OPO", "VIE"]
+RATES_LINE = "💱 1 EUR = 0.85 GBP • 1 EUR = 4.25 PLN • 1 EUR = 48.10 UAH\n"
+
+
+def make_records(count: int) -> list:
+    rnd = random.Random(42)
+    start = datetime(2026, 1, 1, 6, 0)
+    records = []
+    for i in range(count):
+        origin, destination = rnd.sample(AIRPORTS, 2)
+        out_time = start + timedelta(days=rnd.randint(0, 364), minutes=rnd.randint(0, 960))
+        out_leg = Flight(out_time, f"FR{1000 + i}", round(rnd.uniform(9.99, 250), 2), "EUR",
+                         origin, f"{origin}, X", destination, f"{destination}, Y")
+        if i % 2:
+            records.append(FlightRecord.from_raw(out_leg))
+            continue
+        in_time = out_time + timedelta(days=rnd.randint(1, 14))
+        in_leg = Flight(in_time, f"FR{5000 + i}", round(rnd.uniform(9.99, 250), 2), "EUR",
+                        destination, f"{destination}, Y", origin, f"{origin}, X")
+        records.append(FlightRecord.from_raw(Trip(round(out_leg.price + in_leg.price, 2), out_leg, in_leg)))
+    return records
+
+
+def make_extras(records: list) -> list:
+    rnd = random.Random(7)
+    extras = []
+    for record in records:
+        weather = tuple(
+            {"city": city, "temperature": rnd.randint(-5, 30), "emoji": "☀️", "type": "forecast",
+             "dt": record.outbound.departure_time.replace(minute=0)}
+            for city in (record.origin, record.destination)
+        )
+        extras.append(FlightExtras(weather, RATES_LINE if rnd.random() < 0.7 else None))
+    return extras
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = 20
+    logging.disable(logging.CRITICAL)  # logger.debug в рендере не должен попадать в замер обработчиков
+
+    records = make_records(count)
+    extras = make_extras(records)
+    one_way = [(r, e) for r, e in zip(records, extras) if not r.is_round_trip]
+    round_trip = [(r, e) for r, e in zip(records, extras) if r.is_round_trip]
+
+    def render(pairs: list) -> None:
+        for record, record_extras in pairs:
+            render_flight_details(record, record_extras)
+
+    all_sec = timeit.timeit(lambda: render(list(zip(records, extras))), number=repeat) / repeat
+    ow_sec = timeit.timeit(lambda: render(one_way), number=repeat) / repeat
+    rt_sec = timeit.timeit(lambda: render(round_trip), number=repeat) / repeat
+
+    print(f"Рейсов: {count} (в одну сторону: {len(one_way)}, туда-обратно: {len(round_trip)}), повторов: {repeat}")
+    print(f"  вся выдача:          {all_sec * 1000:8.2f} мс, {all_sec / count * 1e6:6.1f} мкс/рейс")
+    print(f"  в одну сторону:      {ow_sec / max(1, len(one_way)) * 1e6:6.1f} мкс/рейс")
+    print(f"  туда-обратно:        {rt_sec / max(1, len(round_trip)) * 1e6:6.1f} мкс/рейс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# tools/bench_weather_client.py
+"""
+Задержка форматирования одного рейса (enrich_flights + render_flight_details: погода вылета + прилёта)
+с новым соединением на каждый запрос погоды (как было с httpx.AsyncClient на запрос)
+и с общим клиентом weather_api с пулом keep-alive соединений. Перед каждым рейсом
+кэши погоды очищаются, чтобы оба прохода действительно ходили в OpenWeatherMap.
+
+По умолчанию запросы идут на локальный сервер, похожий на OpenWeatherMap; стоимость
+установки соединения (TCP+TLS до реального API) имитируется задержкой --connect-ms
+на каждое новое соединение. С --live запросы идут в настоящий OpenWeatherMap
+(нужен OPENWEATHER_API_KEY в окружении).
+
+Запуск из корня репозитория:
+    python tools/bench_weather_client.py [--flights 20] [--connect-ms 60] [--live]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+from bot import config, fx_rates, message_formatter, weather_api  # noqa: E402
+from bot.flight_record import FlightRecord  # noqa: E402
+
+# Та же структура, что у ryanair.types
+Flight = namedtuple("Flight", ("departureTime", "flightNumber", "price", "currency",
+                               "origin", "originFull", "destination", "destinationFull"))
+
+ROUTES = [("STN", "BGY"), ("DUB", "BCN"), ("KRK", "BVA"), ("WMI", "CRL"), ("VIE", "LIS")]
+
+
+class _FakeOwmHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего API
+    disable_nagle_algorithm = True  # иначе заголовки и тело уходят с задержкой ~40 мс (delayed ACK)
+    connect_delay = 0.0
+
+    def setup(self):
+        # Новое соединение: имитируем рукопожатие TCP+TLS до удалённого сервера
+        time.sleep(self.connect_delay)
+        super().setup()
+
+    def do_GET(self):
+        now = int(time.time()) // 10800 * 10800
+        if self.path.startswith("/weather"):
+            payload = {"cod": 200, "name": "Bench", "main": {"temp": 21.4}, "weather": [{"id": 800}]}
+        else:
+            payload = {
+                "cod": "200",
+                "city": {"name": "Bench"},
+                "list": [{"dt": now + i * 10800, "main": {"temp": 15 + i % 7}, "weather": [{"id": 801}]}
+                         for i in range(40)],
+            }
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_owm(connect_ms: float) -> ThreadingHTTPServer:
+    _FakeOwmHandler.connect_delay = connect_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOwmHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_flights(count: int) -> list:
+    start = datetime.now().replace(minute=0, second=0, microsecond=0)  # ryanair-py отдаёт локальное время без tz
+    flights = []
+    for i in range(count):
+        origin, destination = ROUTES[i % len(ROUTES)]
+        dep = start + timedelta(hours=6 + 5 * i % 90)
+        flights.append(FlightRecord.from_raw(Flight(dep, f"FR{1000 + i}", 19.99 + i, "EUR",
+                                                    origin, f"{origin}, X", destination, f"{destination}, Y")))
+    return flights
+
+
+def _no_keepalive_client() -> httpx.AsyncClient:
+    """Старое поведение: соединения не переиспользуются, каждый запрос погоды открывает новое."""
+    return httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=0))
+
+
+def _clear_weather_caches() -> None:
+    for cache in (weather_api._forecast_cache, weather_api._current_cache, weather_api._unresolved_cache):
+        cache.clear()
+
+
+async def measure(flights: list) -> list:
+    latencies = []
+    for flight in flights:
+        _clear_weather_caches()  # замеряем HTTP-клиент, а не кэш погоды
+        started = time.perf_counter()
+        (extras,) = await message_formatter.enrich_flights([message_formatter.FlightContext(flight)])
+        message_formatter.render_flight_details(flight, extras)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def report(title: str, latencies: list) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"  {title:<38} среднее {statistics.mean(latencies):7.1f} мс, "
+          f"медиана {statistics.median(latencies):7.1f} мс, p95 {p95:7.1f} мс")
+
+
+async def run(args) -> None:
+    # Изолируем погоду: курсы валют в этом замере не участвуют
+    fx_rates.format_rates = lambda *_: None
+
+    flights = make_flights(args.flights)
+
+    weather_api._http_client = _no_keepalive_client()
+    before = await measure(flights)
+    await weather_api.close_client()
+
+    await weather_api.init_client()
+    await measure(flights[:1])  # прогрев пула
+    after = await measure(flights)
+    await weather_api.close_client()
+
+    print(f"Рейсов: {len(flights)}, по 2 запроса погоды на рейс")
+    report("новое соединение на каждый запрос:", before)
+    report("общий клиент с пулом соединений:", after)
+    print(f"  ускорение (среднее): x{statistics.mean(before) / statistics.mean(after):.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--flights", type=int, default=20)
+    parser.add_argument("--connect-ms", type=float, default=60.0,
+                        help="имитируемая стоимость нового соединения для локального сервера")
+    parser.add_argument("--live", action="store_true", help="запросы в настоящий OpenWeatherMap")
+    args = parser.parse_args()
+
+    if args.live:
+        if not os.environ.get("OPENWEATHER_API_KEY"):
+            sys.exit("Для --live нужен OPENWEATHER_API_KEY в окружении.")
+    else:
+        server = start_fake_owm(args.connect_ms)
+        config.OPENWEATHER_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+        config.OPENWEATHER_API_KEY = "bench"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()